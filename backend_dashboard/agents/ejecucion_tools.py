@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+from langchain_core.messages import ToolMessage
+
+logger = logging.getLogger(__name__)
+
+# --- EJECUCIÓN DE TOOLS CON TIMEOUT Y CIRCUIT BREAKER ---
+# Reemplaza a ToolNode: las tool calls de un mismo paso del modelo corren en paralelo,
+# cada una con su timeout, y una tool que falla seguido queda "abierta" (no se llama)
+# durante un rato. Una tool colgada no puede matarse desde Python: su hilo sigue hasta
+# terminar, pero el turno ya no la espera.
+
+TOOL_TIMEOUT_SEG = float(os.getenv("TOOL_TIMEOUT_SEG", "25"))
+TIMEOUTS_POR_TOOL = {
+    "analista_de_datos_cliente": 45,
+    "informe_estandar": 10,
+    "tavily_search_results_json": 15,
+    "consultar_biblioteca_documentos": 15,
+    "consultar_actas_reuniones": 15,
+    "agendar_reunion_oficial": 20,
+    "enviar_email_real": 5,  # Solo encola
+}
+# Override por entorno: TOOL_TIMEOUTS='{"analista_de_datos_cliente": 60}'
+TIMEOUTS_POR_TOOL.update(json.loads(os.getenv("TOOL_TIMEOUTS", "{}")))
+
+# Tools con efectos (calendario, correo): un timeout no las cancela, siguen corriendo en el pool.
+# Al modelo se le avisa que están en curso para que no las repita (evita reuniones o mails dobles).
+TOOLS_CON_EFECTOS = {"agendar_reunion_oficial", "enviar_email_real"}
+
+BREAKER_FALLOS = int(os.getenv("TOOL_BREAKER_FALLOS", "3"))
+BREAKER_ENFRIAMIENTO_SEG = float(os.getenv("TOOL_BREAKER_ENFRIAMIENTO_SEG", "60"))
+
+TOOL_WORKERS = int(os.getenv("TOOL_WORKERS", "8"))
+
+_pool = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="tool")
+# Llamadas enviadas al pool que todavía no terminaron, incluidas las que el turno dejó de esperar.
+# Con el pool lleno de tools colgadas, una llamada nueva solo quedaría en la cola hasta su timeout.
+_en_curso = 0
+_lock_en_curso = threading.Lock()
+
+class CircuitBreaker:
+    """Cerrado -> (N fallos seguidos) -> Abierto -> (enfriamiento) -> Semiabierto (1 intento)."""
+
+    def __init__(self, fallos: int = BREAKER_FALLOS, enfriamiento: float = BREAKER_ENFRIAMIENTO_SEG):
+        self.fallos_max = fallos
+        self.enfriamiento = enfriamiento
+        self.fallos = 0
+        self.abierto_desde = None
+        self._probando = False
+        self._lock = threading.Lock()
+
+    def permitir(self) -> bool:
+        with self._lock:
+            if self.abierto_desde is None:
+                return True
+            if time.monotonic() - self.abierto_desde >= self.enfriamiento and not self._probando:
+                self._probando = True  # Semiabierto: dejamos pasar una llamada de prueba
+                return True
+            return False
+
+    def exito(self):
+        with self._lock:
+            self.fallos = 0
+            self.abierto_desde = None
+            self._probando = False
+
+    def liberar_prueba(self):
+        """La llamada de prueba terminó sin veredicto (ej: sigue en curso): otra puede probar."""
+        with self._lock:
+            self._probando = False
+
+    def fallo(self):
+        with self._lock:
+            self.fallos += 1
+            self._probando = False
+            if self.fallos >= self.fallos_max:
+                self.abierto_desde = time.monotonic()
+
+    def estado(self) -> str:
+        if self.abierto_desde is None:
+            return "cerrado"
+        return "semiabierto" if time.monotonic() - self.abierto_desde >= self.enfriamiento else "abierto"
+
+_breakers = {}
+_lock_breakers = threading.Lock()
+
+def breaker(nombre: str) -> CircuitBreaker:
+    with _lock_breakers:
+        if nombre not in _breakers:
+            _breakers[nombre] = CircuitBreaker()
+        return _breakers[nombre]
+
+def estado_breakers() -> dict:
+    with _lock_breakers:
+        return {nombre: b.estado() for nombre, b in _breakers.items()}
+
+def tools_en_curso() -> int:
+    with _lock_en_curso:
+        return _en_curso
+
+def _terminada(_futuro):
+    global _en_curso
+    with _lock_en_curso:
+        _en_curso -= 1
+
+def _lanzar(tool, args):
+    """Envía la tool al pool, o devuelve None si el pool ya está lleno."""
+    global _en_curso
+    with _lock_en_curso:
+        if _en_curso >= TOOL_WORKERS:
+            return None
+        _en_curso += 1
+    # copy_context: los callbacks/tracing del turno siguen viendo su contexto en el hilo
+    ctx = contextvars.copy_context()
+    futuro = _pool.submit(ctx.run, tool.invoke, args)
+    futuro.add_done_callback(_terminada)
+    return futuro
+
+def _mensaje(call, contenido: str) -> ToolMessage:
+    return ToolMessage(content=contenido, tool_call_id=call["id"], name=call["name"])
+
+def ejecutar_tool_calls(tool_calls: list, tools_por_nombre: dict, limite_turno: float = None) -> list:
+    """
+    Ejecuta en paralelo las tool calls de un paso y devuelve un ToolMessage por cada una,
+    en el mismo orden. Ninguna espera más que su timeout ni más allá del límite del turno.
+    """
+    inicio = time.monotonic()
+    futuros = {}
+    respuestas = {}
+
+    for call in tool_calls:
+        nombre = call["name"]
+        tool = tools_por_nombre.get(nombre)
+        if tool is None:
+            respuestas[call["id"]] = _mensaje(call, f"Error: la herramienta '{nombre}' no existe.")
+            continue
+        if not breaker(nombre).permitir():
+            respuestas[call["id"]] = _mensaje(
+                call, f"Error: la herramienta '{nombre}' está temporalmente fuera de servicio. Respondé con lo que tengas."
+            )
+            continue
+        futuro = _lanzar(tool, call["args"])
+        if futuro is None:
+            # Saturación del pool, no falla de la tool: no cuenta para el breaker
+            breaker(nombre).liberar_prueba()
+            logger.warning(f"🚦 Pool de tools lleno ({TOOL_WORKERS} en curso): '{nombre}' no se ejecuta.")
+            respuestas[call["id"]] = _mensaje(
+                call, f"Error: hay demasiadas herramientas en curso y '{nombre}' no se pudo ejecutar. Respondé con lo que tengas."
+            )
+            continue
+        futuros[call["id"]] = (call, futuro)
+
+    for call_id, (call, futuro) in futuros.items():
+        nombre = call["name"]
+        timeout = TIMEOUTS_POR_TOOL.get(nombre, TOOL_TIMEOUT_SEG)
+        # Un único plazo absoluto por llamada: su timeout desde el arranque del paso, acotado por el turno
+        plazo = inicio + timeout
+        if limite_turno is not None:
+            plazo = min(plazo, limite_turno)
+
+        hechos, _ = wait([futuro], timeout=max(plazo - time.monotonic(), 0))
+        if not hechos:
+            if nombre in TOOLS_CON_EFECTOS:
+                # Sin veredicto: ni éxito ni fallo, pero no puede quedar bloqueando el semiabierto
+                breaker(nombre).liberar_prueba()
+                logger.warning(f"⏱️ Tool '{nombre}' sigue en curso tras {plazo - inicio:.1f}s (no se reintenta).")
+                respuestas[call_id] = _mensaje(
+                    call, f"La herramienta '{nombre}' sigue ejecutándose en segundo plano. "
+                          "NO la vuelvas a llamar: avisale al usuario que la acción está en curso."
+                )
+                continue
+            timeout = max(plazo - inicio, 0)
+            breaker(nombre).fallo()
+            logger.warning(f"⏱️ Tool '{nombre}' superó {timeout:.1f}s.")
+            respuestas[call_id] = _mensaje(call, f"Error: la herramienta '{nombre}' no respondió a tiempo ({timeout:.1f}s).")
+            continue
+        try:
+            resultado = futuro.result()
+            breaker(nombre).exito()
+            respuestas[call_id] = _mensaje(call, resultado if isinstance(resultado, str) else str(resultado))
+        except Exception as e:
+            breaker(nombre).fallo()
+            logger.error(f"Error en tool '{nombre}': {e}")
+            respuestas[call_id] = _mensaje(call, f"Error ejecutando '{nombre}': {e}")
+
+    return [respuestas[call["id"]] for call in tool_calls]
@@ -1,5 +1,7 @@
 import os
+import time
 import logging
+import threading
 from datetime import datetime
 from zoneinfo import ZoneInfo  
 import locale
@@ -9,10 +11,9 @@ from typing import List, Any, TypedDict, Annotated
 try: locale.setlocale(locale.LC_TIME, 'es_ES.UTF-8')
 except: pass
 
-from langchain_google_genai import ChatGoogleGenerativeAI
+from core.modelos_gemini import ChatGemini
 from langchain_core.messages import SystemMessage, HumanMessage, BaseMessage
 from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
 from langchain_community.chat_message_histories import ChatMessageHistory
 
 # --- CORRECCIÓN IMPORTACIÓN DE MEMORIA (LangChain 0.3+) ---
@@ -33,12 +34,15 @@ from tools.general import get_search_tool
 from tools.email import crear_borrador_email
 from tools.database import consultar_actas_reuniones, consultar_biblioteca_documentos
 from tools.analysis import analista_de_datos_cliente
+from tools.informes import informe_estandar
 from tools.actions import agendar_reunion_oficial, enviar_email_real
+from agents.ejecucion_tools import ejecutar_tool_calls
+from monitoring.tracing import trazar_turno
 
 logger = logging.getLogger(__name__)
 
 # Usamos Flash con temperatura 0 para máxima precisión
-llm = ChatGoogleGenerativeAI(model="models/gemini-2.0-flash-001", temperature=0, max_retries=2)
+llm = ChatGemini(model="models/gemini-2.0-flash-001", temperature=0)
 
 def get_memory_aware_history(history_list):
     chat_history = ChatMessageHistory()
@@ -91,6 +95,8 @@ sys_prompt = f"""Eres el **Director de Operaciones (COO)** del SICyT.
 1. 📊 **DATOS Y AGENDA (Tool: `analista_de_datos_cliente`)**
    - Úsala para: Viajes, Gastos, Misiones, Agenda Oficial, Funcionarios.
    - *Query Ejemplo:* "Fecha y detalles del viaje a Londres de 7500 USD mencionado antes".
+   - Para gasto mensual por moneda, viajes por funcionario, nacional vs internacional o eventos
+     de la semana usá primero `informe_estandar`: es instantáneo y exacto.
 
 2. 🗄️ **LEGAL (Tool: `consultar_biblioteca_documentos`)**
    - Úsala para: Leer PDFs o documentos subidos.
@@ -104,19 +110,21 @@ sys_prompt = f"""Eres el **Director de Operaciones (COO)** del SICyT.
 ¡NO CHARLES! ¡EJECUTA!
 """
 
-tools = [
-    analista_de_datos_cliente, 
-    consultar_biblioteca_documentos, 
-    consultar_actas_reuniones, 
-    crear_borrador_email, 
-    get_search_tool(), 
-    agendar_reunion_oficial, 
-    enviar_email_real
-]
+# --- GRAFO (se construye en el primer uso) ---
+# Crear las tools (Tavily, etc.) y compilar el grafo no hace falta para arrancar el servidor.
+tools = []
+tools_por_nombre = {}
+llm_with_tools = None
+_grafo = None
+_lock_grafo = threading.Lock()
 
-llm_with_tools = llm.bind_tools(tools)
+# Presupuesto de latencia del turno: vencido, el agente responde con lo que ya juntó
+TURNO_PRESUPUESTO_SEG = float(os.getenv("TURNO_PRESUPUESTO_SEG", "60"))
+MARGEN_RESPUESTA_SEG = float(os.getenv("MARGEN_RESPUESTA_SEG", "8"))  # Tiempo reservado para redactar
 
-class State(TypedDict): messages: Annotated[List[BaseMessage], operator.add]
+class State(TypedDict):
+    messages: Annotated[List[BaseMessage], operator.add]
+    limite_turno: float  # time.monotonic() en que vence el turno
 
 def call_model(s): 
     msgs = s['messages']
@@ -125,58 +133,75 @@ def call_model(s):
         msgs[0] = sys_msg
     else:
         msgs.insert(0, sys_msg)
+
+    restante = s.get('limite_turno', float("inf")) - time.monotonic()
+    if restante <= MARGEN_RESPUESTA_SEG:
+        # Sin tools bindeadas el modelo no puede pedir otra herramienta: cierra el turno
+        logger.warning(f"⏱️ Presupuesto del turno agotado ({restante:.1f}s restantes). Respondiendo sin tools.")
+        aviso = SystemMessage(content="Se agotó el tiempo para consultar herramientas. Respondé ahora con la información ya obtenida y aclará qué quedó sin verificar.")
+        return {"messages": [llm.invoke(msgs + [aviso])]}
     return {"messages": [llm_with_tools.invoke(msgs)]}
 
+def call_tools(s):
+    limite = s.get('limite_turno', float("inf")) - MARGEN_RESPUESTA_SEG
+    return {"messages": ejecutar_tool_calls(s['messages'][-1].tool_calls, tools_por_nombre, limite_turno=limite)}
+
 def route(s): 
     return "tools" if s['messages'][-1].tool_calls else END
 
-wf = StateGraph(State)
-wf.add_node("agent", call_model)
-wf.add_node("tools", ToolNode(tools))
-wf.set_entry_point("agent")
-wf.add_conditional_edges("agent", route, {"tools": "tools", END: END})
-wf.add_edge("tools", "agent")
-app = wf.compile()
-
-def get_agent_response(msg, hist=[]):
+def get_grafo():
+    global tools, tools_por_nombre, llm_with_tools, _grafo
+    if _grafo is not None:
+        return _grafo
+    with _lock_grafo:
+        if _grafo is None:
+            tools = [
+                analista_de_datos_cliente, 
+                informe_estandar,
+                consultar_biblioteca_documentos, 
+                consultar_actas_reuniones, 
+                crear_borrador_email, 
+                get_search_tool(), 
+                agendar_reunion_oficial, 
+                enviar_email_real
+            ]
+            tools_por_nombre = {t.name: t for t in tools}
+            llm_with_tools = llm.bind_tools(tools)
+
+            wf = StateGraph(State)
+            wf.add_node("agent", call_model)
+            wf.add_node("tools", call_tools)
+            wf.set_entry_point("agent")
+            wf.add_conditional_edges("agent", route, {"tools": "tools", END: END})
+            wf.add_edge("tools", "agent")
+            _grafo = wf.compile()
+    return _grafo
+
+def get_agent_response(msg, hist=[], memory_messages=None, propagar_errores=False):
+    """
+    `memory_messages` permite reutilizar una memoria ya armada (ej: lotes de preguntas sobre la misma sesión).
+    `propagar_errores`: relanza la excepción en vez de devolver el mensaje de error técnico.
+    """
     try:
-        memory_messages = get_memory_aware_history(hist)
-        
-        # Invocamos al grafo
-        res = app.invoke(
-            {"messages": memory_messages + [HumanMessage(content=msg)]}, 
-            config={"recursion_limit": 20}
-        )
-        
-        # --- 🕵️ ZONA DE DIAGNÓSTICO ---
-        print("\n" + "="*40)
-        print(f"🧐 DIAGNÓSTICO PARA: '{msg}'")
-        
-        # Revisamos los últimos mensajes para ver si hubo uso de herramientas
-        messages = res["messages"]
-        tool_used = False
-        
-        for m in messages:
-            # Si el modelo pidió usar una herramienta
-            if m.type == "ai" and m.tool_calls:
-                print(f"🤖 INTENTO DE TOOL: {m.tool_calls[0]['name']}")
-                print(f"   Parámetros: {m.tool_calls[0]['args']}")
-                tool_used = True
-            
-            # Si la herramienta respondió (Esto es lo IMPORTANTE)
-            if m.type == "tool":
-                content_preview = str(m.content)[:500] # Solo los primeros 500 chars
-                print(f"🔧 RESPUESTA DE TOOL: {content_preview}...")
-                if "Error" in str(m.content) or "[]" == str(m.content):
-                    print("⚠️  ¡LA HERRAMIENTA DEVOLVIÓ VACÍO O ERROR!")
+        if memory_messages is None:
+            memory_messages = get_memory_aware_history(hist)
         
-        if not tool_used:
-            print("⚠️  EL AGENTE NO LLAMÓ A NINGUNA HERRAMIENTA (Posible Alucinación Pura)")
-            
-        print("="*40 + "\n")
-        # -------------------------------
+        # Invocamos al grafo (si el turno sale sorteado, con el callback de trazas)
+        with trazar_turno(msg) as trazador:
+            config = {"recursion_limit": 20}
+            if trazador:
+                config["callbacks"] = [trazador]
+            res = get_grafo().invoke(
+                {
+                    "messages": memory_messages + [HumanMessage(content=msg)],
+                    "limite_turno": time.monotonic() + TURNO_PRESUPUESTO_SEG,
+                }, 
+                config=config
+            )
 
         return res["messages"][-1].content
     except Exception as e:
         logger.error(f"Error en agente: {e}")
+        if propagar_errores:
+            raise
         return "Tuve un error técnico momentáneo procesando tu solicitud."
\ No newline at end of file
@@ -0,0 +1,29 @@
+from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
+from core.planificador_llm import planificador_llm
+
+# --- MODELOS GEMINI CON PLANIFICADOR ---
+# Mismas clases de LangChain, pero cada request a Google pide turno en planificador_llm.
+# bind_tools / with_structured_output / la memoria de resumen terminan en _generate,
+# así que todo lo que se arme sobre estos modelos queda cubierto.
+
+class ChatGemini(ChatGoogleGenerativeAI):
+    def __init__(self, **kwargs):
+        # Un solo intento por request (en langchain-google-genai, 1 = sin reintentos; 0 = default del SDK).
+        # Los 429 los reintenta planificador_llm, pausando el bucket del modelo para todos;
+        # un reintento interno de LangChain se saltearía el rate limit y el backoff.
+        kwargs.pop("retries", None)
+        kwargs["max_retries"] = 1
+        super().__init__(**kwargs)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        padre = super()._generate
+        return planificador_llm.ejecutar(self.model, padre, messages, stop=stop, run_manager=run_manager, **kwargs)
+
+class EmbeddingsGemini(GoogleGenerativeAIEmbeddings):
+    def embed_documents(self, texts, **kwargs):
+        padre = super().embed_documents
+        return planificador_llm.ejecutar(self.model, padre, texts, **kwargs)
+
+    def embed_query(self, text, **kwargs):
+        padre = super().embed_query
+        return planificador_llm.ejecutar(self.model, padre, text, **kwargs)
@@ -0,0 +1,51 @@
+import re
+import json
+import base64
+from fastapi import HTTPException
+
+# --- PAGINACIÓN POR CURSOR (KEYSET) ---
+# El cursor es opaco para el cliente: base64 de los valores de orden de la última fila.
+# Lo manda el cliente, así que se valida antes de interpolarlo en un filtro de PostgREST:
+# solo fechas ISO e ids numéricos/uuid (nada de comillas, comas ni paréntesis).
+
+_FECHA_ISO = re.compile(r"^\d{4}-\d{2}-\d{2}([T ]\d{2}:\d{2}(:\d{2}(\.\d{1,6})?)?)?(Z|[+-]\d{2}:?\d{2})?$")
+_ID_TEXTO = re.compile(r"^[0-9A-Za-z-]{1,64}$")
+
+def codificar_cursor(fila: dict, campos: tuple) -> str:
+    datos = {c: fila.get(c) for c in campos}
+    return base64.urlsafe_b64encode(json.dumps(datos, default=str).encode()).decode()
+
+def decodificar_cursor(cursor: str, campo_fecha: str = None) -> dict:
+    """`campo_fecha`: cursores que van a filtro_keyset (exigen esa fecha ISO y un id válido)."""
+    try:
+        datos = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if not isinstance(datos, dict):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if campo_fecha:
+        fecha, id_ = datos.get(campo_fecha), datos.get("id")
+        id_valido = (isinstance(id_, int) and not isinstance(id_, bool)) or \
+            (isinstance(id_, str) and _ID_TEXTO.match(id_))
+        if not (isinstance(fecha, str) and _FECHA_ISO.match(fecha)) or not id_valido:
+            raise HTTPException(status_code=400, detail="Cursor inválido")
+    return datos
+
+def proyectar(campos: str, permitidos: tuple, por_defecto: tuple, obligatorios: tuple = ("id",)) -> str:
+    """Arma el select() a partir de ?campos=a,b,c validando contra una lista blanca."""
+    if not campos:
+        elegidos = list(por_defecto)
+    else:
+        elegidos = [c.strip() for c in campos.split(",") if c.strip()]
+        invalidos = [c for c in elegidos if c not in permitidos]
+        if invalidos:
+            raise HTTPException(status_code=400, detail=f"Campos no permitidos: {', '.join(invalidos)}")
+    for c in reversed(obligatorios):
+        if c not in elegidos:
+            elegidos.insert(0, c)
+    return ", ".join(elegidos)
+
+def filtro_keyset(campo_orden: str, cursor: dict) -> str:
+    """Filtro or() de PostgREST para 'después de' (campo_orden, id) en orden descendente."""
+    valor, id_ = cursor.get(campo_orden), cursor.get("id")
+    return f'{campo_orden}.lt."{valor}",and({campo_orden}.eq."{valor}",id.lt.{id_})'
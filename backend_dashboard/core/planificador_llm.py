@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import random
+import logging
+import threading
+from collections import deque, OrderedDict
+from core.prioridad import INTERACTIVA, FONDO, clase_actual, inquilino_actual
+
+logger = logging.getLogger(__name__)
+
+# --- PLANIFICADOR DE LLAMADAS A GEMINI ---
+# Toda llamada a Gemini (chat, analista, memoria, resúmenes, embeddings, audio) pide turno acá:
+# - Un token bucket por modelo (requests por minuto, configurable por entorno).
+# - Dos clases: interactiva antes que fondo; el fondo igual pasa si lleva mucho esperando.
+# - Dentro de cada clase, round-robin por inquilino (usuario / proceso): nadie acapara la cola.
+# - Un 429 pausa el bucket de ese modelo para todos y la llamada se reintenta con backoff.
+# El modelo se elige por subcadena: "gemini-2.0-flash" cubre "models/gemini-2.0-flash-001".
+
+LIMITES_RPM = {
+    "gemini-2.0-flash": 1000,
+    "text-embedding-004": 1500,
+    "embedding-001": 1500,
+}
+# Override por entorno: LLM_LIMITES_RPM='{"gemini-2.0-flash": 300}'
+LIMITES_RPM.update(json.loads(os.getenv("LLM_LIMITES_RPM", "{}")))
+LIMITE_RPM_DEFECTO = int(os.getenv("LLM_LIMITE_RPM_DEFECTO", "300"))
+ANTI_INANICION_SEG = float(os.getenv("LLM_ANTI_INANICION_SEG", "20"))
+LLM_REINTENTOS = int(os.getenv("LLM_REINTENTOS", "4"))
+BACKOFF_BASE_SEG = 1.0
+BACKOFF_MAX_SEG = 30.0
+
+CLASES = (INTERACTIVA, FONDO)
+
+def familia_modelo(modelo: str) -> str:
+    modelo = (modelo or "").removeprefix("models/")
+    for clave in sorted(LIMITES_RPM, key=len, reverse=True):
+        if clave in modelo:
+            return clave
+    return modelo
+
+def es_throttling(error: Exception) -> bool:
+    texto = f"{type(error).__name__} {error}"
+    return any(m in texto for m in ("ResourceExhausted", "TooManyRequests", "429", "RESOURCE_EXHAUSTED", "Quota exceeded"))
+
+class CuboTokens:
+    def __init__(self, rpm: float, rafaga: float = None):
+        self.tasa = rpm / 60.0
+        self.capacidad = rafaga or max(1.0, rpm / 6.0)  # Hasta 10 s de ráfaga
+        self.tokens = self.capacidad
+        self._ultimo = time.monotonic()
+        self.pausa_hasta = 0.0
+
+    def _rellenar(self, ahora: float):
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self._ultimo) * self.tasa)
+        self._ultimo = ahora
+
+    def tomar(self) -> float:
+        """0 si consumió un token; si no, segundos hasta que haya uno."""
+        ahora = time.monotonic()
+        if ahora < self.pausa_hasta:
+            return self.pausa_hasta - ahora
+        self._rellenar(ahora)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.tasa
+
+    def pausar(self, segundos: float):
+        self.pausa_hasta = max(self.pausa_hasta, time.monotonic() + segundos)
+        self.tokens = 0.0
+
+class _Turno:
+    __slots__ = ("clase", "inquilino", "creado", "evento")
+
+    def __init__(self, clase: str, inquilino: str):
+        self.clase = clase
+        self.inquilino = inquilino
+        self.creado = time.monotonic()
+        self.evento = threading.Event()
+
+class PlanificadorLLM:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._colas = {}   # familia -> {clase -> OrderedDict(inquilino -> deque[_Turno])}
+        self._cubos = {}   # familia -> CuboTokens
+        self._hilo = None
+        self._stats = {c: {"despachadas": 0, "espera_total": 0.0, "espera_max": 0.0, "reintentos_429": 0, "errores": 0}
+                       for c in CLASES}
+
+    # --- Cola ---
+    def _cubo(self, familia: str) -> CuboTokens:
+        if familia not in self._cubos:
+            self._cubos[familia] = CuboTokens(LIMITES_RPM.get(familia, LIMITE_RPM_DEFECTO))
+        return self._cubos[familia]
+
+    def _encolar(self, familia: str, turno: _Turno):
+        colas = self._colas.setdefault(familia, {c: OrderedDict() for c in CLASES})
+        colas[turno.clase].setdefault(turno.inquilino, deque()).append(turno)
+
+    @staticmethod
+    def _primero(cola: OrderedDict):
+        return next(iter(cola.values()))[0] if cola else None
+
+    def _siguiente(self, familia: str):
+        colas = self._colas.get(familia)
+        if not colas:
+            return None
+        interactiva, fondo = colas[INTERACTIVA], colas[FONDO]
+        clase = INTERACTIVA if interactiva else FONDO
+        # Anti-inanición: el fondo pasa adelante si su primero lleva demasiado esperando
+        mas_viejo_fondo = self._primero(fondo)
+        if interactiva and mas_viejo_fondo and time.monotonic() - mas_viejo_fondo.creado > ANTI_INANICION_SEG:
+            clase = FONDO
+        cola = colas[clase]
+        if not cola:
+            return None
+        # Round-robin: atendemos al primer inquilino y lo mandamos al final
+        inquilino, pendientes = next(iter(cola.items()))
+        turno = pendientes.popleft()
+        del cola[inquilino]
+        if pendientes:
+            cola[inquilino] = pendientes
+        return turno
+
+    def _hay_pendientes(self, familia: str) -> bool:
+        colas = self._colas.get(familia)
+        return bool(colas and (colas[INTERACTIVA] or colas[FONDO]))
+
+    def _despachar(self):
+        with self._cond:
+            while True:
+                espera_minima = None
+                for familia in list(self._colas):
+                    while self._hay_pendientes(familia):
+                        espera = self._cubo(familia).tomar()
+                        if espera > 0:
+                            espera_minima = espera if espera_minima is None else min(espera_minima, espera)
+                            break
+                        turno = self._siguiente(familia)
+                        stats = self._stats[turno.clase]
+                        esperado = time.monotonic() - turno.creado
+                        stats["despachadas"] += 1
+                        stats["espera_total"] += esperado
+                        stats["espera_max"] = max(stats["espera_max"], esperado)
+                        turno.evento.set()
+                self._cond.wait(timeout=espera_minima)
+
+    def _iniciar(self):
+        if self._hilo is None:
+            with self._cond:
+                if self._hilo is None:
+                    self._hilo = threading.Thread(target=self._despachar, daemon=True, name="planificador-llm")
+                    self._hilo.start()
+
+    def _esperar_turno(self, familia: str, clase: str, inquilino: str):
+        self._iniciar()
+        turno = _Turno(clase, inquilino)
+        with self._cond:
+            self._encolar(familia, turno)
+            self._cond.notify()
+        turno.evento.wait()
+
+    # --- API ---
+    def ejecutar(self, modelo: str, funcion, *args, **kwargs):
+        """Corre `funcion(*args, **kwargs)` cuando hay cupo para `modelo`, con la clase/inquilino del contexto."""
+        familia = familia_modelo(modelo)
+        clase = clase_actual() if clase_actual() in CLASES else FONDO
+        inquilino = inquilino_actual()
+        for intento in range(LLM_REINTENTOS + 1):
+            self._esperar_turno(familia, clase, inquilino)
+            try:
+                return funcion(*args, **kwargs)
+            except Exception as e:
+                if not es_throttling(e) or intento == LLM_REINTENTOS:
+                    with self._cond:
+                        self._stats[clase]["errores"] += 1
+                    raise
+                espera = min(BACKOFF_BASE_SEG * 2 ** intento, BACKOFF_MAX_SEG) * random.uniform(0.5, 1.0)
+                with self._cond:
+                    self._stats[clase]["reintentos_429"] += 1
+                    # Un 429 es información para todos: frenamos el modelo entero, no solo esta llamada
+                    self._cubo(familia).pausar(espera)
+                logger.warning(f"⏳ 429 en {familia} ({clase}). Reintento {intento + 1} en {espera:.1f}s.")
+
+    def metricas(self) -> dict:
+        with self._cond:
+            en_cola = {c: 0 for c in CLASES}
+            for colas in self._colas.values():
+                for clase, cola in colas.items():
+                    en_cola[clase] += sum(len(d) for d in cola.values())
+            clases = {}
+            for clase, s in self._stats.items():
+                clases[clase] = {
+                    **s,
+                    "en_cola": en_cola[clase],
+                    "espera_media": round(s["espera_total"] / s["despachadas"], 4) if s["despachadas"] else 0.0,
+                }
+            modelos = {f: {"tokens": round(c.tokens, 2), "pausado": c.pausa_hasta > time.monotonic()}
+                       for f, c in self._cubos.items()}
+        return {"clases": clases, "modelos": modelos}
+
+planificador_llm = PlanificadorLLM()
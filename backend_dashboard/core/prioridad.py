@@ -0,0 +1,60 @@
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# --- PRIORIDAD INTERACTIVA vs. TRABAJO DE FONDO ---
+# El chat marca sus turnos como interactivos; los procesos de fondo (resúmenes,
+# backfills) esperan a que no haya turnos en curso antes de llamar al LLM.
+# La clase y el "inquilino" (usuario o proceso) viajan en contextvars: el planificador
+# de llamadas a Gemini (core/planificador_llm.py) los lee para ordenar su cola.
+# Lo que no está marcado cuenta como fondo.
+
+INTERACTIVA = "interactiva"
+FONDO = "fondo"
+
+_activos = 0
+_condicion = threading.Condition()
+_clase = contextvars.ContextVar("clase_llm", default=FONDO)
+_inquilino = contextvars.ContextVar("inquilino_llm", default="general")
+
+@contextmanager
+def _en_clase(clase: str, inquilino: str):
+    token_clase = _clase.set(clase)
+    token_inquilino = _inquilino.set(inquilino)
+    try:
+        yield
+    finally:
+        _clase.reset(token_clase)
+        _inquilino.reset(token_inquilino)
+
+@contextmanager
+def trabajo_interactivo(inquilino: str = "general"):
+    global _activos
+    with _condicion:
+        _activos += 1
+    try:
+        with _en_clase(INTERACTIVA, inquilino):
+            yield
+    finally:
+        with _condicion:
+            _activos -= 1
+            _condicion.notify_all()
+
+@contextmanager
+def trabajo_de_fondo(inquilino: str = "general"):
+    with _en_clase(FONDO, inquilino):
+        yield
+
+def clase_actual() -> str:
+    return _clase.get()
+
+def inquilino_actual() -> str:
+    return _inquilino.get()
+
+def interactivos_en_curso() -> int:
+    return _activos
+
+def esperar_turno_de_fondo(max_espera: float = 30.0) -> bool:
+    """Bloquea hasta que no haya turnos interactivos (o hasta max_espera, para no morir de hambre)."""
+    with _condicion:
+        return _condicion.wait_for(lambda: _activos == 0, timeout=max_espera)
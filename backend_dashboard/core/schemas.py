@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, field_validator, model_validator
-from typing import Optional
+from typing import Optional, List
 from datetime import date, datetime
 import re
 
@@ -129,4 +129,30 @@ class ViajeGestion(AgendaBase):
 
 class EventoOficial(AgendaBase):
     organizador: Optional[str] = None
-    participantes: Optional[str] = None
\ No newline at end of file
+    participantes: Optional[str] = None
+
+class AccionPendiente(BaseModel):
+    tarea: str = Field(..., description="Qué hay que hacer")
+    responsable: Optional[str] = Field(None, description="Quién se comprometió a hacerlo")
+    plazo: Optional[str] = Field(None, description="Fecha o plazo mencionado, tal cual se dijo")
+
+class ResumenActa(BaseModel):
+    resumen: str = Field(..., description="Síntesis de la reunión en 2 a 4 oraciones")
+    asistentes: List[str] = Field(default_factory=list, description="Personas u organismos presentes")
+    decisiones: List[str] = Field(default_factory=list, description="Decisiones tomadas")
+    acciones: List[AccionPendiente] = Field(default_factory=list, description="Tareas acordadas")
+
+    def a_texto(self) -> str:
+        """Formato compacto que se guarda en `resumen_ia` y lee el agente."""
+        partes = [self.resumen.strip()]
+        if self.asistentes:
+            partes.append("Asistentes: " + ", ".join(self.asistentes))
+        if self.decisiones:
+            partes.append("Decisiones:\n" + "\n".join(f"- {d}" for d in self.decisiones))
+        if self.acciones:
+            lineas = []
+            for a in self.acciones:
+                detalle = " / ".join(x for x in (a.responsable, a.plazo) if x)
+                lineas.append(f"- {a.tarea}" + (f" ({detalle})" if detalle else ""))
+            partes.append("Acciones:\n" + "\n".join(lineas))
+        return "\n".join(partes)
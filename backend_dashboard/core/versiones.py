@@ -0,0 +1,41 @@
+import os
+import time
+import uuid
+import hashlib
+import threading
+from collections import defaultdict
+from fastapi import Response
+
+# --- CONTADORES DE CAMBIOS (para ETag / If-None-Match) ---
+# Cada escritura en una tabla incrementa su contador global y, si se conoce, el del usuario.
+# El ETag combina: arranque del proceso + contadores + parámetros de la consulta + ventana
+# de tiempo. La ventana acota cuánto puede durar un 304 obsoleto si otro worker escribió.
+
+_ARRANQUE = uuid.uuid4().hex[:8]
+ETAG_VENTANA_SEG = int(os.getenv("ETAG_VENTANA_SEG", "60"))
+
+_contadores = defaultdict(int)
+_lock = threading.Lock()
+
+def marcar_cambio(tabla: str, usuario: str = None):
+    with _lock:
+        _contadores[(tabla, None)] += 1
+        if usuario:
+            _contadores[(tabla, usuario)] += 1
+
+def version(tabla: str, usuario: str = None) -> str:
+    with _lock:
+        global_ = _contadores[(tabla, None)]
+        propio = _contadores[(tabla, usuario)] if usuario else 0
+    return f"{_ARRANQUE}.{global_}.{propio}"
+
+def calcular_etag(tabla: str, usuario: str = None, *parametros) -> str:
+    ventana = int(time.time() // ETAG_VENTANA_SEG) if ETAG_VENTANA_SEG > 0 else 0
+    base = "|".join(str(p) for p in (tabla, usuario, version(tabla, usuario), ventana, *parametros))
+    return f'W/"{hashlib.sha1(base.encode()).hexdigest()[:20]}"'
+
+def no_modificado(if_none_match: str, etag: str):
+    """Devuelve un 304 si el cliente ya tiene esta versión; si no, None."""
+    if if_none_match and etag in [e.strip() for e in if_none_match.split(",")]:
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
@@ -1,23 +1,29 @@
 import os
+import hmac
+import json
+import uuid
 import logging
 import asyncio
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, UploadFile, File, BackgroundTasks
+from fastapi import FastAPI, HTTPException, UploadFile, File, Header, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional
 
 # --- IMPORTACIONES DEL SISTEMA ---
-from agents.main_agent import get_agent_response
-from tools.docs import procesar_archivo_subido 
-from tools.audio import procesar_audio_gemini
-from tools.database import guardar_acta, obtener_historial_actas, borrar_acta
+# Solo módulos livianos al importar main. LangChain/LangGraph, pandas, pypdf, las APIs
+# de Google y los clientes de Supabase/Gemini se importan en el primer uso (dentro de
+# cada endpoint o en las tareas de fondo), así "/" responde apenas arranca el proceso.
+# Para medir el arranque: python perfil_arranque.py
 from monitoring import session_manager
-
-# Importamos el nuevo servicio de sincronización (Asegúrate de crear este archivo después)
-from services.sync_sheets import sincronizar_google_a_supabase
+from core.prioridad import trabajo_interactivo, trabajo_de_fondo
+from core.versiones import calcular_etag, no_modificado
+from core.paginacion import codificar_cursor, decodificar_cursor, proyectar
+from services.warmup import ejecutar_warmup, estado_warmup
+from services.lote_chat import LOTE_MAX_PREGUNTAS
+from monitoring.metricas import MiddlewareMetricas, monitorear_event_loop, registro as registro_metricas
 
 load_dotenv()
 
@@ -29,13 +35,37 @@ logging.basicConfig(
 logger = logging.getLogger("backend_main")
 
 # --- LIFESPAN (Ciclo de Vida: Tareas de fondo automáticas) ---
+_HUELLA_SYNC = None  # Contenido de la última sincronización que ya se reflejó en la agenda
+
+def _sincronizar():
+    global _HUELLA_SYNC
+    from services.sync_sheets import sincronizar_google_a_supabase
+    huella = sincronizar_google_a_supabase()
+    if huella and huella != _HUELLA_SYNC:
+        # Cambió el contenido: agenda fresca e informes estándar recalculados
+        from tools.analysis import forzar_recarga_agenda
+        from services.informes import almacen_informes
+        if forzar_recarga_agenda():
+            _HUELLA_SYNC = huella
+            almacen_informes.regenerar()
+
+def _iniciar_procesos_actas():
+    """Corre en un hilo: importa las dependencias pesadas fuera del arranque."""
+    from tools.database import indexar_actas_existentes
+    from services.resumenes_actas import resumidor_actas
+    # Resúmenes de actas en segundo plano (nuevas + las que quedaron sin resumen)
+    resumidor_actas.iniciar()
+    resumidor_actas.encolar_pendientes()
+    # Backfill del índice de actas (solo indexa las que aún no tienen fragmentos)
+    indexar_actas_existentes()
+
 async def ciclo_sincronizacion():
     """Ejecuta la sincronización con Google Sheets cada 10 minutos"""
     while True:
         try:
             logger.info("🔄 Ejecutando auto-sync Google Sheets...")
             # Ejecutamos en un hilo aparte para no bloquear el servidor
-            await asyncio.to_thread(sincronizar_google_a_supabase)
+            await asyncio.to_thread(_sincronizar)
         except Exception as e:
             logger.error(f"⚠️ Error en ciclo de sync: {e}")
         
@@ -45,7 +75,11 @@ async def ciclo_sincronizacion():
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Al iniciar la app: lanzar el bucle
+    # Warmup (agenda, grafo, TLS, embeddings): /health/ready da 503 hasta que termine
+    asyncio.create_task(ejecutar_warmup())
+    asyncio.create_task(monitorear_event_loop())
     task = asyncio.create_task(ciclo_sincronizacion())
+    asyncio.create_task(asyncio.to_thread(_iniciar_procesos_actas))
     yield
     # Al cerrar la app: cancelar (opcional, aquí dejamos que muera con el proceso)
     task.cancel()
@@ -69,8 +103,12 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
     allow_origin_regex=r"https://.*\.vercel\.app",
+    expose_headers=["ETag", "X-Cursor-Siguiente", "X-Total-Registros", "Idempotent-Replayed", "X-Idempotency-Key"],
 )
 
+# Métricas de todas las requests (se agrega último para quedar por fuera de CORS)
+app.add_middleware(MiddlewareMetricas)
+
 # --- MODELOS PYDANTIC ---
 
 class Message(BaseModel):
@@ -84,6 +122,15 @@ class ChatRequest(BaseModel):
     history: Optional[List[Message]] = []
     session_id: Optional[str] = None 
     user_id: str = "usuario_anonimo"
+    idempotency_key: Optional[str] = Field(None, max_length=128)
+
+class LoteRequest(BaseModel):
+    preguntas: List[str] = Field(..., min_length=1, max_length=LOTE_MAX_PREGUNTAS)
+    history: Optional[List[Message]] = []
+    session_id: Optional[str] = None
+    user_id: str = "usuario_anonimo"
+    max_paralelo: Optional[int] = Field(None, ge=1)
+    guardar: bool = True  # Guarda cada pregunta/respuesta en la sesión
 
 # --- ENDPOINTS GENERALES ---
 
@@ -91,67 +138,191 @@ class ChatRequest(BaseModel):
 def read_root():
     return {"status": "online", "system": "MinCYT Dashboard & AI v2.2 (Auto-Sync Activo)"}
 
+@app.get("/health/live")
+def health_live():
+    """Liveness: el proceso responde. No depende de servicios externos."""
+    return {"status": "vivo"}
+
+@app.get("/health/ready")
+def health_ready():
+    """Readiness: 200 solo cuando el warmup terminó (o agotó su presupuesto)."""
+    if not estado_warmup["listo"]:
+        return JSONResponse(status_code=503, content={"status": "calentando", **estado_warmup})
+    return {"status": "listo", **estado_warmup}
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Métricas en formato de texto de Prometheus."""
+    return PlainTextResponse(registro_metricas.exponer(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def _historial_de_sesion(session_id: str) -> list:
+    """Últimos turnos guardados de la sesión, como mensajes para el agente."""
+    historial = []
+    for msg in session_manager.obtener_historial_sesion(session_id, limite=10):
+        if msg.get('mensaje_usuario'):
+            historial.append(Message(
+                id=f"user_{msg['id']}", text=msg['mensaje_usuario'], sender="user", timestamp=msg['timestamp']
+            ))
+        if msg.get('respuesta_bot'):
+            historial.append(Message(
+                id=f"bot_{msg['id']}", text=msg['respuesta_bot'], sender="assistant", timestamp=msg['timestamp']
+            ))
+    return historial
+
+async def _ejecutar_turno_chat(request: ChatRequest, buffer):
+    """Sesión + historial + agente + guardado. Publica los eventos SSE de la respuesta en `buffer`."""
+    from agents.main_agent import get_agent_response
+    from services.eventos_chat import partir_respuesta
+
+    try:
+        session_id = request.session_id
+        
+        # Auto-creación de sesión si no existe o es temporal
+        if not session_id or str(session_id).startswith("local-"):
+            titulo_sesion = f"Chat: {request.message[:30]}..."
+            session_id = await asyncio.to_thread(session_manager.crear_nueva_sesion, request.user_id, titulo_sesion)
+            await buffer.publicar("sesion", f"SESSION_ID:{session_id}")
+        
+        # Recuperación de historial
+        historial_previo = request.history or await asyncio.to_thread(_historial_de_sesion, session_id)
+
+        # Generación de respuesta (Agente), en un hilo para no bloquear el event loop
+        def _responder():
+            with trabajo_interactivo(request.user_id):
+                respuesta = get_agent_response(request.message, historial_previo)
+                if hasattr(respuesta, '__iter__') and not isinstance(respuesta, str):
+                    respuesta = "".join(respuesta)
+                return respuesta
+        respuesta_completa = await asyncio.to_thread(_responder)
+        for parte in partir_respuesta(respuesta_completa):
+            await buffer.publicar("mensaje", parte)
+        
+        # Guardado (una sola vez por idempotency_key)
+        await asyncio.to_thread(
+            session_manager.guardar_mensaje,
+            sesion_id=session_id,
+            mensaje_usuario=request.message,
+            respuesta_bot=respuesta_completa,
+            herramientas_usadas=[],
+            user_id=request.user_id
+        )
+    except Exception as e:
+        logger.error(f"❌ Error crítico en chat_endpoint: {str(e)}", exc_info=True)
+        await buffer.publicar("error", f"Error del sistema: {str(e)}")
+        raise
+    finally:
+        await buffer.cerrar()
+
+def _respuesta_sse(ejecucion, ultimo_id: int, headers: dict) -> StreamingResponse:
+    headers = {**headers, "Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(ejecucion.buffer.transmitir(ultimo_id), media_type="text/event-stream", headers=headers)
+
 @app.post("/api/chat")
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(
+    request: ChatRequest,
+    idempotency_key: Optional[str] = Header(None),
+    last_event_id: Optional[str] = Header(None),
+):
     """
-    Endpoint de Chat optimizado con Streaming y Sesiones
+    Endpoint de Chat con Streaming SSE (text/event-stream) y Sesiones.
+    Con idempotency_key (en el cuerpo o en el header Idempotency-Key), los reintentos y
+    dobles envíos se enganchan a la misma ejecución o reciben la respuesta ya calculada.
+    Repetir el POST con Last-Event-ID retoma el stream desde ese evento.
     """
-    async def generate_response_stream():
-        try:
-            session_id = request.session_id
-            
-            # Auto-creación de sesión si no existe o es temporal
-            if not session_id or str(session_id).startswith("local-"):
-                titulo_sesion = f"Chat: {request.message[:30]}..."
-                session_id = session_manager.crear_nueva_sesion(request.user_id, titulo_sesion)
-                yield f"data: SESSION_ID:{session_id}\n\n"
-            
-            # Recuperación de historial
-            historial_previo = []
-            if not request.history:
-                historial_bd = session_manager.obtener_historial_sesion(session_id, limite=10)
-                for msg in historial_bd:
-                    if msg.get('mensaje_usuario'):
-                        historial_previo.append(Message(
-                            id=f"user_{msg['id']}", text=msg['mensaje_usuario'], sender="user", timestamp=msg['timestamp']
-                        ))
-                    if msg.get('respuesta_bot'):
-                        historial_previo.append(Message(
-                            id=f"bot_{msg['id']}", text=msg['respuesta_bot'], sender="assistant", timestamp=msg['timestamp']
-                        ))
-            else:
-                historial_previo = request.history
-
-            # Generación de respuesta (Agente)
-            respuesta = get_agent_response(request.message, historial_previo)
-            
-            respuesta_completa = ""
-            if hasattr(respuesta, '__iter__') and not isinstance(respuesta, str):
-                for chunk in respuesta:
-                    respuesta_completa += chunk
-                    yield f"data: {chunk}\n\n"
-            else:
-                respuesta_completa = respuesta
-                yield f"data: {respuesta}\n\n"
-            
-            # Guardado
+    from services.idempotencia_chat import registro_idempotencia, huella_pedido
+    from services.eventos_chat import parsear_last_event_id
+
+    # Sin clave del cliente generamos una: toda respuesta se puede retomar
+    clave_pedido = request.idempotency_key or idempotency_key or uuid.uuid4().hex
+    clave = f"{request.user_id}:{clave_pedido}"
+    huella = huella_pedido(request.message, request.session_id)
+    ultimo_id = parsear_last_event_id(last_event_id)
+    headers = {"X-Idempotency-Key": clave_pedido}
+
+    ejecucion = registro_idempotencia.obtener(clave)
+    if ejecucion and ejecucion.huella != huella:
+        raise HTTPException(status_code=422, detail="idempotency_key ya usada con otro mensaje")
+    if ejecucion:
+        registro_idempotencia.contar_duplicada(ejecucion)
+        if ejecucion.tarea.done():
+            headers["Idempotent-Replayed"] = "true"
+    elif ultimo_id:
+        raise HTTPException(status_code=410, detail="La respuesta ya no está disponible para retomar")
+    else:
+        ejecucion = registro_idempotencia.registrar(clave, huella, lambda buffer: _ejecutar_turno_chat(request, buffer))
+
+    return _respuesta_sse(ejecucion, ultimo_id, headers)
+
+@app.get("/api/chat/stream/{idempotency_key}")
+async def reanudar_chat(
+    idempotency_key: str,
+    user_id: str = "usuario_anonimo",
+    last_event_id: Optional[str] = Header(None),
+):
+    """Retoma un stream por GET (compatible con EventSource, que reenvía Last-Event-ID solo)."""
+    from services.idempotencia_chat import registro_idempotencia
+    from services.eventos_chat import parsear_last_event_id
+
+    ejecucion = registro_idempotencia.obtener(f"{user_id}:{idempotency_key}")
+    if not ejecucion:
+        raise HTTPException(status_code=404, detail="Respuesta no encontrada o vencida")
+    return _respuesta_sse(ejecucion, parsear_last_event_id(last_event_id), {"X-Idempotency-Key": idempotency_key})
+
+@app.post("/api/chat/lote")
+async def chat_lote_endpoint(request: LoteRequest):
+    """
+    Varias preguntas en paralelo (hasta LOTE_MAX_PARALELO) sobre la misma sesión y la misma
+    foto de la agenda. Stream SSE: un evento 'resultado' (JSON) por pregunta, en orden de
+    llegada, y un 'fin' con el resumen.
+    """
+    from services.lote_chat import ejecutar_lote, LOTE_MAX_PARALELO
+    from services.eventos_chat import formatear_evento
+
+    preguntas = [p.strip() for p in request.preguntas if p and p.strip()]
+    if not preguntas or any(len(p) > 4000 for p in preguntas):
+        raise HTTPException(status_code=422, detail="Preguntas vacías o demasiado largas (máx. 4000 caracteres)")
+
+    async def generar():
+        numero = 0
+        t0 = asyncio.get_running_loop().time()
+        session_id = request.session_id
+        if not session_id or str(session_id).startswith("local-"):
+            session_id = await asyncio.to_thread(
+                session_manager.crear_nueva_sesion, request.user_id, f"Lote: {len(preguntas)} preguntas"
+            )
+            numero += 1
+            yield formatear_evento(numero, "sesion", f"SESSION_ID:{session_id}")
+
+        historial = request.history or await asyncio.to_thread(_historial_de_sesion, session_id)
+
+        def guardar(pregunta, respuesta):
             session_manager.guardar_mensaje(
-                sesion_id=session_id,
-                mensaje_usuario=request.message,
-                respuesta_bot=respuesta_completa,
-                herramientas_usadas=[] 
+                sesion_id=session_id, mensaje_usuario=pregunta, respuesta_bot=respuesta,
+                herramientas_usadas=[], user_id=request.user_id
             )
 
-        except Exception as e:
-            logger.error(f"❌ Error crítico en chat_endpoint: {str(e)}", exc_info=True)
-            yield f"data: Error del sistema: {str(e)}\n\n"
+        correctas = 0
+        async for resultado in ejecutar_lote(
+            preguntas, historial, request.user_id,
+            max_paralelo=request.max_paralelo or LOTE_MAX_PARALELO,
+            al_responder=guardar if request.guardar else None,
+        ):
+            correctas += resultado["ok"]
+            numero += 1
+            yield formatear_evento(numero, "resultado", json.dumps(resultado, ensure_ascii=False))
 
-    return StreamingResponse(generate_response_stream(), media_type="text/plain")
+        resumen = {"total": len(preguntas), "ok": correctas,
+                   "segundos": round(asyncio.get_running_loop().time() - t0, 2)}
+        yield formatear_evento(numero + 1, "fin", json.dumps(resumen))
+
+    return StreamingResponse(generar(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # --- ENDPOINTS DE ARCHIVOS Y AUDIO ---
 
 @app.post("/api/upload")
 def upload_file_endpoint(file: UploadFile = File(...)):
+    from tools.docs import procesar_archivo_subido
     # Extensiones permitidas para RAG (Búsqueda documental)
     allowed_extensions = ('.pdf', '.xlsx', '.xls', '.csv', '.docx', '.txt')
     
@@ -159,7 +330,9 @@ def upload_file_endpoint(file: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail="Formato no permitido.")
     
     try:
-        exito, mensaje = procesar_archivo_subido(file)
+        # Ingesta masiva de embeddings: cede el cupo de Gemini a los chats en curso
+        with trabajo_de_fondo("ingesta"):
+            exito, mensaje = procesar_archivo_subido(file)
         if exito:
             return {"status": "ok", "message": mensaje}
         else:
@@ -169,29 +342,90 @@ def upload_file_endpoint(file: UploadFile = File(...)):
         logger.error(f"Error upload exception: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Error interno procesando archivo")
 
-@app.post("/upload-audio/") 
-def upload_audio_endpoint(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+@app.post("/upload-audio/", status_code=202) 
+def upload_audio_endpoint(file: UploadFile = File(...)):
+    """Recibe el audio y lanza la transcripción en segundo plano. Devuelve el id del trabajo."""
+    from tools.audio import guardar_audio_temporal
+    from services.trabajos_audio import gestor_trabajos_audio, COMPLETADO
     if not file.content_type.startswith('audio/'):
          raise HTTPException(status_code=400, detail="El archivo debe ser de audio válido.")
     
     try:
-        texto = procesar_audio_gemini(file)
-        if texto:
-            background_tasks.add_task(guardar_acta, transcripcion=texto)
-        return {"mensaje": "Éxito", "transcripcion": texto}
+        tmp_path, mime_type, hash_audio = guardar_audio_temporal(file)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Error procesando audio: {e}", exc_info=True)
+        logger.error(f"Error recibiendo audio: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+    trabajo_id = gestor_trabajos_audio.crear(tmp_path, mime_type, hash_audio)
+    trabajo = gestor_trabajos_audio.obtener(trabajo_id)
+    if trabajo["estado"] == COMPLETADO:
+        # Audio ya transcripto (mismo hash): respondemos directo con el acta existente
+        return {"mensaje": "Éxito", "trabajo_id": trabajo_id, "estado": COMPLETADO,
+                "transcripcion": trabajo["transcripcion"], "acta_id": trabajo["acta_id"]}
+    return {"mensaje": "Audio recibido. Transcripción en curso.", "trabajo_id": trabajo_id, "estado": trabajo["estado"]}
+
+@app.get("/api/audio/trabajos/{trabajo_id}")
+def get_estado_trabajo_audio(trabajo_id: str):
+    from services.trabajos_audio import gestor_trabajos_audio
+    trabajo = gestor_trabajos_audio.obtener(trabajo_id)
+    if not trabajo:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return trabajo
+
+@app.get("/api/audio/trabajos/{trabajo_id}/resultado")
+def get_resultado_trabajo_audio(trabajo_id: str):
+    from services.trabajos_audio import gestor_trabajos_audio, COMPLETADO, ERROR
+    trabajo = gestor_trabajos_audio.obtener(trabajo_id)
+    if not trabajo:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    if trabajo["estado"] == ERROR:
+        raise HTTPException(status_code=500, detail=trabajo["error"])
+    if trabajo["estado"] != COMPLETADO:
+        return JSONResponse(status_code=202, content={"estado": trabajo["estado"]})
+    return {"mensaje": "Éxito", "transcripcion": trabajo["transcripcion"], "acta_id": trabajo["acta_id"]}
+
+@app.get("/api/emails/{mensaje_id}")
+def get_estado_email(mensaje_id: str):
+    from services.correo_saliente import cola_correo
+    mensaje = cola_correo.estado(mensaje_id)
+    if not mensaje:
+        raise HTTPException(status_code=404, detail="Email no encontrado")
+    return mensaje
+
 # --- ENDPOINTS DE SESIONES Y ACTAS ---
 
+# Proyecciones livianas para listados (las columnas pesadas quedan para el detalle)
+CAMPOS_SESION = ("id", "user_id", "titulo_sesion", "created_at", "last_active")
+CAMPOS_ACTA_LISTA = ("id", "created_at", "titulo", "resumen_ia")
+CAMPOS_ACTA = CAMPOS_ACTA_LISTA + ("transcripcion", "hash_audio")
+
 @app.get("/api/sesiones/{user_id}")
-def get_sesiones_usuario(user_id: str):
+def get_sesiones_usuario(
+    user_id: str,
+    limite: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    campos: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+):
+    etag = calcular_etag("sesiones_chat", user_id, limite, cursor, campos)
+    if (cacheada := no_modificado(if_none_match, etag)):
+        return cacheada
+
+    columnas = proyectar(campos, CAMPOS_SESION, CAMPOS_SESION, obligatorios=("id", "last_active"))
+    desde = decodificar_cursor(cursor, campo_fecha="last_active") if cursor else None
     try:
-        sesiones = session_manager.listar_sesiones_usuario(user_id, limite=20)
-        return {"sesiones": sesiones}
-    except Exception as e:
-        return {"sesiones": []}
+        sesiones = session_manager.listar_sesiones_usuario(user_id, limite=limite, cursor=desde, columnas=columnas)
+    except Exception:
+        # Sin ETag: una lista vacía por error no debe quedar cacheada como "esta versión"
+        raise HTTPException(status_code=503, detail="No se pudieron leer las sesiones")
+
+    siguiente = codificar_cursor(sesiones[-1], ("last_active", "id")) if len(sesiones) == limite else None
+    return JSONResponse(
+        content={"sesiones": sesiones, "cursor_siguiente": siguiente},
+        headers={"ETag": etag}
+    )
 
 @app.get("/api/sesiones/{sesion_id}/historial")
 def get_historial_sesion(sesion_id: str):
@@ -202,16 +436,158 @@ def get_historial_sesion(sesion_id: str):
         return {"historial": []}
 
 @app.get("/actas")
-def get_actas():
+def get_actas(
+    limite: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = None,
+    campos: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Listado paginado de actas. El cuerpo sigue siendo una lista; el cursor de la
+    página siguiente viaja en el header X-Cursor-Siguiente.
+    """
+    from tools.database import obtener_historial_actas
+    etag = calcular_etag("actas_reunion", None, limite, cursor, campos)
+    if (cacheada := no_modificado(if_none_match, etag)):
+        return cacheada
+
+    columnas = proyectar(campos, CAMPOS_ACTA, CAMPOS_ACTA_LISTA, obligatorios=("id", "created_at"))
+    desde = decodificar_cursor(cursor, campo_fecha="created_at") if cursor else None
     try:
-        return obtener_historial_actas()
+        actas = obtener_historial_actas(limite=limite, cursor=desde, columnas=columnas) or []
     except Exception as e:
-        return []
+        logger.error(f"Error listando actas: {e}")
+        raise HTTPException(status_code=503, detail="No se pudieron leer las actas")
+
+    headers = {"ETag": etag}
+    if len(actas) == limite:
+        headers["X-Cursor-Siguiente"] = codificar_cursor(actas[-1], ("created_at", "id"))
+    return JSONResponse(content=actas, headers=headers)
+
+@app.get("/actas/{id_acta}")
+def get_acta(id_acta: int, if_none_match: Optional[str] = Header(None)):
+    from tools.database import obtener_acta
+    etag = calcular_etag("actas_reunion", None, "detalle", id_acta)
+    if (cacheada := no_modificado(if_none_match, etag)):
+        return cacheada
+    acta = obtener_acta(id_acta)
+    if not acta:
+        raise HTTPException(status_code=404, detail="Acta no encontrada")
+    return JSONResponse(content=acta, headers={"ETag": etag})
 
 @app.delete("/actas/{id_acta}")
 def delete_acta_endpoint(id_acta: int):
+    from tools.database import borrar_acta
     try:
         if borrar_acta(id_acta): return {"status": "ok"}
         raise HTTPException(status_code=404, detail="Acta no encontrada")
     except Exception:
-        raise HTTPException(status_code=500, detail="Error interno al borrar")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Error interno al borrar")
+
+# --- AGENDA (desde la caché en memoria) ---
+
+@app.get("/api/agenda")
+def get_agenda(
+    fecha_desde: Optional[str] = None,
+    fecha_hasta: Optional[str] = None,
+    funcionario: Optional[str] = None,
+    lugar: Optional[str] = None,
+    ambito: Optional[str] = None,
+    moneda: Optional[str] = None,
+    orden: str = "fecha",
+    limite: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    campos: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Agenda filtrada, ordenada (orden=fecha|-fecha|costo|...) y paginada por cursor.
+    Mismo formato que /actas: lista en el cuerpo, cursor en X-Cursor-Siguiente y el
+    total filtrado en X-Total-Registros.
+    """
+    from tools.analysis import get_df_optimizado, version_agenda
+    from services.agenda import consultar_agenda, CAMPOS_AGENDA, CAMPOS_AGENDA_LISTA
+
+    filtros = {"fecha_desde": fecha_desde, "fecha_hasta": fecha_hasta, "funcionario": funcionario,
+               "lugar": lugar, "ambito": ambito, "moneda": moneda}
+    columnas = proyectar(campos, CAMPOS_AGENDA, CAMPOS_AGENDA_LISTA, obligatorios=("id_hash",))
+    desde = decodificar_cursor(cursor) if cursor else None
+
+    get_df_optimizado()  # Recarga si venció el TTL, así la versión del ETag es la que se va a servir
+    etag = calcular_etag("agenda_unificada", None, version_agenda(), sorted(filtros.items()), orden, limite, cursor, columnas)
+    if (cacheada := no_modificado(if_none_match, etag)):
+        return cacheada
+
+    filas, total, ultima = consultar_agenda(filtros, orden=orden, limite=limite, cursor=desde,
+                                            columnas=tuple(columnas.split(", ")))
+
+    headers = {"ETag": etag, "X-Total-Registros": str(total)}
+    if ultima:
+        headers["X-Cursor-Siguiente"] = codificar_cursor(ultima, ("campo", "orden", "id_hash"))
+    return JSONResponse(content=filas, headers=headers)
+
+# --- INFORMES ESTÁNDAR ---
+
+@app.get("/api/informes")
+def listar_informes():
+    from services.informes import almacen_informes
+    return {"version": almacen_informes.version, "informes": almacen_informes.catalogo()}
+
+@app.get("/api/informes/{nombre}")
+def get_informe(nombre: str, request: Request, if_none_match: Optional[str] = Header(None)):
+    """Informe precalculado; los parámetros van como query (ej: ?anio=2024). Lleva la versión de datos."""
+    from services.informes import almacen_informes
+
+    parametros = {k: v for k, v in request.query_params.items()}
+    try:
+        resultado = almacen_informes.obtener(nombre, **parametros)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Informe no encontrado: {nombre}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    etag = calcular_etag("informes", None, resultado["version"], nombre, sorted(resultado["parametros"].items()))
+    if (cacheada := no_modificado(if_none_match, etag)):
+        return cacheada
+    return JSONResponse(content=resultado, headers={"ETag": etag})
+
+# --- DEBUG: TRAZAS DEL AGENTE ---
+# Exponen preguntas de usuarios y argumentos de tools: solo existen si DEBUG_TOKEN está
+# definido, y hay que mandarlo en el header X-Debug-Token.
+
+def _verificar_debug(x_debug_token: Optional[str]):
+    token = os.getenv("DEBUG_TOKEN")
+    if not token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest((x_debug_token or "").encode(), token.encode()):
+        raise HTTPException(status_code=403, detail="Token de debug inválido")
+
+@app.get("/debug/trazas")
+def get_trazas(
+    limite: int = Query(50, ge=1, le=500),
+    tool: Optional[str] = None,
+    min_ms: Optional[float] = None,
+    x_debug_token: Optional[str] = Header(None),
+):
+    """Turnos muestreados más recientes (sin spans). Filtros: tool usada, duración mínima."""
+    from monitoring.tracing import trazas_recientes
+    _verificar_debug(x_debug_token)
+    return trazas_recientes(limite=limite, tool=tool, min_ms=min_ms)
+
+@app.get("/debug/trazas.jsonl")
+def exportar_trazas(x_debug_token: Optional[str] = Header(None)):
+    from monitoring.tracing import exportar_jsonl
+    _verificar_debug(x_debug_token)
+    return StreamingResponse(
+        exportar_jsonl(), media_type="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=trazas.jsonl"}
+    )
+
+@app.get("/debug/trazas/{traza_id}")
+def get_traza(traza_id: str, x_debug_token: Optional[str] = Header(None)):
+    from monitoring.tracing import obtener_traza
+    _verificar_debug(x_debug_token)
+    traza = obtener_traza(traza_id)
+    if not traza:
+        raise HTTPException(status_code=404, detail="Traza no encontrada (o ya salió del buffer)")
+    return traza
@@ -0,0 +1,266 @@
+import sys
+import time
+import asyncio
+import logging
+import threading
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+# --- MÉTRICAS (formato de texto de Prometheus) ---
+# Implementación mínima sin dependencias: contadores, gauges e histogramas con labels,
+# un middleware ASGI que mide todas las requests (incluido el streaming del chat)
+# y un monitor del lag del event loop. Se exponen en GET /metrics.
+
+BUCKETS_HTTP = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+BUCKETS_LAG = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+INTERVALO_LAG_SEG = 0.5
+
+def _labels(nombres, valores) -> str:
+    if not nombres:
+        return ""
+    pares = []
+    for n, v in zip(nombres, valores):
+        v = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pares.append(f'{n}="{v}"')
+    return "{" + ",".join(pares) + "}"
+
+def _num(valor) -> str:
+    return repr(float(valor)) if valor != int(valor) else str(int(valor))
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nombre: str, ayuda: str, labels: tuple = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.labels = tuple(labels)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def _cabecera(self) -> list:
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def inc(self, *labels, valor: float = 1):
+        with self._lock:
+            self._valores[labels] = self._valores.get(labels, 0) + valor
+
+    def exponer(self) -> list:
+        with self._lock:
+            items = list(self._valores.items())
+        return self._cabecera() + [f"{self.nombre}{_labels(self.labels, k)} {_num(v)}" for k, v in items]
+
+class Gauge(_Metrica):
+    tipo = "gauge"
+
+    def set(self, *labels, valor: float):
+        with self._lock:
+            self._valores[labels] = valor
+
+    def inc(self, *labels, valor: float = 1):
+        with self._lock:
+            self._valores[labels] = self._valores.get(labels, 0) + valor
+
+    def dec(self, *labels, valor: float = 1):
+        self.inc(*labels, valor=-valor)
+
+    def exponer(self) -> list:
+        with self._lock:
+            items = list(self._valores.items())
+        return self._cabecera() + [f"{self.nombre}{_labels(self.labels, k)} {_num(v)}" for k, v in items]
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, labels: tuple = (), buckets: tuple = BUCKETS_HTTP):
+        super().__init__(nombre, ayuda, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observar(self, *labels, valor: float):
+        with self._lock:
+            serie = self._valores.get(labels)
+            if serie is None:
+                serie = self._valores[labels] = {"cuentas": [0] * (len(self.buckets) + 1), "suma": 0.0, "total": 0}
+            serie["cuentas"][bisect_left(self.buckets, valor)] += 1
+            serie["suma"] += valor
+            serie["total"] += 1
+
+    def exponer(self) -> list:
+        with self._lock:
+            items = [(k, {"cuentas": list(v["cuentas"]), "suma": v["suma"], "total": v["total"]}) for k, v in self._valores.items()]
+        lineas = self._cabecera()
+        for labels, serie in items:
+            acumulado = 0
+            for limite, cuenta in zip(self.buckets + (float("inf"),), serie["cuentas"]):
+                acumulado += cuenta
+                le = "+Inf" if limite == float("inf") else _num(limite)
+                lineas.append(f"{self.nombre}_bucket{_labels(self.labels + ('le',), labels + (le,))} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_labels(self.labels, labels)} {_num(serie['suma'])}")
+            lineas.append(f"{self.nombre}_count{_labels(self.labels, labels)} {serie['total']}")
+        return lineas
+
+class Registro:
+    def __init__(self):
+        self.metricas = []
+        # Funciones sin argumentos que devuelven [(nombre, ayuda, valor)]; el nombre puede traer labels.
+        # Familia terminada en _total = contador (valor acumulado); cualquier otra, gauge.
+        self.recolectores = []
+
+    def registrar(self, metrica):
+        self.metricas.append(metrica)
+        return metrica
+
+    def recolector(self, funcion):
+        self.recolectores.append(funcion)
+        return funcion
+
+    def exponer(self) -> str:
+        lineas = []
+        for m in self.metricas:
+            lineas += m.exponer()
+        # Las series de una misma familia tienen que salir juntas, bajo un único HELP/TYPE
+        familias = {}
+        for funcion in self.recolectores:
+            try:
+                for nombre, ayuda, valor in funcion():
+                    familia = nombre.split("{")[0]
+                    if familia not in familias:
+                        tipo = "counter" if familia.endswith("_total") else "gauge"
+                        familias[familia] = [f"# HELP {familia} {ayuda}", f"# TYPE {familia} {tipo}"]
+                    familias[familia].append(f"{nombre} {_num(valor)}")
+            except Exception as e:
+                logger.warning(f"⚠️ Recolector de métricas falló: {e}")
+        for series in familias.values():
+            lineas += series
+        return "\n".join(lineas) + "\n"
+
+registro = Registro()
+
+http_requests = registro.registrar(Contador(
+    "http_requests_total", "Requests HTTP atendidas.", ("metodo", "ruta", "status")))
+http_duracion = registro.registrar(Histograma(
+    "http_request_duration_seconds", "Duración de la request hasta el último byte.", ("metodo", "ruta")))
+# La ruta se conoce recién después del routing: el gauge de requests en curso va por método
+http_en_curso = registro.registrar(Gauge(
+    "http_requests_en_curso", "Requests HTTP en curso.", ("metodo",)))
+chat_streams_en_curso = registro.registrar(Gauge(
+    "chat_streams_en_curso", "Streams de /api/chat abiertos."))
+chat_primer_fragmento = registro.registrar(Histograma(
+    "chat_primer_fragmento_seconds", "Tiempo hasta el primer evento de texto del stream de /api/chat."))
+chat_duracion_stream = registro.registrar(Histograma(
+    "chat_stream_duration_seconds", "Duración total del stream de /api/chat."))
+event_loop_lag = registro.registrar(Histograma(
+    "event_loop_lag_seconds", "Retraso del event loop respecto de lo programado.", buckets=BUCKETS_LAG))
+event_loop_lag_actual = registro.registrar(Gauge(
+    "event_loop_lag_actual_seconds", "Último retraso medido del event loop."))
+
+RUTAS_STREAM = {"/api/chat", "/api/chat/stream/{idempotency_key}", "/api/chat/lote"}
+
+def _ruta(scope) -> str:
+    """Plantilla de la ruta (/actas/{id_acta}) para no explotar la cardinalidad con ids."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "sin_ruta"
+
+class MiddlewareMetricas:
+    """Middleware ASGI puro: no bufferea el cuerpo, así mide bien las respuestas en streaming."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        metodo = scope["method"]
+        t0 = time.perf_counter()
+        estado = {"status": 500, "stream": False}
+        http_en_curso.inc(metodo)
+
+        async def send_medido(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado["status"] = mensaje["status"]
+                if _ruta(scope) in RUTAS_STREAM:
+                    estado["stream"] = True
+                    chat_streams_en_curso.inc()
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, send_medido)
+        finally:
+            duracion = time.perf_counter() - t0
+            ruta = _ruta(scope)
+            http_en_curso.dec(metodo)
+            if estado["stream"]:
+                chat_streams_en_curso.dec()
+            http_requests.inc(metodo, ruta, str(estado["status"]))
+            http_duracion.observar(metodo, ruta, valor=duracion)
+            # El primer fragmento lo mide BufferEventos (services/eventos_chat.py)
+            if ruta in RUTAS_STREAM:
+                chat_duracion_stream.observar(valor=duracion)
+
+async def monitorear_event_loop(intervalo: float = INTERVALO_LAG_SEG):
+    """Duerme `intervalo` y mide cuánto tarde se despierta: eso es trabajo bloqueando el loop."""
+    loop = asyncio.get_running_loop()
+    while True:
+        esperado = loop.time() + intervalo
+        await asyncio.sleep(intervalo)
+        lag = max(loop.time() - esperado, 0.0)
+        event_loop_lag.observar(valor=lag)
+        event_loop_lag_actual.set(valor=lag)
+
+@registro.recolector
+def _metricas_de_servicios():
+    """Solo reporta módulos ya importados: /metrics no debe cargar nada pesado."""
+    valores = []
+    prioridad = sys.modules.get("core.prioridad")
+    if prioridad:
+        valores.append(("chat_turnos_interactivos", "Turnos del agente en curso.", prioridad.interactivos_en_curso()))
+    tools = sys.modules.get("agents.ejecucion_tools")
+    if tools:
+        valores.append(("tools_en_curso", "Tool calls corriendo en el pool (incluye las que el turno dejó de esperar).",
+                        tools.tools_en_curso()))
+    cache = sys.modules.get("tools.cache_embeddings")
+    if cache:
+        m = cache.cache_embeddings.metricas()
+        valores += [
+            ("cache_embeddings_hits_memoria_total", "Hits en memoria de la caché de embeddings.", m.get("hits_memoria", 0)),
+            ("cache_embeddings_hits_disco_total", "Hits en disco de la caché de embeddings.", m.get("hits_disco", 0)),
+            ("cache_embeddings_misses_total", "Misses de la caché de embeddings.", m.get("misses", 0)),
+        ]
+    planificador = sys.modules.get("core.planificador_llm")
+    if planificador:
+        m = planificador.planificador_llm.metricas()
+        for clase, s in m["clases"].items():
+            etiqueta = _labels(("clase",), (clase,))
+            valores += [
+                (f"llm_cola{etiqueta}", "Llamadas a Gemini esperando turno.", s["en_cola"]),
+                (f"llm_despachadas_total{etiqueta}", "Llamadas a Gemini despachadas.", s["despachadas"]),
+                (f"llm_espera_media_seconds{etiqueta}", "Espera media en la cola del planificador.", s["espera_media"]),
+                (f"llm_espera_max_seconds{etiqueta}", "Espera máxima en la cola del planificador.", s["espera_max"]),
+                (f"llm_reintentos_429_total{etiqueta}", "Reintentos por throttling (429).", s["reintentos_429"]),
+                (f"llm_errores_total{etiqueta}", "Llamadas a Gemini fallidas.", s["errores"]),
+            ]
+        for familia, c in m["modelos"].items():
+            valores.append((f"llm_tokens_disponibles{_labels(('modelo',), (familia,))}",
+                            "Tokens del bucket de rate limit por modelo.", c["tokens"]))
+    correo = sys.modules.get("services.correo_saliente")
+    if correo:
+        m = correo.cola_correo.metricas()
+        valores += [
+            ("correo_pendientes", "Emails en cola o reintentando.", m["pendientes"]),
+            ("correo_enviados_total", "Emails entregados al servidor SMTP.", m["enviados"]),
+            ("correo_fallidos_total", "Emails descartados tras fallar.", m["fallidos"]),
+            ("correo_reintentos_total", "Reintentos de envío.", m["reintentos"]),
+            ("correo_conexiones_abiertas_total", "Conexiones SMTP abiertas (STARTTLS + login) desde el arranque.", m["aperturas"]),
+        ]
+    web = sys.modules.get("tools.busqueda_web")
+    if web:
+        m = web.buscador_web.metricas()
+        valores += [
+            ("cache_web_hits_total", "Hits de la caché de búsqueda web.", m["hits"]),
+            ("cache_web_misses_total", "Misses de la caché de búsqueda web.", m["misses"]),
+        ]
+    return valores
@@ -1,22 +1,32 @@
 # backend_dashboard/monitoring/session_manager.py
-from supabase import create_client, Client
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 import json
 import uuid
 import os
+from core.versiones import marcar_cambio
+from core.paginacion import filtro_keyset
 
 class SessionManager:
     def __init__(self):
+        """El cliente de Supabase se crea en el primer uso (no al importar el módulo)"""
+        self._supabase = None
+        self._inicializado = False
+
+    @property
+    def supabase(self):
         """Inicializar con credenciales de Supabase desde variables de entorno"""
-        supabase_url = os.getenv("SUPABASE_URL")
-        supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-        
-        if not supabase_url or not supabase_key:
-            print("⚠️ WARNING: Credenciales de Supabase no encontradas en .env")
-            self.supabase = None
-        else:
-            self.supabase = create_client(supabase_url, supabase_key)
+        if not self._inicializado:
+            self._inicializado = True
+            supabase_url = os.getenv("SUPABASE_URL")
+            supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+            
+            if not supabase_url or not supabase_key:
+                print("⚠️ WARNING: Credenciales de Supabase no encontradas en .env")
+            else:
+                from supabase import create_client
+                self._supabase = create_client(supabase_url, supabase_key)
+        return self._supabase
     
     def crear_nueva_sesion(self, user_id: str = "usuario_anonimo", titulo: str = "Nueva conversación") -> str:
         """Crear una nueva sesión de chat"""
@@ -33,6 +43,7 @@ class SessionManager:
             
             response = self.supabase.table("sesiones_chat").insert(nueva_sesion).execute()
             session_id = response.data[0]["id"]
+            marcar_cambio("sesiones_chat", user_id)
             print(f"✅ Nueva sesión creada: {session_id}")
             return session_id
             
@@ -40,7 +51,7 @@ class SessionManager:
             print(f"❌ Error creando sesión: {e}")
             return str(uuid.uuid4())  # Fallback
     
-    def guardar_mensaje(self, sesion_id: str, mensaje_usuario: str, respuesta_bot: str, herramientas_usadas: List[str] = []):
+    def guardar_mensaje(self, sesion_id: str, mensaje_usuario: str, respuesta_bot: str, herramientas_usadas: List[str] = [], user_id: Optional[str] = None):
         """Guardar un intercambio de mensajes"""
         try:
             if not self.supabase:
@@ -61,6 +72,8 @@ class SessionManager:
             self.supabase.table("sesiones_chat").update({
                 "last_active": datetime.now().isoformat()
             }).eq("id", sesion_id).execute()
+            marcar_cambio("sesiones_chat", user_id)
+            marcar_cambio("mensajes_sesion")
             
             print(f"💾 Mensaje guardado en sesión: {sesion_id}")
             
@@ -88,16 +101,21 @@ class SessionManager:
             print(f"❌ Error obteniendo historial: {e}")
             return []
     
-    def listar_sesiones_usuario(self, user_id: str, limite: int = 20) -> List[Dict]:
-        """Listar sesiones recientes de un usuario"""
+    def listar_sesiones_usuario(self, user_id: str, limite: int = 20, cursor: Optional[Dict] = None, columnas: str = "*") -> List[Dict]:
+        """Listar sesiones recientes de un usuario (keyset por last_active, id). Los errores de BD se propagan."""
         try:
             if not self.supabase:
                 return []
                 
-            response = self.supabase.table("sesiones_chat")\
-                .select("*")\
-                .eq("user_id", user_id)\
+            consulta = self.supabase.table("sesiones_chat")\
+                .select(columnas)\
+                .eq("user_id", user_id)
+            if cursor:
+                consulta = consulta.or_(filtro_keyset("last_active", cursor))
+
+            response = consulta\
                 .order("last_active", desc=True)\
+                .order("id", desc=True)\
                 .limit(limite)\
                 .execute()
             
@@ -105,7 +123,7 @@ class SessionManager:
             
         except Exception as e:
             print(f"❌ Error listando sesiones: {e}")
-            return []
+            raise
 
 # Instancia global que se usará en toda la aplicación
 session_manager = SessionManager()
\ No newline at end of file
@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import uuid
+import random
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from langchain_core.callbacks import BaseCallbackHandler
+
+logger = logging.getLogger(__name__)
+
+# --- TRAZAS DEL AGENTE ---
+# Un span por llamada al modelo o a una tool (inicio/fin, tokens, tamaños), agrupados por turno.
+# Se muestrea un porcentaje de turnos, se guardan los últimos N en memoria (ring buffer)
+# y opcionalmente se agregan a un archivo JSONL.
+
+TRAZAS_MUESTREO = float(os.getenv("TRAZAS_MUESTREO", "0.2"))  # 0.0 a 1.0
+TRAZAS_MAXIMO = int(os.getenv("TRAZAS_MAXIMO", "200"))
+TRAZAS_JSONL_PATH = os.getenv("TRAZAS_JSONL_PATH")  # Si está definido, cada traza se agrega al archivo
+
+_buffer = deque(maxlen=TRAZAS_MAXIMO)
+_lock = threading.Lock()
+
+def _tam(valor) -> int:
+    if valor is None:
+        return 0
+    if isinstance(valor, str):
+        return len(valor.encode("utf-8"))
+    try:
+        return len(json.dumps(valor, ensure_ascii=False, default=str).encode("utf-8"))
+    except Exception:
+        return len(str(valor).encode("utf-8"))
+
+def _tokens_de(response) -> dict:
+    """usage_metadata del mensaje (langchain-core) o token_usage del llm_output, lo que haya."""
+    for generaciones in response.generations or []:
+        for g in generaciones:
+            uso = getattr(getattr(g, "message", None), "usage_metadata", None)
+            if uso:
+                return {"prompt": uso.get("input_tokens"), "completion": uso.get("output_tokens")}
+    uso = (response.llm_output or {}).get("token_usage") or {}
+    return {"prompt": uso.get("prompt_tokens"), "completion": uso.get("completion_tokens")}
+
+class TrazadorAgente(BaseCallbackHandler):
+    """Callback de LangChain que arma los spans de un turno. Thread-safe: las tools corren en paralelo."""
+
+    def __init__(self, traza: dict):
+        self.traza = traza
+        self._abiertos = {}
+        self._lock = threading.Lock()
+
+    def _abrir(self, run_id, span: dict):
+        span.update({"inicio": time.time(), "_t0": time.perf_counter()})
+        with self._lock:
+            self._abiertos[run_id] = span
+
+    def _cerrar(self, run_id, **datos):
+        with self._lock:
+            span = self._abiertos.pop(run_id, None)
+        if span is None:
+            return
+        span["duracion_ms"] = round((time.perf_counter() - span.pop("_t0")) * 1000, 1)
+        span["fin"] = time.time()
+        span.update(datos)
+        with self._lock:
+            self.traza["spans"].append(span)
+
+    # Modelo
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        modelo = (kwargs.get("invocation_params") or {}).get("model") or (serialized or {}).get("name")
+        self._abrir(run_id, {"tipo": "modelo", "nombre": modelo, "mensajes": sum(len(m) for m in messages)})
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._abrir(run_id, {"tipo": "modelo", "nombre": (serialized or {}).get("name"), "mensajes": len(prompts)})
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        tokens = _tokens_de(response)
+        tool_calls = []
+        for generaciones in response.generations or []:
+            for g in generaciones:
+                tool_calls += [tc["name"] for tc in getattr(getattr(g, "message", None), "tool_calls", None) or []]
+        self._cerrar(run_id, tokens_prompt=tokens["prompt"], tokens_completion=tokens["completion"],
+                     tool_calls=tool_calls, ok=True)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._cerrar(run_id, ok=False, error=str(error)[:300])
+
+    # Tools
+    def on_tool_start(self, serialized, input_str, *, run_id, inputs=None, **kwargs):
+        nombre = (serialized or {}).get("name") or kwargs.get("name")
+        self._abrir(run_id, {"tipo": "tool", "nombre": nombre, "bytes_argumentos": _tam(inputs if inputs is not None else input_str)})
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        contenido = getattr(output, "content", output)
+        self._cerrar(run_id, bytes_resultado=_tam(contenido), ok=True)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._cerrar(run_id, ok=False, error=str(error)[:300])
+
+def _finalizar(traza: dict):
+    traza["spans"].sort(key=lambda s: s["inicio"])
+    traza["resumen"] = {
+        "llamadas_modelo": sum(1 for s in traza["spans"] if s["tipo"] == "modelo"),
+        "llamadas_tool": sum(1 for s in traza["spans"] if s["tipo"] == "tool"),
+        "ms_modelo": round(sum(s["duracion_ms"] for s in traza["spans"] if s["tipo"] == "modelo"), 1),
+        "ms_tools": round(sum(s["duracion_ms"] for s in traza["spans"] if s["tipo"] == "tool"), 1),
+        "tokens_prompt": sum(s.get("tokens_prompt") or 0 for s in traza["spans"]),
+        "tokens_completion": sum(s.get("tokens_completion") or 0 for s in traza["spans"]),
+    }
+    with _lock:
+        _buffer.append(traza)
+    if TRAZAS_JSONL_PATH:
+        try:
+            with open(TRAZAS_JSONL_PATH, "a", encoding="utf-8") as f:
+                f.write(json.dumps(traza, ensure_ascii=False) + "\n")
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo exportar la traza: {e}")
+
+@contextmanager
+def trazar_turno(pregunta: str, muestreo: float = None):
+    """
+    Abre una traza para el turno si sale sorteado. Devuelve el callback a pasar en
+    config["callbacks"] o None si el turno no se muestrea (costo cero).
+    """
+    muestreo = TRAZAS_MUESTREO if muestreo is None else muestreo
+    if muestreo <= 0 or random.random() >= muestreo:
+        yield None
+        return
+
+    traza = {
+        "id": uuid.uuid4().hex[:12],
+        "inicio": time.time(),
+        "pregunta": pregunta[:200],
+        "bytes_pregunta": _tam(pregunta),
+        "spans": [],
+        "ok": True,
+    }
+    t0 = time.perf_counter()
+    try:
+        yield TrazadorAgente(traza)
+    except Exception as e:
+        traza["ok"] = False
+        traza["error"] = str(e)[:300]
+        raise
+    finally:
+        traza["duracion_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        _finalizar(traza)
+
+def trazas_recientes(limite: int = 50, tool: str = None, min_ms: float = None, resumidas: bool = True) -> list:
+    """Más nuevas primero. `tool` filtra turnos que usaron esa tool; `min_ms` los más lentos que eso."""
+    with _lock:
+        trazas = list(_buffer)
+    resultado = []
+    for t in reversed(trazas):
+        if tool and not any(s["tipo"] == "tool" and s["nombre"] == tool for s in t["spans"]):
+            continue
+        if min_ms is not None and t["duracion_ms"] < min_ms:
+            continue
+        resultado.append({k: v for k, v in t.items() if k != "spans"} if resumidas else t)
+        if len(resultado) >= limite:
+            break
+    return resultado
+
+def obtener_traza(traza_id: str):
+    with _lock:
+        return next((t for t in _buffer if t["id"] == traza_id), None)
+
+def exportar_jsonl():
+    """Generador de líneas JSON (más viejas primero) para descargar el buffer completo."""
+    with _lock:
+        trazas = list(_buffer)
+    for t in trazas:
+        yield json.dumps(t, ensure_ascii=False) + "\n"
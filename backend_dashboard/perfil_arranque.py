@@ -0,0 +1,86 @@
+"""
+Reporte de tiempos de arranque del backend.
+
+Uso:
+    python perfil_arranque.py                # importa main y muestra los 25 módulos más caros
+    python perfil_arranque.py --top 40
+    python perfil_arranque.py --modulo agents.main_agent
+    python perfil_arranque.py --json         # salida para comparar entre deploys
+
+Mide con `python -X importtime` en un proceso limpio (sin cachés de import) y,
+además, el tiempo hasta que GET / responde dentro de ese mismo proceso.
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+_SONDA = """
+import time
+t0 = time.perf_counter()
+import {modulo}
+t1 = time.perf_counter()
+respuesta = None
+if hasattr({modulo}, "app") and hasattr({modulo}.app, "router"):
+    from fastapi.testclient import TestClient
+    respuesta = TestClient({modulo}.app).get("/").status_code
+t2 = time.perf_counter()
+print("__PERFIL__", t1 - t0, t2 - t0, respuesta)
+"""
+
+def medir(modulo: str):
+    proceso = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _SONDA.format(modulo=modulo)],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+
+    modulos = []
+    for linea in proceso.stderr.splitlines():
+        if not linea.startswith("import time:") or "[us]" in linea:
+            continue
+        try:
+            _, propio, acumulado, nombre = [p.strip() for p in linea.replace("import time:", "|", 1).split("|")]
+            modulos.append({"modulo": nombre.strip(), "propio_ms": int(propio) / 1000, "acumulado_ms": int(acumulado) / 1000})
+        except ValueError:
+            continue
+
+    resumen = {"import_s": None, "primera_respuesta_s": None, "status_raiz": None}
+    for linea in proceso.stdout.splitlines():
+        if linea.startswith("__PERFIL__"):
+            _, t_import, t_resp, status = linea.split()
+            resumen = {"import_s": float(t_import), "primera_respuesta_s": float(t_resp), "status_raiz": status}
+
+    if proceso.returncode != 0:
+        resumen["error"] = proceso.stderr.strip().splitlines()[-1] if proceso.stderr.strip() else "desconocido"
+    return resumen, modulos
+
+def main():
+    parser = argparse.ArgumentParser(description="Perfil de tiempos de import del backend")
+    parser.add_argument("--modulo", default="main")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    resumen, modulos = medir(args.modulo)
+    # Solo paquetes de primer nivel o módulos del proyecto, ordenados por tiempo acumulado
+    top = sorted(modulos, key=lambda m: m["acumulado_ms"], reverse=True)[:args.top]
+
+    if args.json:
+        print(json.dumps({"resumen": resumen, "modulos": top}, ensure_ascii=False, indent=2))
+        return
+
+    print("=" * 60)
+    print(f"⏱️  PERFIL DE ARRANQUE: import {args.modulo}")
+    print("=" * 60)
+    if resumen.get("error"):
+        print(f"❌ Error importando: {resumen['error']}")
+    print(f"Import de '{args.modulo}': {resumen['import_s']:.3f} s" if resumen["import_s"] is not None else "Import: n/d")
+    if resumen["primera_respuesta_s"] is not None:
+        print(f"Hasta GET / -> {resumen['status_raiz']}: {resumen['primera_respuesta_s']:.3f} s")
+    print(f"\n{'acumulado (ms)':>15} {'propio (ms)':>12}  módulo")
+    for m in top:
+        print(f"{m['acumulado_ms']:>15.1f} {m['propio_ms']:>12.1f}  {m['modulo']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import pandas as pd
+from fastapi import HTTPException
+from tools.analysis import get_df_optimizado
+
+# --- CONSULTA DE AGENDA DESDE LA CACHÉ ---
+# /api/agenda filtra, ordena y pagina sobre el DataFrame en memoria de tools/analysis.py
+# (el mismo que usa el analista de datos), sin ir a Supabase en cada request.
+
+CAMPOS_AGENDA = ("id_hash", "fecha", "titulo", "funcionario", "lugar", "costo", "moneda", "ambito",
+                 "organizador", "origen_dato")
+CAMPOS_AGENDA_LISTA = ("id_hash", "fecha", "titulo", "funcionario", "lugar", "costo", "moneda", "ambito",
+                       "origen_dato")
+ORDENES_AGENDA = ("fecha", "costo", "funcionario", "lugar", "titulo")
+
+def _clave_orden(df: pd.DataFrame, campo: str) -> pd.Series:
+    """Valores comparables para ordenar y para el cursor (fechas ISO, textos en minúsculas)."""
+    if campo == "fecha":
+        fechas = pd.to_datetime(df["fecha"], errors="coerce")
+        return fechas.dt.strftime("%Y-%m-%dT%H:%M:%S").fillna("")
+    if campo == "costo":
+        return pd.to_numeric(df["costo"], errors="coerce").fillna(0).astype(float)
+    return df[campo].astype(str).str.lower()
+
+def _filtrar(df: pd.DataFrame, fecha_desde=None, fecha_hasta=None, funcionario=None, lugar=None,
+             ambito=None, moneda=None) -> pd.DataFrame:
+    mascara = pd.Series(True, index=df.index)
+    if fecha_desde or fecha_hasta:
+        fechas = pd.to_datetime(df["fecha"], errors="coerce")
+        try:
+            if fecha_desde:
+                mascara &= fechas >= pd.Timestamp(fecha_desde)
+            if fecha_hasta:
+                # Fecha sin hora = día completo
+                hasta = pd.Timestamp(fecha_hasta)
+                if len(fecha_hasta) <= 10:
+                    hasta += pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
+                mascara &= fechas <= hasta
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Fecha inválida (usar AAAA-MM-DD)")
+    if funcionario:
+        mascara &= df["funcionario_norm"].str.contains(funcionario.lower(), regex=False)
+    if lugar:
+        mascara &= df["lugar_norm"].str.contains(lugar.lower(), regex=False)
+    if ambito:
+        mascara &= df["ambito"].astype(str).str.lower() == ambito.lower()
+    if moneda:
+        mascara &= df["moneda"].astype(str).str.upper() == moneda.upper()
+    return df[mascara]
+
+def consultar_agenda(filtros: dict, orden: str = "fecha", limite: int = 50, cursor: dict = None,
+                     columnas: tuple = CAMPOS_AGENDA_LISTA):
+    """
+    Devuelve (filas, total, ultima_clave). `orden` admite '-' para descendente.
+    El cursor keyset es {"campo": orden, "orden": valor, "id_hash": ...} de la última fila de la
+    página anterior; un cursor armado con otro orden (o manipulado) es un 400.
+    """
+    campo = orden.lstrip("-")
+    descendente = orden.startswith("-")
+    if campo not in ORDENES_AGENDA:
+        raise HTTPException(status_code=400, detail=f"Orden no permitido: {orden}")
+
+    df = get_df_optimizado()
+    if df.empty or "id_hash" not in df.columns:
+        return [], 0, None
+
+    df = _filtrar(df, **filtros)
+    total = len(df)
+    claves = pd.DataFrame({"orden": _clave_orden(df, campo), "id_hash": df["id_hash"].astype(str)}, index=df.index)
+
+    if cursor:
+        valor, ident = cursor.get("orden"), cursor.get("id_hash")
+        tipo_valido = (isinstance(valor, (int, float)) and not isinstance(valor, bool)) if campo == "costo" \
+            else isinstance(valor, str)
+        if cursor.get("campo") != orden or not tipo_valido or not isinstance(ident, str):
+            raise HTTPException(status_code=400, detail="Cursor inválido")
+        if descendente:
+            despues = (claves["orden"] < valor) | ((claves["orden"] == valor) & (claves["id_hash"] < ident))
+        else:
+            despues = (claves["orden"] > valor) | ((claves["orden"] == valor) & (claves["id_hash"] > ident))
+        claves = claves[despues]
+
+    claves = claves.sort_values(["orden", "id_hash"], ascending=not descendente).head(limite)
+    pagina = df.loc[claves.index, list(columnas)].copy()
+    if "fecha" in pagina.columns:
+        pagina["fecha"] = _clave_orden(pagina, "fecha")
+    if "costo" in pagina.columns:
+        pagina["costo"] = pd.to_numeric(pagina["costo"], errors="coerce").fillna(0).astype(float)
+
+    filas = pagina.astype(object).where(pagina.notna(), None).to_dict(orient="records")
+    ultima = None
+    if len(claves) == limite:
+        ultima = {"campo": orden, "orden": claves["orden"].iloc[-1], "id_hash": claves["id_hash"].iloc[-1]}
+        if isinstance(ultima["orden"], float):
+            ultima["orden"] = float(ultima["orden"])
+    return filas, total, ultima
@@ -0,0 +1,271 @@
+import os
+import time
+import heapq
+import uuid
+import random
+import smtplib
+import logging
+import threading
+from datetime import datetime
+from email.mime.text import MIMEText
+
+logger = logging.getLogger(__name__)
+
+# --- COLA DE CORREO SALIENTE ---
+# enviar_email_real solo encola y devuelve un id. Uno o más hilos despachadores mantienen
+# cada uno una conexión SMTP abierta (STARTTLS + login una sola vez), mandan los mensajes
+# en lotes sobre esa conexión y la cierran tras un rato sin trabajo.
+# - Conexión caída o error 4xx: se descarta la conexión y el mensaje se reintenta con backoff.
+# - Error 5xx (destinatario rechazado, mensaje inválido): falla definitiva, sin reintentos.
+# El estado de cada mensaje se consulta con GET /api/emails/{id}. La cola vive en memoria:
+# lo pendiente al reiniciar el proceso se pierde (igual que los trabajos de audio).
+# Para probar contra un SMTP local (ej: python -m aiosmtpd -n -l localhost:1025):
+# SMTP_SERVER=localhost SMTP_PORT=1025 SMTP_STARTTLS=0, o inyectar `fabrica` en ColaCorreo.
+
+CORREO_CONEXIONES = int(os.getenv("CORREO_CONEXIONES", "1"))
+CORREO_LOTE = int(os.getenv("CORREO_LOTE", "20"))
+CORREO_REINTENTOS = int(os.getenv("CORREO_REINTENTOS", "5"))
+CORREO_BACKOFF_BASE_SEG = float(os.getenv("CORREO_BACKOFF_BASE_SEG", "2"))
+CORREO_BACKOFF_MAX_SEG = 300.0
+CORREO_INACTIVIDAD_SEG = float(os.getenv("CORREO_INACTIVIDAD_SEG", "60"))  # Cierra la conexión ociosa
+CORREO_VERIFICAR_SEG = 30.0  # Conexión quieta más de esto: NOOP antes de reutilizarla
+CORREO_ESTADOS_TTL = int(os.getenv("CORREO_ESTADOS_TTL", "86400"))
+
+ENCOLADO = "encolado"
+ENVIANDO = "enviando"
+REINTENTANDO = "reintentando"
+ENVIADO = "enviado"
+FALLIDO = "fallido"
+
+def fabrica_smtp():
+    """Conexión SMTP lista para enviar, según las variables SMTP_* del entorno."""
+    servidor = smtplib.SMTP(os.getenv("SMTP_SERVER", "smtp.gmail.com"), int(os.getenv("SMTP_PORT", "587")), timeout=30)
+    try:
+        if os.getenv("SMTP_STARTTLS", "1") != "0":
+            servidor.starttls()
+        if os.getenv("SMTP_USER"):
+            servidor.login(os.getenv("SMTP_USER"), os.getenv("SMTP_PASSWORD"))
+    except Exception:
+        servidor.close()
+        raise
+    return servidor
+
+def smtp_configurado() -> bool:
+    """Servidor explícito (ej: un SMTP local sin login) o credenciales para el servidor por defecto."""
+    return bool(os.getenv("SMTP_SERVER") or (os.getenv("SMTP_USER") and os.getenv("SMTP_PASSWORD")))
+
+def es_definitivo(error: Exception) -> bool:
+    """5xx = el servidor rechazó ESTE mensaje: reintentar no cambia nada."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException) and not isinstance(error, smtplib.SMTPServerDisconnected):
+        return error.smtp_code >= 500 and not isinstance(error, smtplib.SMTPAuthenticationError)
+    return False
+
+class ConexionSMTP:
+    """Una conexión persistente por despachador. Se reabre sola si se cayó."""
+
+    def __init__(self, fabrica):
+        self._fabrica = fabrica
+        self._servidor = None
+        self.ultimo_uso = 0.0
+        self.aperturas = 0
+
+    def obtener(self):
+        if self._servidor is not None and time.monotonic() - self.ultimo_uso > CORREO_VERIFICAR_SEG:
+            try:
+                if self._servidor.noop()[0] != 250:
+                    self.descartar()
+            except Exception:
+                self.descartar()
+        if self._servidor is None:
+            self._servidor = self._fabrica()
+            self.aperturas += 1
+        self.ultimo_uso = time.monotonic()
+        return self._servidor
+
+    def descartar(self):
+        servidor, self._servidor = self._servidor, None
+        if servidor is not None:
+            try: servidor.close()
+            except Exception: pass
+
+    def cerrar_si_ociosa(self):
+        if self._servidor is not None and time.monotonic() - self.ultimo_uso > CORREO_INACTIVIDAD_SEG:
+            try: self._servidor.quit()
+            except Exception: pass
+            self.descartar()
+
+class ColaCorreo:
+    def __init__(self, fabrica=fabrica_smtp, conexiones: int = CORREO_CONEXIONES, lote: int = CORREO_LOTE,
+                 reintentos: int = CORREO_REINTENTOS):
+        self._fabrica = fabrica
+        self._conexiones = max(1, conexiones)
+        self._lote = max(1, lote)
+        self._reintentos = reintentos
+        self._cond = threading.Condition()
+        self._listos = []      # heap de (momento_listo, secuencia, id)
+        self._secuencia = 0
+        self._mensajes = {}    # id -> estado (los campos "_" son internos)
+        self._hilos = []
+        self._stats = {"enviados": 0, "fallidos": 0, "reintentos": 0, "lotes": 0, "aperturas": 0}
+
+    # --- Cola ---
+    def _iniciar(self):
+        if self._hilos:
+            return
+        with self._cond:
+            if not self._hilos:
+                for i in range(self._conexiones):
+                    hilo = threading.Thread(target=self._despachar, daemon=True, name=f"correo-{i}")
+                    hilo.start()
+                    self._hilos.append(hilo)
+
+    def _programar(self, mensaje_id: str, demora: float = 0.0):
+        """Con el lock tomado."""
+        self._secuencia += 1
+        heapq.heappush(self._listos, (time.monotonic() + demora, self._secuencia, mensaje_id))
+        self._cond.notify()
+
+    def _actualizar(self, mensaje_id: str, **campos):
+        """Con el lock tomado."""
+        self._mensajes[mensaje_id].update(campos, actualizado=datetime.now().isoformat())
+
+    def _purgar_vencidos(self):
+        ahora = time.time()
+        with self._cond:
+            vencidos = [mid for mid, m in self._mensajes.items()
+                        if m["estado"] in (ENVIADO, FALLIDO) and ahora - m["_fin"] > CORREO_ESTADOS_TTL]
+            for mid in vencidos:
+                del self._mensajes[mid]
+
+    def _sacar_listos(self) -> list:
+        """Con el lock tomado: hasta `lote` ids cuyo momento ya llegó."""
+        ahora = time.monotonic()
+        lote = []
+        while self._listos and self._listos[0][0] <= ahora and len(lote) < self._lote:
+            lote.append(heapq.heappop(self._listos)[2])
+        for mid in lote:
+            self._actualizar(mid, estado=ENVIANDO)
+        return lote
+
+    def _tomar_lote(self) -> list:
+        """Espera (como mucho CORREO_INACTIVIDAD_SEG) mensajes listos. Lista vacía si no llegó ninguno."""
+        with self._cond:
+            lote = self._sacar_listos()
+            if lote:
+                return lote
+            espera = self._listos[0][0] - time.monotonic() if self._listos else CORREO_INACTIVIDAD_SEG
+            self._cond.wait(timeout=max(0.0, min(espera, CORREO_INACTIVIDAD_SEG)))
+            return self._sacar_listos()
+
+    def _despachar(self):
+        conexion = ConexionSMTP(self._fabrica)
+        while True:
+            lote = self._tomar_lote()
+            if not lote:
+                # QUIT puede tardar (timeout de socket): fuera del lock, así encolar/estado no esperan
+                conexion.cerrar_si_ociosa()
+                continue
+            aperturas = conexion.aperturas
+            for indice, mensaje_id in enumerate(lote):
+                try:
+                    self._enviar(conexion, mensaje_id)
+                except Exception as e:
+                    # Conexión caída: lo que quedaba del lote vuelve a la cola sin gastar intentos
+                    conexion.descartar()
+                    with self._cond:
+                        for resto in lote[indice + 1:]:
+                            self._actualizar(resto, estado=ENCOLADO)
+                            self._programar(resto)
+                    self._fallo(mensaje_id, e)
+                    break
+            with self._cond:
+                self._stats["lotes"] += 1
+                self._stats["aperturas"] += conexion.aperturas - aperturas
+
+    def _enviar(self, conexion: ConexionSMTP, mensaje_id: str):
+        with self._cond:
+            datos = self._mensajes[mensaje_id]
+            msg = MIMEText(datos["_cuerpo"])
+            msg['Subject'] = datos["asunto"]
+            msg['From'] = datos["remitente"]
+            msg['To'] = datos["destinatario"]
+        try:
+            conexion.obtener().send_message(msg)
+        except Exception as e:
+            if not es_definitivo(e):
+                raise
+            # Rechazo del mensaje: la conexión sigue sana y el lote continúa
+            self._fallo(mensaje_id, e)
+            return
+        with self._cond:
+            self._actualizar(mensaje_id, estado=ENVIADO, intentos=datos["intentos"] + 1, error=None, _fin=time.time())
+            self._stats["enviados"] += 1
+        logger.info(f"📧 Email {mensaje_id[:8]} enviado a {datos['destinatario']}.")
+
+    def _fallo(self, mensaje_id: str, error: Exception):
+        with self._cond:
+            datos = self._mensajes[mensaje_id]
+            intentos = datos["intentos"] + 1
+            if es_definitivo(error) or intentos > self._reintentos:
+                self._actualizar(mensaje_id, estado=FALLIDO, intentos=intentos, error=str(error), _fin=time.time())
+                self._stats["fallidos"] += 1
+                logger.error(f"❌ Email {mensaje_id[:8]} a {datos['destinatario']} falló: {error}")
+                return
+            demora = min(CORREO_BACKOFF_BASE_SEG * 2 ** (intentos - 1), CORREO_BACKOFF_MAX_SEG) * random.uniform(0.5, 1.0)
+            self._actualizar(mensaje_id, estado=REINTENTANDO, intentos=intentos, error=str(error))
+            self._stats["reintentos"] += 1
+            self._programar(mensaje_id, demora)
+        logger.warning(f"⏳ Email {mensaje_id[:8]}: {error}. Reintento {intentos} en {demora:.1f}s.")
+
+    # --- API ---
+    def configurada(self) -> bool:
+        """Con una fábrica inyectada (pruebas, SMTP de prueba) siempre; con la real, según el entorno."""
+        return self._fabrica is not fabrica_smtp or smtp_configurado()
+
+    def encolar(self, destinatario: str, asunto: str, cuerpo: str, remitente: str = None) -> str:
+        self._purgar_vencidos()
+        self._iniciar()
+        mensaje_id = str(uuid.uuid4())
+        with self._cond:
+            self._mensajes[mensaje_id] = {
+                "id": mensaje_id,
+                "estado": ENCOLADO,
+                "destinatario": destinatario,
+                "asunto": asunto,
+                "remitente": remitente or os.getenv("SMTP_FROM") or os.getenv("SMTP_USER"),
+                "intentos": 0,
+                "error": None,
+                "creado": datetime.now().isoformat(),
+                "actualizado": datetime.now().isoformat(),
+                "_cuerpo": cuerpo,
+                "_fin": 0.0,
+            }
+            self._programar(mensaje_id)
+        return mensaje_id
+
+    def estado(self, mensaje_id: str):
+        with self._cond:
+            datos = self._mensajes.get(mensaje_id)
+            if not datos:
+                return None
+            return {k: v for k, v in datos.items() if not k.startswith("_")}
+
+    def esperar(self, timeout: float = None) -> bool:
+        """Bloquea hasta que no queden mensajes pendientes (para scripts y pruebas)."""
+        limite = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            with self._cond:
+                if all(m["estado"] in (ENVIADO, FALLIDO) for m in self._mensajes.values()):
+                    return True
+            if limite is not None and time.monotonic() > limite:
+                return False
+            time.sleep(0.05)
+
+    def metricas(self) -> dict:
+        with self._cond:
+            pendientes = sum(1 for m in self._mensajes.values() if m["estado"] not in (ENVIADO, FALLIDO))
+            return {**self._stats, "pendientes": pendientes}
+
+cola_correo = ColaCorreo()
@@ -0,0 +1,75 @@
+import os
+import re
+import time
+import asyncio
+from monitoring.metricas import chat_primer_fragmento
+
+# --- STREAM SSE DEL CHAT ---
+# Cada respuesta escribe sus eventos numerados (1, 2, 3...) en un buffer propio.
+# Los clientes leen del buffer: el primero en vivo, y quien se reconecta con
+# Last-Event-ID retoma desde el siguiente evento sin recalcular nada.
+# Tipos de evento: sesion (id de sesión nueva), mensaje (texto), error, fin.
+
+HEARTBEAT_SEG = float(os.getenv("SSE_HEARTBEAT_SEG", "15"))
+SSE_RETRY_MS = 3000
+
+def formatear_evento(id_evento: int, tipo: str, datos: str) -> str:
+    """Una línea 'data:' por línea del texto: los saltos de línea no rompen el framing."""
+    lineas = [f"id: {id_evento}", f"event: {tipo}"]
+    lineas += [f"data: {linea}" for linea in str(datos).split("\n")]
+    return "\n".join(lineas) + "\n\n"
+
+def partir_respuesta(texto: str) -> list:
+    """Un evento por párrafo (conservando los separadores, así concatenar reconstruye el texto)."""
+    return [p for p in re.split(r"(?<=\n\n)", texto or "") if p] or [""]
+
+class BufferEventos:
+    def __init__(self):
+        self.eventos = []  # [(id, tipo, datos)], id = posición + 1
+        self.terminado = False
+        self.creado = time.perf_counter()
+        self.primer_mensaje = None  # Segundos hasta el primer evento "mensaje"
+        self._condicion = asyncio.Condition()
+
+    async def publicar(self, tipo: str, datos: str = ""):
+        if tipo == "mensaje" and self.primer_mensaje is None:
+            # Se mide acá y no en los bytes de la respuesta: retry:, pings y el evento
+            # de sesión salen antes y no son texto; una reconexión tampoco vuelve a contar.
+            self.primer_mensaje = time.perf_counter() - self.creado
+            chat_primer_fragmento.observar(valor=self.primer_mensaje)
+        async with self._condicion:
+            self.eventos.append((len(self.eventos) + 1, tipo, datos))
+            self._condicion.notify_all()
+
+    async def cerrar(self):
+        async with self._condicion:
+            if not self.terminado:
+                self.eventos.append((len(self.eventos) + 1, "fin", ""))
+                self.terminado = True
+            self._condicion.notify_all()
+
+    async def _esperar_desde(self, siguiente: int):
+        async with self._condicion:
+            await self._condicion.wait_for(lambda: len(self.eventos) >= siguiente or self.terminado)
+
+    async def transmitir(self, ultimo_id: int = 0, heartbeat: float = HEARTBEAT_SEG):
+        """Generador SSE desde el evento ultimo_id + 1. Manda comentarios de heartbeat mientras espera."""
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        siguiente = ultimo_id + 1
+        while True:
+            while siguiente <= len(self.eventos):
+                yield formatear_evento(*self.eventos[siguiente - 1])
+                siguiente += 1
+            if self.terminado:
+                return
+            try:
+                await asyncio.wait_for(self._esperar_desde(siguiente), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                # Comentario SSE: mantiene viva la conexión en proxies y balanceadores
+                yield ": ping\n\n"
+
+def parsear_last_event_id(valor) -> int:
+    try:
+        return max(int(str(valor).strip()), 0)
+    except (TypeError, ValueError):
+        return 0
@@ -0,0 +1,76 @@
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from services.eventos_chat import BufferEventos
+
+logger = logging.getLogger(__name__)
+
+# --- IDEMPOTENCIA DEL CHAT ---
+# El frontend manda una idempotency_key por pregunta. Si llega otra request con la misma
+# clave mientras la primera corre, se engancha a esa ejecución; si llega después, recibe
+# la respuesta ya calculada (el buffer de eventos SSE de esa ejecución, ver
+# services/eventos_chat.py). Así un reintento, un doble envío o una reconexión no
+# vuelve a correr el agente ni guarda el turno dos veces.
+
+IDEMPOTENCIA_TTL_SEG = float(os.getenv("IDEMPOTENCIA_TTL_SEG", "600"))
+
+def huella_pedido(message: str, session_id) -> str:
+    """Identifica el contenido del pedido: misma clave con otra pregunta es un error del cliente."""
+    return hashlib.sha256(f"{session_id}\x00{message}".encode("utf-8")).hexdigest()
+
+class EjecucionChat:
+    def __init__(self, tarea: asyncio.Task, huella: str, buffer: BufferEventos):
+        self.tarea = tarea
+        self.huella = huella
+        self.buffer = buffer
+        self.creada = time.time()
+        self.expira = None  # Se fija al terminar: mientras corre no vence
+
+class RegistroIdempotencia:
+    """Vive en el event loop: todas las operaciones son sincrónicas entre awaits, no hace falta lock."""
+
+    def __init__(self, ttl: float = IDEMPOTENCIA_TTL_SEG):
+        self.ttl = ttl
+        self._ejecuciones = {}
+        self.coalescidas = 0
+        self.repetidas = 0
+
+    def _purgar(self):
+        ahora = time.time()
+        vencidas = [c for c, e in self._ejecuciones.items() if e.expira is not None and e.expira < ahora]
+        for clave in vencidas:
+            del self._ejecuciones[clave]
+
+    def obtener(self, clave: str):
+        self._purgar()
+        return self._ejecuciones.get(clave)
+
+    def registrar(self, clave: str, huella: str, productor) -> EjecucionChat:
+        """
+        `productor(buffer)` es la corrutina que publica los eventos de la respuesta.
+        Corre como tarea independiente: si el cliente que la originó se desconecta,
+        la respuesta igual se termina y queda en el buffer para el reintento.
+        """
+        buffer = BufferEventos()
+        tarea = asyncio.create_task(productor(buffer))
+        ejecucion = EjecucionChat(tarea, huella, buffer)
+        self._ejecuciones[clave] = ejecucion
+
+        def _al_terminar(t):
+            ejecucion.expira = time.time() + self.ttl
+            if not t.cancelled() and t.exception():
+                # Un fallo no se cachea: el próximo reintento vuelve a intentar
+                self._ejecuciones.pop(clave, None)
+
+        tarea.add_done_callback(_al_terminar)
+        return ejecucion
+
+    def contar_duplicada(self, ejecucion: EjecucionChat):
+        if ejecucion.tarea.done():
+            self.repetidas += 1
+        else:
+            self.coalescidas += 1
+
+registro_idempotencia = RegistroIdempotencia()
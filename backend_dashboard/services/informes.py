@@ -0,0 +1,208 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+import pandas as pd
+from tools.analysis import get_df_optimizado, snapshot_agenda_activo
+
+logger = logging.getLogger(__name__)
+
+# --- INFORMES ESTÁNDAR PRECALCULADOS ---
+# Las preguntas de siempre (gasto por mes, viajes por funcionario, nacional vs internacional,
+# eventos de la semana) se calculan con pandas, sin LLM, sobre el mismo DataFrame de la agenda.
+# Cada informe es una función registrada con sus parámetros y valores por defecto.
+# Después de cada sync con cambios se recalculan las variantes por defecto; cualquier otra
+# combinación de parámetros se calcula en el primer pedido y queda guardada hasta que cambien
+# los datos. Todo resultado lleva la versión de datos de la que salió.
+# Los parámetros vienen del endpoint público: lo guardado se acota con un LRU.
+# Dentro de un lote (services/lote_chat.py) el frame es una foto fija que puede ser
+# más vieja que la agenda viva: esos informes se calculan aparte, sin tocar lo guardado.
+
+INFORMES_CACHE_MAX = int(os.getenv("INFORMES_CACHE_MAX", "256"))
+
+INFORMES = {}  # nombre -> {"funcion", "descripcion", "parametros"}
+
+def informe(nombre: str, descripcion: str, **parametros):
+    """Registra un informe. `parametros` = {nombre: valor por defecto} (el tipo sale del valor)."""
+    def registrar(funcion):
+        INFORMES[nombre] = {"funcion": funcion, "descripcion": descripcion, "parametros": parametros}
+        return funcion
+    return registrar
+
+def version_datos(df: pd.DataFrame) -> str:
+    """Huella del contenido: mismos registros = misma versión, aunque la recarga sea otra."""
+    if df is None or df.empty:
+        return "vacia"
+    columnas = [c for c in ("id_hash", "fecha", "costo", "moneda", "ambito", "funcionario") if c in df.columns]
+    huella = pd.util.hash_pandas_object(df[columnas].sort_values(columnas[0]), index=False).sum()
+    return f"{len(df)}-{int(huella) & 0xFFFFFFFFFFFF:012x}"
+
+def _con_fechas(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df["fecha"] = pd.to_datetime(df["fecha"], errors="coerce")
+    return df[df["fecha"].notna()]
+
+def _por_anio(df: pd.DataFrame, anio: int) -> pd.DataFrame:
+    return df[df["fecha"].dt.year == anio] if anio else df
+
+# --- CATÁLOGO ---
+
+@informe("gasto_mensual_por_moneda", "Gasto total y cantidad de registros por mes y moneda (sin mezclar monedas).",
+         anio=0)
+def gasto_mensual_por_moneda(df, anio=0):
+    df = _por_anio(_con_fechas(df), anio)
+    df = df[df["costo"] > 0]
+    if df.empty:
+        return []
+    tabla = df.assign(mes=df["fecha"].dt.strftime("%Y-%m"))\
+        .groupby(["mes", "moneda"])["costo"].agg(total="sum", registros="count").reset_index()
+    return [{"mes": f.mes, "moneda": f.moneda, "total": round(float(f.total), 2), "registros": int(f.registros)}
+            for f in tabla.sort_values(["mes", "moneda"]).itertuples()]
+
+@informe("viajes_por_funcionario", "Cantidad de viajes/actividades y gasto por moneda de cada funcionario.",
+         anio=0, ambito="", limite=20)
+def viajes_por_funcionario(df, anio=0, ambito="", limite=20):
+    df = _por_anio(_con_fechas(df), anio)
+    if ambito:
+        df = df[df["ambito"].astype(str).str.lower() == ambito.lower()]
+    # "Funcionario" es el relleno de sync_sheets cuando la fila no traía nombre
+    df = df[~df["funcionario"].astype(str).str.strip().isin(["", "Funcionario"])]
+    if df.empty:
+        return []
+    viajes = df.groupby("funcionario").size().sort_values(ascending=False, kind="stable")
+    gastos = {}
+    for (funcionario, moneda), total in df[df["costo"] > 0].groupby(["funcionario", "moneda"])["costo"].sum().items():
+        gastos.setdefault(funcionario, {})[moneda] = round(float(total), 2)
+    return [{"funcionario": funcionario, "viajes": int(cantidad), "gasto": gastos.get(funcionario, {})}
+            for funcionario, cantidad in viajes.head(max(1, limite)).items()]
+
+@informe("internacional_vs_nacional", "Registros nacionales, internacionales y sin clasificar, con gasto por moneda.",
+         anio=0)
+def internacional_vs_nacional(df, anio=0):
+    df = _por_anio(_con_fechas(df), anio)
+    ambito = df["ambito"].astype(str).str.lower()
+    clase = pd.Series("sin clasificar", index=df.index)
+    clase[ambito.str.contains("internacional")] = "internacional"
+    clase[ambito == "nacional"] = "nacional"
+    df = df.assign(clase=clase)
+    filas = []
+    for nombre in ("nacional", "internacional", "sin clasificar"):
+        grupo = df[df["clase"] == nombre]
+        gasto = grupo[grupo["costo"] > 0].groupby("moneda")["costo"].sum()
+        filas.append({"ambito": nombre, "registros": int(len(grupo)),
+                      "gasto": {m: round(float(v), 2) for m, v in gasto.items()}})
+    return filas
+
+@informe("eventos_de_la_semana", "Eventos desde el lunes hasta el domingo de la semana indicada (por defecto, la actual).",
+         semana="")
+def eventos_de_la_semana(df, semana=""):
+    inicio = pd.Timestamp(semana) if semana else pd.Timestamp.now().normalize()
+    inicio = inicio - pd.Timedelta(days=inicio.weekday())
+    fin = inicio + pd.Timedelta(days=7)
+    df = _con_fechas(df)
+    df = df[(df["fecha"] >= inicio) & (df["fecha"] < fin)].sort_values(["fecha", "titulo"])
+    return [{"fecha": f.fecha.strftime("%Y-%m-%d"), "titulo": f.titulo, "funcionario": f.funcionario,
+             "lugar": f.lugar, "ambito": f.ambito}
+            for f in df.itertuples()]
+
+# --- ALMACÉN ---
+
+def normalizar_parametros(nombre: str, parametros: dict) -> dict:
+    """Valores por defecto + conversión de tipos. Lanza KeyError/ValueError ante nombres o valores inválidos."""
+    if nombre not in INFORMES:
+        raise KeyError(nombre)
+    esperados = INFORMES[nombre]["parametros"]
+    desconocidos = set(parametros) - set(esperados)
+    if desconocidos:
+        raise ValueError(f"Parámetros desconocidos para {nombre}: {', '.join(sorted(desconocidos))}")
+    resultado = dict(esperados)
+    for clave, valor in parametros.items():
+        if valor is None or valor == "":
+            continue
+        tipo = type(esperados[clave])
+        try:
+            resultado[clave] = tipo(valor)
+        except (TypeError, ValueError):
+            raise ValueError(f"Valor inválido para {clave}: {valor!r}")
+    if nombre == "eventos_de_la_semana":
+        # La semana "actual" cambia con el calendario: la fijamos para que sea parte de la clave
+        inicio = pd.Timestamp(resultado["semana"] or pd.Timestamp.now().normalize())
+        resultado["semana"] = (inicio - pd.Timedelta(days=inicio.weekday())).strftime("%Y-%m-%d")
+    return resultado
+
+class AlmacenInformes:
+    def __init__(self, fuente=get_df_optimizado, en_snapshot=snapshot_agenda_activo,
+                 max_resultados: int = INFORMES_CACHE_MAX):
+        self._fuente = fuente
+        self._en_snapshot = en_snapshot
+        self.max_resultados = max(len(INFORMES), max_resultados)
+        self._lock = threading.Lock()
+        self._resultados = OrderedDict()  # (nombre, parametros) -> dict, orden LRU
+        self._df = None        # Frame del que salieron los resultados (comparación por identidad)
+        self.version = None
+        self.regeneraciones = 0
+
+    def _sincronizar_version(self, df) -> bool:
+        """Con el lock tomado. True si la versión de datos cambió (y se descartó lo guardado)."""
+        if df is self._df:
+            return False
+        self._df = df
+        version = version_datos(df)
+        if version == self.version:
+            return False
+        self.version = version
+        self._resultados.clear()
+        return True
+
+    def _guardar(self, clave: tuple, resultado: dict):
+        """Con el lock tomado."""
+        self._resultados[clave] = resultado
+        self._resultados.move_to_end(clave)
+        while len(self._resultados) > self.max_resultados:
+            self._resultados.popitem(last=False)
+
+    def _calcular(self, df, nombre: str, parametros: dict, version: str = None) -> dict:
+        inicio = time.perf_counter()
+        filas = INFORMES[nombre]["funcion"](df, **parametros) if not df.empty else []
+        return {"nombre": nombre, "parametros": parametros, "version": version or self.version,
+                "generado": pd.Timestamp.now().isoformat(timespec="seconds"),
+                "milisegundos": round((time.perf_counter() - inicio) * 1000, 1), "filas": filas}
+
+    def regenerar(self, forzar: bool = False) -> bool:
+        """Recalcula las variantes por defecto si cambiaron los datos. Devuelve si hubo cambio."""
+        df = self._fuente()
+        with self._lock:
+            if forzar:
+                self._df, self.version = None, None
+            if not self._sincronizar_version(df):
+                return False
+            for nombre in INFORMES:
+                parametros = normalizar_parametros(nombre, {})
+                try:
+                    self._guardar((nombre, tuple(sorted(parametros.items()))), self._calcular(df, nombre, parametros))
+                except Exception as e:
+                    logger.error(f"⚠️ Error calculando informe {nombre}: {e}")
+            self.regeneraciones += 1
+        logger.info(f"📑 Informes estándar regenerados (datos {self.version}).")
+        return True
+
+    def obtener(self, nombre: str, **parametros) -> dict:
+        parametros = normalizar_parametros(nombre, parametros)
+        clave = (nombre, tuple(sorted(parametros.items())))
+        df = self._fuente()
+        with self._lock:
+            if self._en_snapshot() and df is not self._df:
+                # Foto de un lote: se calcula sobre ella, sin cambiar la versión ni lo guardado
+                return self._calcular(df, nombre, parametros, version=version_datos(df))
+            self._sincronizar_version(df)
+            if clave not in self._resultados:
+                self._guardar(clave, self._calcular(df, nombre, parametros))
+            self._resultados.move_to_end(clave)
+            return self._resultados[clave]
+
+    def catalogo(self) -> list:
+        return [{"nombre": n, "descripcion": i["descripcion"], "parametros": i["parametros"]}
+                for n, i in INFORMES.items()]
+
+almacen_informes = AlmacenInformes()
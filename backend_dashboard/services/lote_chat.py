@@ -0,0 +1,69 @@
+import os
+import time
+import asyncio
+import logging
+import contextvars
+from core.prioridad import trabajo_interactivo
+
+logger = logging.getLogger(__name__)
+
+# --- LOTES DE PREGUNTAS ---
+# Para los informes semanales: muchas preguntas contra el agente a la vez.
+# Todas comparten la misma foto de la agenda y la misma memoria de la sesión
+# (se calculan una sola vez) y cada resultado se devuelve apenas está listo.
+# Corren como trabajo interactivo del inquilino "lote:<usuario>": el planificador
+# de Gemini las intercala con los chats de otros usuarios en vez de acapararlo.
+
+LOTE_MAX_PARALELO = int(os.getenv("LOTE_MAX_PARALELO", "4"))
+LOTE_MAX_PREGUNTAS = int(os.getenv("LOTE_MAX_PREGUNTAS", "50"))
+
+async def ejecutar_lote(preguntas: list, historial: list, user_id: str, max_paralelo: int = LOTE_MAX_PARALELO,
+                        al_responder=None):
+    """
+    Generador async de resultados {indice, pregunta, respuesta, segundos}, en orden de llegada.
+    `al_responder(pregunta, respuesta)` (opcional, sincrónico) corre en el hilo de cada pregunta;
+    si falla se registra y la respuesta se devuelve igual.
+    """
+    from agents.main_agent import get_agent_response, get_memory_aware_history
+    from tools.analysis import get_df_optimizado, usar_snapshot_agenda
+
+    # Contexto compartido: se arma una vez para todo el lote
+    snapshot = await asyncio.to_thread(get_df_optimizado)
+    memoria = await asyncio.to_thread(get_memory_aware_history, historial)
+    semaforo = asyncio.Semaphore(max(1, min(max_paralelo, LOTE_MAX_PARALELO)))
+
+    def _responder(pregunta: str) -> str:
+        with trabajo_interactivo(f"lote:{user_id}"), usar_snapshot_agenda(snapshot):
+            # En un lote un error es un resultado ok=False, no el texto de disculpa del chat
+            respuesta = get_agent_response(pregunta, historial, memory_messages=list(memoria),
+                                           propagar_errores=True)
+        if al_responder:
+            # Un fallo al guardar no invalida la respuesta ya calculada
+            try:
+                al_responder(pregunta, respuesta)
+            except Exception as e:
+                logger.error(f"No se pudo guardar la respuesta del lote ({pregunta[:40]!r}): {e}")
+        return respuesta
+
+    async def _una(indice: int, pregunta: str) -> dict:
+        async with semaforo:
+            t0 = time.perf_counter()
+            try:
+                # Contexto propio por pregunta: los contextvars de una no pisan a las otras
+                ctx = contextvars.copy_context()
+                respuesta = await asyncio.to_thread(ctx.run, _responder, pregunta)
+                ok = True
+            except Exception as e:
+                logger.error(f"Error en pregunta {indice} del lote: {e}")
+                respuesta, ok = f"Error: {e}", False
+            return {"indice": indice, "pregunta": pregunta, "respuesta": respuesta, "ok": ok,
+                    "segundos": round(time.perf_counter() - t0, 2)}
+
+    tareas = [asyncio.create_task(_una(i, p)) for i, p in enumerate(preguntas)]
+    try:
+        for siguiente in asyncio.as_completed(tareas):
+            yield await siguiente
+    finally:
+        # Si el cliente se va, no arrancamos las preguntas que todavía esperaban turno
+        for tarea in tareas:
+            tarea.cancel()
@@ -0,0 +1,120 @@
+import os
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from core.modelos_gemini import ChatGemini
+from core.schemas import ResumenActa
+from core.prioridad import esperar_turno_de_fondo, trabajo_de_fondo
+from tools.database import supabase, indexar_acta
+from core.versiones import marcar_cambio
+
+logger = logging.getLogger(__name__)
+
+# --- RESÚMENES DE ACTAS EN SEGUNDO PLANO ---
+# Las actas se guardan solo con transcripción. Este proceso genera un resumen
+# estructurado (asistentes, decisiones, acciones), lo guarda en `resumen_ia` y
+# reindexa el acta. Trabaja por lotes, con concurrencia acotada y cediendo el
+# paso a los turnos de chat en curso.
+
+RESUMENES_LOTE = int(os.getenv("RESUMENES_LOTE", "5"))
+RESUMENES_CONCURRENCIA = int(os.getenv("RESUMENES_CONCURRENCIA", "2"))
+RESUMENES_MAX_CARACTERES = int(os.getenv("RESUMENES_MAX_CARACTERES", "200000"))
+
+PROMPT_RESUMEN = """Sos el secretario técnico del SICyT. A partir de la transcripción de una reunión,
+extraé SOLO lo que se dice explícitamente: asistentes, decisiones tomadas y acciones acordadas
+(con responsable y plazo si se mencionan), más una síntesis breve. No inventes datos.
+
+TRANSCRIPCIÓN:
+{transcripcion}
+"""
+
+class ResumidorActas:
+    def __init__(self):
+        self._cola = queue.Queue()
+        self._en_cola = set()
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._llm = None
+
+    def _modelo(self):
+        if self._llm is None:
+            llm = ChatGemini(model="models/gemini-2.0-flash-001", temperature=0)
+            self._llm = llm.with_structured_output(ResumenActa)
+        return self._llm
+
+    def encolar(self, acta_id):
+        if acta_id is None:
+            return
+        with self._lock:
+            if acta_id in self._en_cola:
+                return
+            self._en_cola.add(acta_id)
+        self._cola.put(acta_id)
+
+    def encolar_pendientes(self):
+        """Backfill: encola las actas que aún no tienen resumen."""
+        try:
+            response = supabase.table("actas_reunion")\
+                .select("id")\
+                .is_("resumen_ia", "null")\
+                .order("created_at", desc=True)\
+                .execute()
+            for fila in response.data or []:
+                self.encolar(fila.get("id"))
+        except Exception as e:
+            logger.error(f"Error buscando actas sin resumen: {e}")
+
+    def iniciar(self):
+        if self._hilo and self._hilo.is_alive():
+            return
+        self._hilo = threading.Thread(target=self._bucle, daemon=True, name="resumidor-actas")
+        self._hilo.start()
+
+    def _bucle(self):
+        with ThreadPoolExecutor(max_workers=RESUMENES_CONCURRENCIA, thread_name_prefix="resumen") as pool:
+            while True:
+                lote = [self._cola.get()]
+                while len(lote) < RESUMENES_LOTE:
+                    try:
+                        lote.append(self._cola.get_nowait())
+                    except queue.Empty:
+                        break
+
+                # Prioridad baja: no competimos con los chats en curso por la cuota del LLM
+                esperar_turno_de_fondo()
+                list(pool.map(self._resumir_de_fondo, lote))
+
+    def _resumir_de_fondo(self, acta_id):
+        with trabajo_de_fondo("resumenes"):
+            self._resumir(acta_id)
+
+    def _resumir(self, acta_id):
+        try:
+            response = supabase.table("actas_reunion")\
+                .select("id, created_at, titulo, resumen_ia, transcripcion")\
+                .eq("id", acta_id)\
+                .limit(1)\
+                .execute()
+            if not response.data:
+                return
+            acta = response.data[0]
+            if acta.get("resumen_ia") or not acta.get("transcripcion"):
+                return
+
+            transcripcion = acta["transcripcion"][:RESUMENES_MAX_CARACTERES]
+            resumen = self._modelo().invoke(PROMPT_RESUMEN.format(transcripcion=transcripcion))
+            acta["resumen_ia"] = resumen.a_texto()
+
+            supabase.table("actas_reunion").update({"resumen_ia": acta["resumen_ia"]}).eq("id", acta_id).execute()
+            marcar_cambio("actas_reunion")
+            indexar_acta(acta, reemplazar=True)
+            logger.info(f"📝 Resumen generado para acta {acta_id}.")
+        except Exception as e:
+            logger.error(f"Error resumiendo acta {acta_id}: {e}")
+        finally:
+            with self._lock:
+                self._en_cola.discard(acta_id)
+
+# Instancia global
+resumidor_actas = ResumidorActas()
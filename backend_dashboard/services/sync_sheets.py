@@ -155,11 +155,17 @@ def descargar_excel_memoria(service, file_id):
 # --- FUNCIÓN PRINCIPAL ---
 
 def sincronizar_google_a_supabase():
+    """
+    Devuelve la huella del contenido sincronizado (None si no se escribió nada).
+    El upsert reescribe todas las filas en cada corrida (updated_at cambia siempre):
+    comparar huellas entre corridas es lo que dice si los datos cambiaron de verdad.
+    """
     service = get_drive_service()
-    if not service: return
+    if not service: return None
 
     supabase = create_client(SUPA_URL, SUPA_KEY)
     total_global_sincronizado = 0
+    huella = hashlib.sha256()
 
     # ITERAMOS SOBRE CADA ARCHIVO (GESTIÓN Y OFICIAL)
     for source in SOURCES:
@@ -304,6 +310,8 @@ def sincronizar_google_a_supabase():
                         supabase.table("agenda_unificada").upsert(batch, on_conflict="id_hash").execute()
                         print(f"      💾 {sheet_name}: {len(batch)} registros insertados/actualizados.")
                         total_global_sincronizado += len(batch)
+                        for registro in sorted(batch, key=lambda r: r["id_hash"]):
+                            huella.update(repr(sorted((k, v) for k, v in registro.items() if k != "updated_at")).encode())
                     except Exception as e:
                         print(f"      ⚠️ Error SQL en {sheet_name}: {e}")
 
@@ -311,6 +319,7 @@ def sincronizar_google_a_supabase():
             logger.error(f"❌ Error procesando {source_name}: {e}")
 
     print(f"\n✅ FIN DEL PROCESO. Total sincronizado: {total_global_sincronizado}")
+    return huella.hexdigest() if total_global_sincronizado else None
 
 if __name__ == "__main__":
     sincronizar_google_a_supabase()
\ No newline at end of file
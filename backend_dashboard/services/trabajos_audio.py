@@ -0,0 +1,166 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from tools.audio import transcribir_archivo
+from tools.transcripcion_segmentada import transcribir_en_segmentos
+from tools.database import guardar_acta, buscar_acta_por_hash
+from services.resumenes_actas import resumidor_actas
+from core.prioridad import trabajo_de_fondo
+
+logger = logging.getLogger(__name__)
+
+# --- TRABAJOS DE TRANSCRIPCIÓN EN SEGUNDO PLANO ---
+# /upload-audio/ solo vuelca el archivo a disco y crea un trabajo; la subida a
+# Gemini, la espera y el guardado del acta corren en este pool. El cliente
+# consulta el estado con GET /api/audio/trabajos/{id}.
+# Deduplicación por SHA-256 del audio: un hash ya transcripto devuelve el acta
+# guardada al instante y dos subidas idénticas en curso comparten el mismo trabajo.
+# Un trabajo terminado solo se reutiliza si su acta sigue en la BD (pudo haberse borrado,
+# incluso desde otro worker): la BD decide, no la memoria de este proceso.
+
+AUDIO_WORKERS = int(os.getenv("AUDIO_WORKERS", "2"))
+TRABAJOS_TTL = int(os.getenv("AUDIO_TRABAJOS_TTL", "3600"))  # Se olvidan 1h después de terminar
+
+def _transcribir_de_fondo(ruta: str, mime_type: str) -> str:
+    """Cada segmento pide turno a Gemini como trabajo de fondo del inquilino 'audio'."""
+    with trabajo_de_fondo("audio"):
+        return transcribir_archivo(ruta, mime_type)
+
+PENDIENTE = "pendiente"
+PROCESANDO = "procesando"
+COMPLETADO = "completado"
+ERROR = "error"
+
+class GestorTrabajosAudio:
+    def __init__(self, max_workers: int = AUDIO_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="audio")
+        self._trabajos = {}
+        self._por_hash = {}   # hash_audio -> último trabajo_id de ese audio
+        self._lock = threading.Lock()
+
+    def _actualizar(self, trabajo_id: str, **campos):
+        with self._lock:
+            trabajo = self._trabajos.get(trabajo_id)
+            if trabajo:
+                trabajo.update(campos, actualizado=datetime.now().isoformat())
+
+    def _purgar_vencidos(self):
+        ahora = time.time()
+        with self._lock:
+            vencidos = [
+                tid for tid, t in self._trabajos.items()
+                if t["estado"] in (COMPLETADO, ERROR) and ahora - t["_fin"] > TRABAJOS_TTL
+            ]
+            for tid in vencidos:
+                trabajo = self._trabajos.pop(tid)
+                if self._por_hash.get(trabajo["hash_audio"]) == tid:
+                    del self._por_hash[trabajo["hash_audio"]]
+
+    def _nuevo(self, hash_audio: str, **campos) -> dict:
+        trabajo_id = str(uuid.uuid4())
+        trabajo = {
+            "id": trabajo_id,
+            "estado": PENDIENTE,
+            "creado": datetime.now().isoformat(),
+            "actualizado": datetime.now().isoformat(),
+            "hash_audio": hash_audio,
+            "duplicado": False,
+            "transcripcion": None,
+            "transcripcion_parcial": "",
+            "segmentos_completados": 0,
+            "segmentos_totales": None,
+            "acta_id": None,
+            "error": None,
+            "_fin": 0.0,
+        }
+        trabajo.update(campos)
+        self._trabajos[trabajo_id] = trabajo
+        if hash_audio:
+            self._por_hash[hash_audio] = trabajo_id
+        return trabajo
+
+    def _en_curso(self, trabajo_id: str) -> bool:
+        """Con el lock tomado."""
+        return bool(trabajo_id) and self._trabajos[trabajo_id]["estado"] in (PENDIENTE, PROCESANDO)
+
+    def crear(self, tmp_path: str, mime_type: str, hash_audio: str = None) -> str:
+        """Crea (o reutiliza) el trabajo para este audio. Devuelve el id del trabajo."""
+        self._purgar_vencidos()
+
+        # 1. Mismo audio en curso en este proceso: se comparte el trabajo
+        with self._lock:
+            existente = self._por_hash.get(hash_audio) if hash_audio else None
+            if self._en_curso(existente):
+                self._descartar(tmp_path)
+                return existente
+
+        # 2. Audio ya transcripto y con el acta todavía guardada: la devolvemos sin volver a Gemini
+        acta = buscar_acta_por_hash(hash_audio) if hash_audio else None
+        with self._lock:
+            existente = self._por_hash.get(hash_audio) if hash_audio else None
+            if self._en_curso(existente):
+                self._descartar(tmp_path)
+                return existente
+            if acta and existente and self._trabajos[existente]["acta_id"] == acta.get("id"):
+                self._descartar(tmp_path)
+                return existente
+            if acta:
+                trabajo = self._nuevo(
+                    hash_audio, estado=COMPLETADO, duplicado=True, transcripcion=acta.get("transcripcion"),
+                    acta_id=acta.get("id"), _fin=time.time()
+                )
+                self._descartar(tmp_path)
+                logger.info(f"♻️ Audio repetido ({hash_audio[:12]}): se reutiliza el acta {acta.get('id')}.")
+                return trabajo["id"]
+            trabajo = self._nuevo(hash_audio)
+
+        self._pool.submit(self._ejecutar, trabajo["id"], tmp_path, mime_type)
+        return trabajo["id"]
+
+    @staticmethod
+    def _descartar(tmp_path: str):
+        try: os.remove(tmp_path)
+        except OSError: pass
+
+    def _ejecutar(self, trabajo_id: str, tmp_path: str, mime_type: str):
+        try:
+            self._actualizar(trabajo_id, estado=PROCESANDO)
+            texto = transcribir_en_segmentos(
+                tmp_path, mime_type, _transcribir_de_fondo,
+                al_avanzar=lambda parcial, hechos, total: self._actualizar(
+                    trabajo_id, transcripcion_parcial=parcial,
+                    segmentos_completados=hechos, segmentos_totales=total
+                )
+            )
+            if not texto:
+                raise ValueError("La transcripción quedó vacía.")
+            hash_audio = self._trabajos[trabajo_id]["hash_audio"]
+            acta_id = guardar_acta(transcripcion=texto, hash_audio=hash_audio)
+            if acta_id is None:
+                # Sin acta no hay nada que reutilizar: el trabajo no puede quedar como completado
+                self._actualizar(trabajo_id, estado=ERROR, transcripcion=texto,
+                                 error="No se pudo guardar el acta.", _fin=time.time())
+                logger.error(f"Trabajo de audio {trabajo_id}: transcripto pero el acta no se guardó.")
+                return
+            resumidor_actas.encolar(acta_id)
+            self._actualizar(trabajo_id, estado=COMPLETADO, transcripcion=texto, acta_id=acta_id, _fin=time.time())
+            logger.info(f"✅ Trabajo de audio {trabajo_id} completado.")
+        except Exception as e:
+            logger.error(f"Error en trabajo de audio {trabajo_id}: {e}")
+            self._actualizar(trabajo_id, estado=ERROR, error=str(e), _fin=time.time())
+        finally:
+            self._descartar(tmp_path)
+
+    def obtener(self, trabajo_id: str):
+        with self._lock:
+            trabajo = self._trabajos.get(trabajo_id)
+            if not trabajo:
+                return None
+            return {k: v for k, v in trabajo.items() if not k.startswith("_")}
+
+# Instancia global
+gestor_trabajos_audio = GestorTrabajosAudio()
@@ -0,0 +1,75 @@
+import os
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# --- WARMUP DE ARRANQUE ---
+# Precarga en paralelo lo que el primer chat pagaría en frío: DataFrame de agenda,
+# grafo de LangGraph, conexiones TLS a Supabase y Gemini, cliente de embeddings.
+# /health/ready devuelve 503 hasta que termina (o se agota el presupuesto de tiempo),
+# así el balanceador solo manda tráfico a workers calientes.
+
+WARMUP_PRESUPUESTO_SEG = float(os.getenv("WARMUP_PRESUPUESTO_SEG", "25"))
+
+estado_warmup = {
+    "listo": False,
+    "inicio": None,
+    "duracion_s": None,
+    "pasos": {},
+}
+
+def _agenda():
+    from tools.analysis import get_df_optimizado
+    return f"{len(get_df_optimizado())} registros"
+
+def _grafo():
+    from agents.main_agent import get_grafo
+    get_grafo()
+
+def _supabase():
+    from monitoring import session_manager
+    if session_manager.supabase:
+        session_manager.supabase.table("sesiones_chat").select("id").limit(1).execute()
+
+def _embeddings():
+    # Consulta real (no cacheada) para abrir la conexión TLS con Gemini
+    from tools.database import embeddings_model, indice_documentos
+    embeddings_model.embed_query("warmup")
+    # El índice local de la biblioteca carga por su cuenta en segundo plano
+    indice_documentos.cargar_en_segundo_plano()
+
+PASOS = {
+    "agenda": _agenda,
+    "grafo": _grafo,
+    "supabase": _supabase,
+    "embeddings_gemini": _embeddings,
+}
+
+async def _ejecutar_paso(nombre: str, funcion):
+    t0 = time.perf_counter()
+    try:
+        detalle = await asyncio.to_thread(funcion)
+        estado_warmup["pasos"][nombre] = {"ok": True, "segundos": round(time.perf_counter() - t0, 3), "detalle": detalle}
+    except Exception as e:
+        logger.warning(f"⚠️ Warmup '{nombre}' falló: {e}")
+        estado_warmup["pasos"][nombre] = {"ok": False, "segundos": round(time.perf_counter() - t0, 3), "error": str(e)}
+
+async def ejecutar_warmup(presupuesto: float = WARMUP_PRESUPUESTO_SEG):
+    """Corre los pasos en paralelo. Al terminar (o vencer el presupuesto) marca el worker como listo."""
+    t0 = time.perf_counter()
+    estado_warmup["inicio"] = time.time()
+    for nombre in PASOS:
+        estado_warmup["pasos"][nombre] = {"ok": None}
+
+    tareas = [asyncio.create_task(_ejecutar_paso(n, f)) for n, f in PASOS.items()]
+    _, pendientes = await asyncio.wait(tareas, timeout=presupuesto)
+    if pendientes:
+        # Los pasos lentos siguen corriendo; no retenemos el tráfico más allá del presupuesto
+        lentos = [n for n, p in estado_warmup["pasos"].items() if p.get("ok") is None]
+        logger.warning(f"⏱️ Warmup superó {presupuesto}s. Pendientes: {lentos}")
+
+    estado_warmup["duracion_s"] = round(time.perf_counter() - t0, 3)
+    estado_warmup["listo"] = True
+    logger.info(f"🔥 Warmup completo en {estado_warmup['duracion_s']}s.")
@@ -1,8 +1,6 @@
 import os
-import smtplib
 import logging
 import pandas as pd
-from email.mime.text import MIMEText
 from datetime import datetime, timedelta
 from langchain.tools import tool
 from google.oauth2 import service_account
@@ -98,27 +96,16 @@ def agendar_reunion_oficial(titulo: str, fecha_hora_inicio: str, duracion_minuto
 def enviar_email_real(destinatario: str, asunto: str, cuerpo: str):
     """
     ENVÍA un correo electrónico real vía SMTP. Úsalo solo cuando el usuario confirme explícitamente el envío.
+    El envío queda en cola: devuelve un id para consultar el estado de entrega.
     """
-    smtp_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-    smtp_port = int(os.getenv("SMTP_PORT", "587"))
-    smtp_user = os.getenv("SMTP_USER")
-    smtp_pass = os.getenv("SMTP_PASSWORD")
+    from services.correo_saliente import cola_correo
 
-    if not smtp_user or not smtp_pass:
-        return "Error de Configuración: Faltan credenciales SMTP en el servidor. Solo puedo generar borradores por ahora."
+    if not cola_correo.configurada():
+        return "Error de Configuración: Falta configurar el servidor SMTP. Solo puedo generar borradores por ahora."
 
     try:
-        msg = MIMEText(cuerpo)
-        msg['Subject'] = f"[MinCYT AI] {asunto}"
-        msg['From'] = smtp_user
-        msg['To'] = destinatario
-
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(smtp_user, smtp_pass)
-            server.send_message(msg)
-        
-        return f"✅ Email enviado correctamente a {destinatario}."
+        mensaje_id = cola_correo.encolar(destinatario, f"[MinCYT AI] {asunto}", cuerpo)
+        return f"📨 Email a {destinatario} en cola de envío (id: {mensaje_id}). Se entrega en segundo plano."
 
     except Exception as e:
-        return f"Error enviando email: {str(e)}"
\ No newline at end of file
+        return f"Error encolando email: {str(e)}"
\ No newline at end of file
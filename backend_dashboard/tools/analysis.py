@@ -2,10 +2,13 @@ import os
 import logging
 import pandas as pd
 import time
+import threading
+import contextvars
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from supabase import create_client
 from langchain_experimental.agents import create_pandas_dataframe_agent
-from langchain_google_genai import ChatGoogleGenerativeAI
+from core.modelos_gemini import ChatGemini
 from langchain.tools import tool
 
 load_dotenv()
@@ -14,57 +17,129 @@ logger = logging.getLogger(__name__)
 SUPA_URL = os.getenv("SUPABASE_URL")
 SUPA_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 
-# --- CACHÉ EN MEMORIA (TTL) ---
-# Evita golpear la BD en cada interacción del chat
+# --- CACHÉ EN MEMORIA (TTL + stale-while-revalidate) ---
+# Evita golpear la BD en cada interacción del chat.
+# - Fresco (< CACHE_TTL): se sirve directo.
+# - Vencido pero < CACHE_MAX_STALE: se sirve el frame anterior y se recarga en un hilo de fondo.
+# - Sin frame (o demasiado viejo): se espera la recarga.
+# En todos los casos corre UNA sola recarga a la vez (single-flight); el resto espera o sirve lo viejo.
 _CACHE_DF = None
 _LAST_UPDATE = 0
 CACHE_TTL = 300  # 5 minutos
+CACHE_MAX_STALE = int(os.getenv("AGENDA_MAX_STALE_SEG", "3600"))
+REINTENTO_TRAS_FALLO = 30  # segundos sin reintentar en segundo plano después de un error
+AGENDA_PAGINA = 1000
 
-def get_df_optimizado():
-    global _CACHE_DF, _LAST_UPDATE
-    try:
-        now = time.time()
-        # Si el caché es válido, úsalo
-        if _CACHE_DF is not None and (now - _LAST_UPDATE < CACHE_TTL):
-            return _CACHE_DF
+_lock_recarga = threading.Lock()
+_ULTIMO_FALLO = 0
 
-        if not SUPA_URL or not SUPA_KEY:
-            return pd.DataFrame()
+def version_agenda() -> float:
+    """Momento de la última recarga del DataFrame (para ETags de /api/agenda)."""
+    return _LAST_UPDATE
 
-        supabase = create_client(SUPA_URL, SUPA_KEY)
-        
-        # Consultamos aumentando el límite (Supabase trae 1000 por defecto)
-        # Traemos campos clave insertados por tu sync_sheets.py
+def _cargar_df():
+    supabase = create_client(SUPA_URL, SUPA_KEY)
+    
+    # Supabase corta en 1000 filas por request: paginamos con range() hasta traer todo
+    # Traemos campos clave insertados por tu sync_sheets.py (id_hash = clave única)
+    datos = []
+    while True:
         response = supabase.table("agenda_unificada")\
-            .select("fecha, titulo, funcionario, lugar, costo, moneda, ambito, organizador, origen_dato")\
-            .limit(10000)\
+            .select("id_hash, fecha, titulo, funcionario, lugar, costo, moneda, ambito, organizador, origen_dato")\
+            .order("id_hash")\
+            .range(len(datos), len(datos) + AGENDA_PAGINA - 1)\
             .execute()
+        datos.extend(response.data or [])
+        if len(response.data or []) < AGENDA_PAGINA:
+            break
+
+    if not datos: return pd.DataFrame()
         
-        datos = response.data
-        if not datos: return pd.DataFrame()
-            
-        df = pd.DataFrame(datos)
-        
-        # Normalización para el LLM
-        if 'fecha' in df.columns:
-            df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce')
-        if 'costo' in df.columns:
-            df['costo'] = pd.to_numeric(df['costo'], errors='coerce').fillna(0)
-            
-        df = df.fillna('')
-        
-        # Columnas auxiliares para búsqueda insensible a mayúsculas
-        df['lugar_norm'] = df['lugar'].astype(str).str.lower()
-        df['funcionario_norm'] = df['funcionario'].astype(str).str.lower()
+    df = pd.DataFrame(datos)
+    
+    # Normalización para el LLM
+    if 'fecha' in df.columns:
+        df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce')
+    if 'costo' in df.columns:
+        df['costo'] = pd.to_numeric(df['costo'], errors='coerce').fillna(0)
         
+    df = df.fillna('')
+    
+    # Columnas auxiliares para búsqueda insensible a mayúsculas
+    df['lugar_norm'] = df['lugar'].astype(str).str.lower()
+    df['funcionario_norm'] = df['funcionario'].astype(str).str.lower()
+    return df
+
+def _recargar(esperar: bool, forzar: bool = False) -> bool:
+    """
+    Single-flight: si otro hilo ya está recargando, `esperar` decide si bloquear o irse.
+    `forzar` recarga aunque el frame esté fresco. Devuelve si publicó un frame nuevo.
+    """
+    global _CACHE_DF, _LAST_UPDATE, _ULTIMO_FALLO
+    llegada = time.time()
+    if not _lock_recarga.acquire(blocking=esperar):
+        return False
+    try:
+        # Mientras esperábamos el lock, otro hilo pudo haber dejado el frame fresco (o fallado recién)
+        if not forzar and _CACHE_DF is not None and time.time() - _LAST_UPDATE < CACHE_TTL:
+            return False
+        if not forzar and _ULTIMO_FALLO >= llegada:
+            return False
+        inicio = time.time()
+        df = _cargar_df()
+        # El frame nuevo se publica de una sola vez: los lectores ven el viejo o el nuevo, nunca a medias
         _CACHE_DF = df
-        _LAST_UPDATE = now
-        logger.info(f"✅ Datos recargados: {len(df)} registros.")
-        return df
-        
+        _LAST_UPDATE = inicio
+        logger.info(f"✅ Datos recargados: {len(df)} registros ({time.time() - inicio:.1f}s).")
+        return True
     except Exception as e:
+        _ULTIMO_FALLO = time.time()
         logger.error(f"Error leyendo Supabase: {e}")
-        return _CACHE_DF if _CACHE_DF is not None else pd.DataFrame()
+        return False
+    finally:
+        _lock_recarga.release()
+
+def forzar_recarga_agenda() -> bool:
+    """
+    Tras un sync con cambios: recarga ya, sin esperar el TTL. Mientras tanto (y si falla)
+    los lectores siguen recibiendo el frame anterior.
+    """
+    return _recargar(esperar=True, forzar=True)
+
+# Snapshot fijo para un lote de preguntas (ver services/lote_chat.py): todas ven los mismos datos
+_SNAPSHOT_DF = contextvars.ContextVar("snapshot_agenda", default=None)
+
+@contextmanager
+def usar_snapshot_agenda(df):
+    token = _SNAPSHOT_DF.set(df)
+    try:
+        yield df
+    finally:
+        _SNAPSHOT_DF.reset(token)
+
+def snapshot_agenda_activo() -> bool:
+    return _SNAPSHOT_DF.get() is not None
+
+def get_df_optimizado():
+    snapshot = _SNAPSHOT_DF.get()
+    if snapshot is not None:
+        return snapshot
+
+    if not SUPA_URL or not SUPA_KEY:
+        return pd.DataFrame()
+
+    df, edad = _CACHE_DF, time.time() - _LAST_UPDATE
+    if df is not None and edad < CACHE_TTL:
+        return df
+
+    if df is not None and edad < CACHE_MAX_STALE:
+        # Stale-while-revalidate: respondemos ya con el frame anterior
+        if not _lock_recarga.locked() and time.time() - _ULTIMO_FALLO > REINTENTO_TRAS_FALLO:
+            threading.Thread(target=_recargar, args=(False,), daemon=True, name="recarga-agenda").start()
+        return df
+
+    _recargar(esperar=True)
+    return _CACHE_DF if _CACHE_DF is not None else pd.DataFrame()
 
 @tool
 def analista_de_datos_cliente(consulta: str):
@@ -89,7 +164,7 @@ def analista_de_datos_cliente(consulta: str):
         - 'origen_dato': Indica de qué Excel vino el dato.
         """
 
-        llm = ChatGoogleGenerativeAI(model="models/gemini-2.0-flash-001", temperature=0)
+        llm = ChatGemini(model="models/gemini-2.0-flash-001", temperature=0)
         
         prefix = f"""
         Eres un Analista de Datos SQL/Pandas riguroso. 
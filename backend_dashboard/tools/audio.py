@@ -1,40 +1,75 @@
 import os
+import time
+import hashlib
 import tempfile
-import shutil
 import logging
 from pathlib import Path
 import google.generativeai as genai
-from fastapi import UploadFile, HTTPException
+from fastapi import UploadFile
+from core.planificador_llm import planificador_llm
 
 logger = logging.getLogger(__name__)
 api_key = os.getenv("GOOGLE_API_KEY")
 if api_key: genai.configure(api_key=api_key)
 
-def procesar_audio_gemini(file: UploadFile) -> str:
+# --- ESPERA DEL PROCESAMIENTO EN GEMINI ---
+AUDIO_TIMEOUT_PROCESAMIENTO = float(os.getenv("AUDIO_TIMEOUT_PROCESAMIENTO", "600"))  # segundos
+AUDIO_ESPERA_INICIAL = 1.0
+AUDIO_ESPERA_MAXIMA = 10.0
+
+def guardar_audio_temporal(file: UploadFile):
+    """
+    Vuelca el upload a un temporal calculando su SHA-256 en el mismo recorrido.
+    Devuelve (ruta, mime_type, hash_hex).
+    """
+    suffix = Path(file.filename or "").suffix or ".webm"
+    hasher = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        while True:
+            bloque = file.file.read(1024 * 1024)
+            if not bloque:
+                break
+            hasher.update(bloque)
+            tmp.write(bloque)
+        tmp_path = tmp.name
+
+    if os.path.getsize(tmp_path) < 1000:
+        os.remove(tmp_path)
+        raise ValueError("Audio muy corto")
+
+    mime_type = "audio/webm" if suffix == ".webm" else file.content_type
+    return tmp_path, mime_type, hasher.hexdigest()
+
+def esperar_archivo_activo(audio_file, timeout: float = AUDIO_TIMEOUT_PROCESAMIENTO):
+    """
+    Consulta el estado del archivo en Gemini con backoff exponencial hasta que
+    deja de estar en PROCESSING. Falla si el archivo queda en FAILED o vence el plazo.
+    """
+    limite = time.monotonic() + timeout
+    espera = AUDIO_ESPERA_INICIAL
+    while audio_file.state.name == "PROCESSING":
+        if time.monotonic() + espera > limite:
+            raise TimeoutError(f"Gemini no terminó de procesar el audio en {timeout:.0f}s")
+        time.sleep(espera)
+        espera = min(espera * 1.5, AUDIO_ESPERA_MAXIMA)
+        audio_file = genai.get_file(audio_file.name)  # Refresca el estado real
+
+    if audio_file.state.name == "FAILED":
+        raise RuntimeError("Gemini no pudo procesar el archivo de audio")
+    return audio_file
+
+def transcribir_archivo(tmp_path: str, mime_type: str) -> str:
+    """Sube el audio a Gemini, espera a que esté listo y devuelve la transcripción."""
+    if not api_key: raise ValueError("Falta API Key")
+
+    # Modelo 2.0 Flash 001
+    modelo = 'models/gemini-2.0-flash-001'
+    model = genai.GenerativeModel(modelo)
+    audio_file = genai.upload_file(path=tmp_path, mime_type=mime_type)
     try:
-        if not api_key: raise ValueError("Falta API Key")
-        suffix = Path(file.filename).suffix or ".webm"
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            shutil.copyfileobj(file.file, tmp)
-            tmp_path = tmp.name
-        
-        if os.path.getsize(tmp_path) < 1000: raise ValueError("Audio muy corto")
-        
-        # Modelo 2.0 Flash 001
-        model = genai.GenerativeModel('models/gemini-2.0-flash-001')
-        audio_file = genai.upload_file(path=tmp_path, mime_type="audio/webm" if suffix == ".webm" else file.content_type)
-        
-        # Esperar proceso (simple loop)
-        import time
-        while audio_file.state.name == "PROCESSING": time.sleep(1)
-            
-        res = model.generate_content(["Transcribe este audio.", audio_file])
-        
+        audio_file = esperar_archivo_activo(audio_file)
+        res = planificador_llm.ejecutar(modelo, model.generate_content, ["Transcribe este audio.", audio_file])
+        return res.text
+    finally:
         try: genai.delete_file(audio_file.name)
         except: pass
-        os.remove(tmp_path)
-        
-        return res.text
-    except Exception as e:
-        logger.error(f"Error audio: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -0,0 +1,177 @@
+import os
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from tools.indice_hibrido import tokenizar
+from tools.cache_embeddings import normalizar_consulta
+from tools.compactacion import estimar_tokens, CARACTERES_POR_TOKEN
+
+logger = logging.getLogger(__name__)
+
+# --- BÚSQUEDA WEB COMPACTA ---
+# Tavily en modo 'advanced' con raw_content devuelve páginas enteras: decenas de KB por búsqueda.
+# Este envoltorio cachea por consulta normalizada (TTL), descarta URLs repetidas y le pasa
+# al agente solo los pasajes que tienen que ver con la pregunta, dentro de un presupuesto de tokens.
+
+WEB_CACHE_TTL_SEG = float(os.getenv("WEB_CACHE_TTL_SEG", "900"))
+WEB_CACHE_MAX = int(os.getenv("WEB_CACHE_MAX", "256"))
+PRESUPUESTO_TOKENS_WEB = int(os.getenv("PRESUPUESTO_TOKENS_WEB", "1500"))
+WEB_PASAJES_POR_FUENTE = 3
+WEB_LARGO_PASAJE = 600  # caracteres
+
+_PARAMETROS_RASTREO = ("utm_", "fbclid", "gclid", "ref")
+
+def normalizar_url(url: str) -> str:
+    """Misma página aunque cambie el esquema, el 'www.', el fragmento o los parámetros de rastreo."""
+    partes = urlsplit((url or "").strip())
+    host = partes.netloc.lower().removeprefix("www.")
+    query = urlencode([(k, v) for k, v in parse_qsl(partes.query) if not k.lower().startswith(_PARAMETROS_RASTREO)])
+    return urlunsplit(("", host, partes.path.rstrip("/") or "/", query, ""))
+
+def partir_en_pasajes(texto: str, largo: int = WEB_LARGO_PASAJE) -> list:
+    """Corta por párrafos y agrupa los cortos hasta ~`largo` caracteres; los largos se cortan por oraciones."""
+    pasajes, actual = [], ""
+    for parrafo in re.split(r"\n\s*\n|\n(?=[#*\-•])", texto or ""):
+        parrafo = re.sub(r"\s+", " ", parrafo).strip()
+        if not parrafo:
+            continue
+        piezas = [parrafo] if len(parrafo) <= largo else re.split(r"(?<=[.!?])\s+", parrafo)
+        for pieza in piezas:
+            if actual and len(actual) + len(pieza) + 1 > largo:
+                pasajes.append(actual)
+                actual = ""
+            actual = f"{actual} {pieza}".strip() if actual else pieza[:largo * 2]
+    if actual:
+        pasajes.append(actual)
+    return pasajes
+
+def puntuar_pasaje(pasaje: str, terminos: set) -> float:
+    """Cobertura de los términos de la consulta, con un leve castigo por largo."""
+    tokens = tokenizar(pasaje)
+    if not tokens or not terminos:
+        return 0.0
+    cubiertos = terminos.intersection(tokens)
+    return len(cubiertos) / len(terminos) + 0.1 * sum(tokens.count(t) for t in cubiertos) / len(tokens)
+
+def seleccionar_pasajes(consulta: str, resultados: list, presupuesto_tokens: int = PRESUPUESTO_TOKENS_WEB) -> list:
+    """
+    Devuelve [{url, titulo, pasajes}] con los mejores pasajes de todas las fuentes
+    (como mucho WEB_PASAJES_POR_FUENTE por URL), en orden de relevancia y dentro del presupuesto.
+    """
+    terminos = set(tokenizar(consulta))
+    candidatos = []
+    for orden, r in enumerate(resultados):
+        # El 'content' de Tavily ya es un extracto relevante; el raw_content aporta el resto
+        vistos = set()
+        for i, texto in enumerate([r.get("content") or ""] + partir_en_pasajes(r.get("raw_content") or "")):
+            texto = texto.strip()
+            clave = normalizar_consulta(texto)
+            if not texto or clave in vistos:
+                continue
+            vistos.add(clave)
+            relevancia = puntuar_pasaje(texto, terminos)
+            if relevancia == 0 and i > 0:
+                continue  # Pasaje del raw_content que no menciona nada de la consulta
+            candidatos.append((relevancia + 0.05 * float(r.get("score") or 0), -orden, texto, r))
+
+    candidatos.sort(key=lambda c: (c[0], c[1]), reverse=True)
+    fuentes = OrderedDict()
+    restante = presupuesto_tokens
+    for puntaje, _, texto, r in candidatos:
+        if restante < 30:
+            break
+        fuente = fuentes.setdefault(r["url"], {"url": r["url"], "titulo": r.get("title") or "", "pasajes": []})
+        if len(fuente["pasajes"]) >= WEB_PASAJES_POR_FUENTE:
+            continue
+        if estimar_tokens(texto) > restante:
+            texto = texto[:restante * CARACTERES_POR_TOKEN].rstrip() + " [...]"
+        fuente["pasajes"].append(texto)
+        restante -= estimar_tokens(texto)
+    return [f for f in fuentes.values() if f["pasajes"]]
+
+def backend_tavily(consulta: str) -> dict:
+    """Backend real. Devuelve la respuesta cruda de Tavily: {'answer', 'results': [{url, title, content, raw_content, score}]}."""
+    from core.config import settings
+    from langchain_community.utilities.tavily_search import TavilySearchAPIWrapper
+
+    api = TavilySearchAPIWrapper(tavily_api_key=settings.TAVILY_API_KEY)
+    return api.raw_results(
+        consulta, max_results=6, search_depth="advanced", include_answer=True, include_raw_content=True
+    )
+
+class BuscadorWeb:
+    """Caché TTL + deduplicación + extracción de pasajes sobre un backend inyectable (ver backend_tavily)."""
+
+    def __init__(self, backend=backend_tavily, ttl: float = WEB_CACHE_TTL_SEG, max_entradas: int = WEB_CACHE_MAX,
+                 presupuesto_tokens: int = PRESUPUESTO_TOKENS_WEB):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.presupuesto_tokens = presupuesto_tokens
+        self._cache = OrderedDict()  # clave -> (expira, texto)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _leer_cache(self, clave: str):
+        with self._lock:
+            entrada = self._cache.get(clave)
+            if entrada and entrada[0] > time.monotonic():
+                self._cache.move_to_end(clave)
+                self.hits += 1
+                return entrada[1]
+            self._cache.pop(clave, None)
+            self.misses += 1
+            return None
+
+    def _guardar_cache(self, clave: str, texto: str):
+        with self._lock:
+            self._cache[clave] = (time.monotonic() + self.ttl, texto)
+            self._cache.move_to_end(clave)
+            while len(self._cache) > self.max_entradas:
+                self._cache.popitem(last=False)
+
+    def buscar(self, consulta: str) -> str:
+        clave = normalizar_consulta(consulta)
+        en_cache = self._leer_cache(clave)
+        if en_cache is not None:
+            return en_cache
+
+        crudo = self.backend(consulta) or {}
+        resultados, urls = [], set()
+        for r in crudo.get("results") or []:
+            url = normalizar_url(r.get("url"))
+            if not r.get("url") or url in urls:
+                continue
+            urls.add(url)
+            resultados.append(r)
+
+        fuentes = seleccionar_pasajes(consulta, resultados, self.presupuesto_tokens)
+        texto = self.formatear(crudo.get("answer"), fuentes)
+        self._guardar_cache(clave, texto)
+
+        tam_crudo = sum(len(r.get("raw_content") or "") + len(r.get("content") or "") for r in crudo.get("results") or [])
+        logger.info(f"🌐 Web '{consulta[:60]}': {len(resultados)} fuentes, {tam_crudo} -> {len(texto)} caracteres.")
+        return texto
+
+    @staticmethod
+    def formatear(respuesta, fuentes: list) -> str:
+        if not fuentes and not respuesta:
+            return "No se encontraron resultados en internet para esa búsqueda."
+        partes = []
+        if respuesta:
+            partes.append(f"RESPUESTA DIRECTA: {respuesta}")
+        for i, f in enumerate(fuentes, 1):
+            cuerpo = "\n".join(f"- {p}" for p in f["pasajes"])
+            partes.append(f"[{i}] {f['titulo']} ({f['url']})\n{cuerpo}")
+        return "\n\n".join(partes)
+
+    def metricas(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "tasa_hit": round(self.hits / total, 3) if total else 0.0,
+                "entradas": len(self._cache)}
+
+buscador_web = BuscadorWeb()
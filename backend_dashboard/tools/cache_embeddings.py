@@ -0,0 +1,135 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import tempfile
+import threading
+from array import array
+from collections import OrderedDict
+from tools.indice_hibrido import normalizar
+
+logger = logging.getLogger(__name__)
+
+# --- CACHÉ DE EMBEDDINGS DE CONSULTAS ---
+# El agente repite (o casi) la misma consulta varias veces por conversación.
+# Nivel 1: LRU en memoria. Nivel 2: SQLite en disco (sobrevive reinicios del worker).
+
+CACHE_EMBEDDINGS_PATH = os.getenv(
+    "CACHE_EMBEDDINGS_PATH", os.path.join(tempfile.gettempdir(), "embeddings_consultas.sqlite3")
+)
+CACHE_EMBEDDINGS_MEMORIA = int(os.getenv("CACHE_EMBEDDINGS_MEMORIA", "2048"))
+CACHE_EMBEDDINGS_DISCO = int(os.getenv("CACHE_EMBEDDINGS_DISCO", "50000"))
+
+def normalizar_consulta(texto: str) -> str:
+    """Minúsculas, sin tildes, espacios colapsados y sin signos de puntuación en los extremos."""
+    texto = re.sub(r"\s+", " ", normalizar(texto)).strip()
+    return texto.strip("¿?¡!.,;: ")
+
+class CacheEmbeddings:
+    def __init__(self, ruta: str = CACHE_EMBEDDINGS_PATH, max_memoria: int = CACHE_EMBEDDINGS_MEMORIA,
+                 max_disco: int = CACHE_EMBEDDINGS_DISCO):
+        self.max_memoria = max_memoria
+        self.max_disco = max_disco
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits_memoria = 0
+        self.hits_disco = 0
+        self.misses = 0
+        self._escrituras = 0
+
+        try:
+            self._db = sqlite3.connect(ruta, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (clave TEXT PRIMARY KEY, vector BLOB, usado REAL)"
+            )
+            self._db.commit()
+        except Exception as e:
+            logger.warning(f"⚠️ Caché de embeddings solo en memoria ({e})")
+            self._db = None
+
+    @staticmethod
+    def clave(texto: str, modelo: str) -> str:
+        return hashlib.sha1(f"{modelo}\x00{normalizar_consulta(texto)}".encode("utf-8")).hexdigest()
+
+    def _leer_disco(self, clave: str):
+        if not self._db:
+            return None
+        fila = self._db.execute("SELECT vector FROM embeddings WHERE clave = ?", (clave,)).fetchone()
+        if not fila:
+            return None
+        # Marca de uso para la poda LRU. Se confirma ya: una transacción abierta retiene el lock
+        # de escritura de SQLite y bloquea a los otros workers. Si la base está ocupada, se omite.
+        try:
+            self._db.execute("UPDATE embeddings SET usado = ? WHERE clave = ?", (time.time(), clave))
+            self._db.commit()
+        except sqlite3.OperationalError as e:
+            self._db.rollback()
+            logger.debug(f"Caché embeddings: no se actualizó el uso ({e})")
+        return array("f", fila[0]).tolist()
+
+    def _escribir_disco(self, clave: str, vector):
+        if not self._db:
+            return
+        self._db.execute(
+            "INSERT OR REPLACE INTO embeddings (clave, vector, usado) VALUES (?, ?, ?)",
+            (clave, array("f", vector).tobytes(), time.time())
+        )
+        self._escrituras += 1
+        # Poda ocasional: conservamos las más usadas recientemente
+        if self._escrituras % 500 == 0:
+            self._db.execute(
+                "DELETE FROM embeddings WHERE clave NOT IN "
+                "(SELECT clave FROM embeddings ORDER BY usado DESC LIMIT ?)", (self.max_disco,)
+            )
+        self._db.commit()
+
+    def _guardar_memoria(self, clave: str, vector):
+        self._memoria[clave] = vector
+        self._memoria.move_to_end(clave)
+        while len(self._memoria) > self.max_memoria:
+            self._memoria.popitem(last=False)
+
+    def obtener_o_calcular(self, texto: str, modelo: str, calcular):
+        """Devuelve el embedding cacheado o lo calcula con `calcular(texto)` y lo guarda."""
+        clave = self.clave(texto, modelo)
+        with self._lock:
+            vector = self._memoria.get(clave)
+            if vector is not None:
+                self._memoria.move_to_end(clave)
+                self.hits_memoria += 1
+                return vector
+            try:
+                vector = self._leer_disco(clave)
+            except Exception as e:
+                logger.warning(f"Caché embeddings (lectura): {e}")
+                vector = None
+            if vector is not None:
+                self._guardar_memoria(clave, vector)
+                self.hits_disco += 1
+                return vector
+            self.misses += 1
+
+        # La llamada remota va fuera del lock
+        vector = calcular(texto)
+        with self._lock:
+            self._guardar_memoria(clave, vector)
+            try:
+                self._escribir_disco(clave, vector)
+            except Exception as e:
+                logger.warning(f"Caché embeddings (escritura): {e}")
+        return vector
+
+    def metricas(self) -> dict:
+        total = self.hits_memoria + self.hits_disco + self.misses
+        return {
+            "hits_memoria": self.hits_memoria,
+            "hits_disco": self.hits_disco,
+            "misses": self.misses,
+            "hit_rate": round((self.hits_memoria + self.hits_disco) / total, 4) if total else 0.0,
+            "entradas_memoria": len(self._memoria),
+        }
+
+# Instancia global compartida por las tools de búsqueda
+cache_embeddings = CacheEmbeddings()
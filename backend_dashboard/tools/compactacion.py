@@ -0,0 +1,79 @@
+import os
+import math
+from collections import defaultdict
+
+# --- COMPACTACIÓN DE CONTEXTO ---
+# Los fragmentos de la biblioteca se solapan 300 caracteres con el vecino.
+# Antes de pasarlos al LLM: unimos vecinos de la misma fuente/página, quitamos
+# el texto repetido y recortamos al presupuesto de tokens (los de mayor score primero).
+
+PRESUPUESTO_TOKENS_DOCUMENTOS = int(os.getenv("PRESUPUESTO_TOKENS_DOCUMENTOS", "2500"))
+CARACTERES_POR_TOKEN = 4  # Aproximación suficiente para Gemini en español
+
+def estimar_tokens(texto: str) -> int:
+    return math.ceil(len(texto) / CARACTERES_POR_TOKEN)
+
+def solapamiento(a: str, b: str, maximo: int = 600, minimo: int = 20) -> int:
+    """Largo del sufijo más largo de `a` que es prefijo de `b` (0 si es menor a `minimo`)."""
+    limite = min(len(a), len(b), maximo)
+    for k in range(limite, minimo - 1, -1):
+        if a.endswith(b[:k]):
+            return k
+    return 0
+
+def _son_consecutivos(id_a, id_b) -> bool:
+    return isinstance(id_a, int) and isinstance(id_b, int) and id_b - id_a == 1
+
+def fusionar_vecinos(docs: list) -> list:
+    """
+    Agrupa por (fuente, página) y une los fragmentos adyacentes.
+    Devuelve bloques {fuente, pagina, contenido, score, ids, metadata}.
+    """
+    grupos = defaultdict(list)
+    for orden, doc in enumerate(docs):
+        metadata = doc.get("metadata") or {}
+        clave = (metadata.get("source", "Desconocido"), metadata.get("page", "?"))
+        grupos[clave].append((orden, doc))
+
+    bloques = []
+    for (fuente, pagina), items in grupos.items():
+        # Orden de lectura: por id de inserción si lo hay, si no como vinieron
+        items.sort(key=lambda x: (x[1].get("id") is None, x[1].get("id") or 0, x[0]))
+        actual = None
+        for _, doc in items:
+            texto = (doc.get("content") or "").strip()
+            score = doc.get("score", doc.get("similarity", 0)) or 0
+            if actual is not None:
+                k = solapamiento(actual["contenido"], texto)
+                if k or _son_consecutivos(actual["ids"][-1], doc.get("id")):
+                    actual["contenido"] += ("" if k else "\n") + texto[k:]
+                    actual["score"] = max(actual["score"], score)
+                    actual["ids"].append(doc.get("id"))
+                    continue
+                bloques.append(actual)
+            actual = {
+                "fuente": fuente, "pagina": pagina, "contenido": texto, "score": score,
+                "ids": [doc.get("id")], "metadata": doc.get("metadata") or {},
+            }
+        if actual is not None:
+            bloques.append(actual)
+    return bloques
+
+def compactar_fragmentos(docs: list, presupuesto_tokens: int = PRESUPUESTO_TOKENS_DOCUMENTOS) -> list:
+    """Fusiona vecinos y devuelve los bloques por score descendente, dentro del presupuesto."""
+    bloques = sorted(fusionar_vecinos(docs), key=lambda b: b["score"], reverse=True)
+
+    seleccion = []
+    restante = presupuesto_tokens
+    for bloque in bloques:
+        tokens = estimar_tokens(bloque["contenido"])
+        if tokens <= restante:
+            seleccion.append(bloque)
+            restante -= tokens
+            continue
+        # El primero que no entra se recorta si queda un margen útil; después cortamos
+        if restante >= 100:
+            bloque["contenido"] = bloque["contenido"][:restante * CARACTERES_POR_TOKEN].rstrip() + " [...]"
+            seleccion.append(bloque)
+        break
+    return seleccion
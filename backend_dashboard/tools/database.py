@@ -3,7 +3,13 @@ import re
 import logging
 from supabase import create_client, Client
 from langchain_core.tools import tool
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from core.modelos_gemini import EmbeddingsGemini
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from tools.indice_hibrido import IndiceHibrido, cargador_supabase
+from tools.cache_embeddings import cache_embeddings
+from tools.compactacion import compactar_fragmentos, PRESUPUESTO_TOKENS_DOCUMENTOS
+from core.versiones import marcar_cambio
+from core.paginacion import filtro_keyset
 
 logger = logging.getLogger(__name__)
 
@@ -16,7 +22,11 @@ class MockClient:
     def select(self, *args): return self
     def order(self, *args): return self
     def limit(self, *args): return self
+    def range(self, *args): return self
     def eq(self, *args): return self
+    def is_(self, *args): return self
+    def or_(self, *args): return self
+    def update(self, data): return self
     def delete(self): return self
     def rpc(self, *args): return self
     @property
@@ -35,38 +45,102 @@ else:
 
 # Modelo de Embeddings para consultas (debe coincidir con docs.py)
 try:
-    embeddings_model = GoogleGenerativeAIEmbeddings(
+    embeddings_model = EmbeddingsGemini(
         model="models/text-embedding-004", 
         task_type="retrieval_query"
     )
 except Exception:
-    embeddings_model = GoogleGenerativeAIEmbeddings(
+    embeddings_model = EmbeddingsGemini(
         model="models/embedding-001", 
         task_type="retrieval_query"
     )
 
+def vectorizar_consulta(texto: str):
+    """embed_query con caché LRU + disco (ver tools/cache_embeddings.py)."""
+    return cache_embeddings.obtener_o_calcular(texto, embeddings_model.model, embeddings_model.embed_query)
+
+# --- ÍNDICE LOCAL DE LA BIBLIOTECA ---
+# Vector + BM25 en memoria sobre `libreria_documentos`. Se carga en segundo plano
+# la primera vez; mientras tanto se usa la RPC remota. docs.py lo mantiene al día.
+# Con un solo worker no hace falta recargarlo nunca. INDICE_TTL (segundos) activa una
+# recarga completa periódica para despliegues con varios workers; 0 = desactivada.
+INDICE_TTL = int(os.getenv("INDICE_TTL", "0"))
+indice_documentos = IndiceHibrido(
+    "libreria_documentos",
+    cargador_supabase(supabase, "libreria_documentos"),
+    cuantizar=os.getenv("INDICE_INT8", "1") == "1",
+    ttl=INDICE_TTL,
+)
+
+# --- ÍNDICE DE ACTAS ---
+# Transcripciones y resúmenes troceados como la biblioteca, en `actas_fragmentos`.
+# guardar_acta indexa cada acta nueva; indexar_actas_existentes completa las viejas.
+indice_actas = IndiceHibrido(
+    "actas_fragmentos",
+    cargador_supabase(supabase, "actas_fragmentos"),
+    cuantizar=os.getenv("INDICE_INT8", "1") == "1",
+    ttl=INDICE_TTL,
+)
+PRESUPUESTO_TOKENS_ACTAS = int(os.getenv("PRESUPUESTO_TOKENS_ACTAS", str(PRESUPUESTO_TOKENS_DOCUMENTOS)))
+
+splitter_actas = RecursiveCharacterTextSplitter(
+    chunk_size=1500,
+    chunk_overlap=300,
+    separators=["\n\n", "\n", ". ", " ", ""]
+)
+
 # --- TOOLS ---
 
 @tool
 def consultar_actas_reuniones(query: str):
-    """Consulta el historial de reuniones grabadas previamente."""
+    """
+    Busca en las actas de reuniones grabadas (transcripciones y resúmenes).
+    Devuelve solo los pasajes relevantes a la consulta, con ID y fecha del acta.
+    """
     try:
-        response = supabase.table("actas_reunion").select("*").order("created_at", desc=True).limit(5).execute()
-        actas = response.data if response.data else []
-        
-        if not actas: return "No hay actas registradas."
-        
-        texto = "--- HISTORIAL REUNIONES ---\n"
-        for a in actas:
-            fecha = a.get('created_at', '')[:10]
-            titulo = a.get('titulo', 'Sin título')
-            # Preferimos el resumen IA, si no, un trozo de transcripción
-            contenido = a.get('resumen_ia') or (a.get('transcripcion', '')[:500] + "...")
-            texto += f"- ID {a.get('id')} [{fecha}] {titulo}: {contenido}\n"
+        if not query or not query.strip():
+            return _ultimas_actas()
+
+        if not indice_actas.listo():
+            indice_actas.cargar()  # Tabla chica: la primera consulta la carga en línea
+
+        vector = vectorizar_consulta(query)
+        candidatos = indice_actas.buscar(query, vector, k=12)
+        if not candidatos:
+            return "No encontré pasajes de actas relacionados con la consulta."
+
+        bloques = compactar_fragmentos(candidatos, PRESUPUESTO_TOKENS_ACTAS)
+        texto = f"--- ACTAS RELEVANTES ({len(bloques)} pasajes) ---\n"
+        for b in bloques:
+            m = b["metadata"]
+            texto += (
+                f"- ID {m.get('acta_id')} [{m.get('fecha', '')}] {m.get('titulo', 'Sin título')} "
+                f"({m.get('tipo', 'transcripción')}):\n{b['contenido']}\n"
+            )
         return texto
     except Exception as e:
         return f"Error consultando actas: {e}"
 
+def _ultimas_actas(limite: int = 5):
+    """Sin consulta concreta: las últimas actas (resumen o inicio de la transcripción)."""
+    response = supabase.table("actas_reunion")\
+        .select("id, created_at, titulo, resumen_ia, transcripcion")\
+        .order("created_at", desc=True)\
+        .limit(limite)\
+        .execute()
+    actas = response.data if response.data else []
+    
+    if not actas: return "No hay actas registradas."
+    
+    texto = "--- HISTORIAL REUNIONES ---\n"
+    for a in actas:
+        fecha = (a.get('created_at') or '')[:10]
+        titulo = a.get('titulo', 'Sin título')
+        # Preferimos el resumen IA, si no, un trozo de transcripción
+        contenido = a.get('resumen_ia') or ((a.get('transcripcion') or '')[:500] + "...")
+        texto += f"- ID {a.get('id')} [{fecha}] {titulo}: {contenido}\n"
+    return texto
+
 @tool
 def consultar_biblioteca_documentos(pregunta: str):
     """
@@ -77,53 +151,30 @@ def consultar_biblioteca_documentos(pregunta: str):
     - Devuelve fragmentos de texto originales. NO inventa.
     """
     try:
-        # 1. Vectorizar la pregunta del usuario
-        vector_pregunta = embeddings_model.embed_query(pregunta)
+        # 1. Vectorizar la pregunta del usuario (con caché por texto normalizado + modelo)
+        vector_pregunta = vectorizar_consulta(pregunta)
         
-        # 2. Búsqueda Semántica en Supabase (RPC)
-        response = supabase.rpc(
-            "buscar_documentos", 
-            {
-                "query_embedding": vector_pregunta,
-                "match_threshold": 0.30, # (CAMBIO) Bajamos umbral para ser más tolerantes
-                "match_count": 15        # (CAMBIO) Traemos más candidatos iniciales (antes 8)
-            }
-        ).execute()
-        
-        if not response.data:
+        # 2. Búsqueda Híbrida local (Vector + BM25 con RRF)
+        if indice_documentos.listo():
+            candidatos = indice_documentos.buscar(pregunta, vector_pregunta, k=15)
+        else:
+            indice_documentos.cargar_en_segundo_plano()
+            candidatos = _buscar_documentos_rpc(pregunta, vector_pregunta)
+
+        if not candidatos:
             return "No se encontraron documentos relevantes en la biblioteca."
 
-        candidatos = response.data
-        
-        # 3. Re-Ranking Lógico (Python-side)
-        palabras_clave = [w.lower() for w in pregunta.split() if len(w) > 4]
+        # 3. Compactación: unimos vecinos, quitamos el solapamiento y ajustamos al presupuesto de tokens
+        bloques = compactar_fragmentos(candidatos)
         
-        def score_extra(doc):
-            # Damos puntos extra si el nombre del archivo está en la pregunta
-            source = doc.get('metadata', {}).get('source', '').lower()
-            if any(p in source for p in palabras_clave):
-                return 15 # (CAMBIO) Aumentamos el peso del bonus
-            return 0
-
-        # Ordenamos por (Score Semántico original + Bonus de nombre de archivo)
-        candidatos.sort(key=lambda x: x.get('similarity', 0) + score_extra(x), reverse=True)
-
-        # 4. Formatear Respuesta para el Agente
-        # (CAMBIO) Tomamos los Top 8 definitivos (antes 4) para dar más contexto
-        top_docs = candidatos[:8]
-        
-        contexto = f"--- RESULTADOS DE BÚSQUEDA ({len(top_docs)} fragmentos más relevantes) ---\n"
+        contexto = f"--- RESULTADOS DE BÚSQUEDA ({len(bloques)} fragmentos más relevantes) ---\n"
         contexto += "Instrucción: Usa esta información detallada para responder al usuario.\n\n"
 
-        for i, doc in enumerate(top_docs):
-            fuente = doc.get('metadata', {}).get('source', 'Desconocido')
-            pagina = doc.get('metadata', {}).get('page', '?') # Info de página si existe
-            
-            # (CAMBIO CRÍTICO) Eliminamos el recorte de 1000 caracteres.
-            # Pasamos el contenido completo del chunk.
-            contenido = doc.get('content', '').strip()
-            
-            contexto += f"📄 [Fragmento {i+1}] FUENTE: {fuente} (Pág: {pagina})\nCONTENIDO:\n{contenido}\n{'-'*40}\n"
+        for i, bloque in enumerate(bloques):
+            contexto += (
+                f"📄 [Fragmento {i+1}] FUENTE: {bloque['fuente']} (Pág: {bloque['pagina']})\n"
+                f"CONTENIDO:\n{bloque['contenido']}\n{'-'*40}\n"
+            )
             
         return contexto
 
@@ -131,21 +182,143 @@ def consultar_biblioteca_documentos(pregunta: str):
         logger.error(f"Error biblioteca: {e}")
         return f"Error técnico consultando documentos: {str(e)}"
 
+def _buscar_documentos_rpc(pregunta: str, vector_pregunta):
+    """Búsqueda remota (fallback mientras el índice local no está cargado)."""
+    response = supabase.rpc(
+        "buscar_documentos", 
+        {
+            "query_embedding": vector_pregunta,
+            "match_threshold": 0.30, # (CAMBIO) Bajamos umbral para ser más tolerantes
+            "match_count": 15        # (CAMBIO) Traemos más candidatos iniciales (antes 8)
+        }
+    ).execute()
+    candidatos = response.data or []
+
+    # Re-Ranking Lógico (Python-side)
+    palabras_clave = [w.lower() for w in pregunta.split() if len(w) > 4]
+
+    def score_extra(doc):
+        # Damos puntos extra si el nombre del archivo está en la pregunta
+        source = doc.get('metadata', {}).get('source', '').lower()
+        if any(p in source for p in palabras_clave):
+            return 15 # (CAMBIO) Aumentamos el peso del bonus
+        return 0
+
+    # Score = Semántico original + Bonus de nombre de archivo. Va en "score" para que
+    # compactar_fragmentos ordene igual que este ranking y no solo por similarity.
+    for doc in candidatos:
+        doc['score'] = (doc.get('similarity') or 0) + score_extra(doc)
+    candidatos.sort(key=lambda x: x['score'], reverse=True)
+    return candidatos
+
 # Funciones de soporte para guardar actas (usadas por audio.py)
-def guardar_acta(transcripcion: str, resumen: str = None):
+def guardar_acta(transcripcion: str, resumen: str = None, hash_audio: str = None):
     try:
         titulo = "Reunión: " + (transcripcion[:40] + "..." if len(transcripcion) > 40 else transcripcion)
         data = {"transcripcion": transcripcion, "resumen_ia": resumen, "titulo": titulo}
-        supabase.table("actas_reunion").insert(data).execute()
+        if hash_audio:
+            data["hash_audio"] = hash_audio
+        try:
+            response = supabase.table("actas_reunion").insert(data).execute()
+        except Exception as e:
+            if not hash_audio: raise
+            # BD sin la columna hash_audio todavía: guardamos igual, sin deduplicación
+            logger.warning(f"No se pudo guardar hash_audio ({e}). Reintentando sin hash.")
+            data.pop("hash_audio")
+            response = supabase.table("actas_reunion").insert(data).execute()
+        if not response.data:
+            return None
+
+        acta = response.data[0]
+        marcar_cambio("actas_reunion")
+        indexar_acta(acta)
+        return acta.get("id")
     except Exception as e:
         logger.error(f"Error guardando acta: {e}")
+        return None
+
+def indexar_acta(acta: dict, reemplazar: bool = False):
+    """Trocea resumen y transcripción de un acta, los vectoriza y los guarda en `actas_fragmentos`."""
+    acta_id = acta.get("id")
+    base = {
+        "acta_id": acta_id,
+        "fecha": (acta.get("created_at") or "")[:10],
+        "titulo": acta.get("titulo") or "Sin título",
+        "source": f"Acta {acta_id}",
+    }
+    try:
+        piezas = []
+        for tipo, campo in (("resumen", "resumen_ia"), ("transcripción", "transcripcion")):
+            for chunk in splitter_actas.split_text(acta.get(campo) or ""):
+                piezas.append((chunk, {**base, "tipo": tipo, "page": tipo}))
+        if not piezas:
+            return
+
+        # Primero lo lento (embeddings): si falla, los fragmentos anteriores siguen intactos
+        vectores = embeddings_model.embed_documents([c for c, _ in piezas], task_type="retrieval_document")
+        registros = [
+            {"acta_id": acta_id, "content": chunk, "metadata": metadata, "embedding": vector}
+            for (chunk, metadata), vector in zip(piezas, vectores)
+        ]
+        if reemplazar:
+            supabase.table("actas_fragmentos").delete().eq("acta_id", acta_id).execute()
+        response = supabase.table("actas_fragmentos").insert(registros).execute()
+        for registro, fila in zip(registros, response.data or []):
+            registro["id"] = fila.get("id")
+        if reemplazar:
+            indice_actas.reemplazar_por("acta_id", acta_id, registros)
+        else:
+            indice_actas.agregar(registros)
+    except Exception as e:
+        logger.error(f"Error indexando acta {acta_id}: {e}")
+
+def indexar_actas_existentes():
+    """Backfill: indexa las actas que todavía no tienen fragmentos."""
+    try:
+        indexadas = {f.get("acta_id") for f in cargador_supabase(supabase, "actas_fragmentos", "id, acta_id")()}
+        pendientes = [
+            a for a in cargador_supabase(supabase, "actas_reunion", "id, created_at, titulo, resumen_ia, transcripcion")()
+            if a.get("id") not in indexadas
+        ]
+        for acta in pendientes:
+            indexar_acta(acta)
+        if pendientes:
+            logger.info(f"✅ Actas indexadas (backfill): {len(pendientes)}")
+    except Exception as e:
+        logger.error(f"Error en backfill de actas: {e}")
+
+def buscar_acta_por_hash(hash_audio: str):
+    """Devuelve el acta ya transcripta de un audio idéntico (mismo SHA-256), o None."""
+    try:
+        response = supabase.table("actas_reunion")\
+            .select("id, transcripcion")\
+            .eq("hash_audio", hash_audio)\
+            .limit(1)\
+            .execute()
+        return response.data[0] if response.data else None
+    except Exception as e:
+        logger.warning(f"Búsqueda por hash de audio no disponible: {e}")
+        return None
 
 def borrar_acta(id_acta: int):
     try:
         supabase.table("actas_reunion").delete().eq("id", id_acta).execute()
+        marcar_cambio("actas_reunion")
+        try:
+            supabase.table("actas_fragmentos").delete().eq("acta_id", id_acta).execute()
+        except Exception as e:
+            logger.warning(f"No se pudieron borrar fragmentos del acta {id_acta}: {e}")
+        indice_actas.eliminar_por("acta_id", id_acta)
         return True
     except Exception: return False
 
-def obtener_historial_actas():
-    # Wrapper simple para el endpoint REST si se necesita directo
-    return supabase.table("actas_reunion").select("*").order("created_at", desc=True).limit(10).execute().data
\ No newline at end of file
+def obtener_historial_actas(limite: int = 10, cursor: dict = None, columnas: str = "*"):
+    """Página de actas (más nuevas primero). `cursor` = {created_at, id} de la última fila vista."""
+    consulta = supabase.table("actas_reunion").select(columnas)
+    if cursor:
+        consulta = consulta.or_(filtro_keyset("created_at", cursor))
+    return consulta.order("created_at", desc=True).order("id", desc=True).limit(limite).execute().data
+
+def obtener_acta(id_acta: int):
+    response = supabase.table("actas_reunion").select("*").eq("id", id_acta).limit(1).execute()
+    return response.data[0] if response.data else None
@@ -3,12 +3,15 @@ import logging
 import pandas as pd
 from fastapi import UploadFile
 from supabase import create_client
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from core.modelos_gemini import EmbeddingsGemini
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from pypdf import PdfReader 
-import io
+from tools.database import indice_documentos
+from tools.pdf_paralelo import contar_paginas, extraer_paginas
 import docx
 import re
+import shutil
+import tempfile
+from pathlib import Path
 
 # Configuración de logs
 logger = logging.getLogger(__name__)
@@ -26,13 +29,13 @@ except Exception as e:
 
 # 2. Modelo de Embeddings (Text-to-Vector)
 try:
-    embeddings_model = GoogleGenerativeAIEmbeddings(
+    embeddings_model = EmbeddingsGemini(
         model="models/text-embedding-004", 
         task_type="retrieval_document"
     )
 except Exception:
     logger.warning("⚠️ Modelo 004 no disponible, usando fallback a embedding-001")
-    embeddings_model = GoogleGenerativeAIEmbeddings(
+    embeddings_model = EmbeddingsGemini(
         model="models/embedding-001", 
         task_type="retrieval_document"
     )
@@ -47,112 +50,255 @@ def limpiar_texto(texto: str) -> str:
     texto = re.sub(r'\n{3,}', '\n\n', texto)
     return texto.strip()
 
+# --- PARÁMETROS DE INGESTA EN FLUJO ---
+# El archivo se vuelca a disco y se procesa por segmentos para que la memoria
+# no crezca con el tamaño del upload (anexos escaneados de 100+ MB).
+TAM_BLOQUE_SPOOL = 1024 * 1024   # 1 MB por escritura al temporal
+FILAS_POR_GRUPO = 500            # Filas por grupo en CSV / Excel
+PARRAFOS_POR_GRUPO = 200         # Párrafos por grupo en Word
+UMBRAL_TROCEO = 8000             # Caracteres acumulados antes de trocear
+LOTE_EMBEDDINGS = 32             # Fragmentos por llamada de embeddings + insert
+
+_MARCA_PAGINA = re.compile(r"--- Pág (\d+) ---")
+
+def _volcar_a_disco(file: UploadFile, suffix: str) -> str:
+    """Copia el upload a un temporal por bloques, sin cargarlo entero en RAM."""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        shutil.copyfileobj(file.file, tmp, TAM_BLOQUE_SPOOL)
+        return tmp.name
+
+def _segmentos_pdf(ruta: str, metadata_extra: dict):
+    try:
+        # Solo el conteo: el reader no queda vivo mientras dura la extracción
+        total = contar_paginas(ruta)
+    except ValueError:
+        raise
+    except Exception as e:
+        raise ValueError(f"Error leyendo PDF: {str(e)}")
+
+    metadata_extra["pages"] = total
+
+    # Siempre en procesos hijos: el timeout por página (SIGALRM) no funciona en este hilo.
+    # extraer_paginas decide cuántos según el tamaño del documento y la memoria libre.
+    textos = extraer_paginas(ruta, total)
+
+    for i, page_text in enumerate(textos):
+        # Marca de página crítica para citas
+        yield f"\n--- Pág {i+1} ---\n{page_text}"
+
+def _segmentos_tabla(ruta: str, ext: str):
+    try:
+        if ext.endswith(".csv"):
+            grupos = pd.read_csv(ruta, chunksize=FILAS_POR_GRUPO)
+        elif ext.endswith(".xlsx"):
+            grupos = _grupos_xlsx(ruta)
+        else:
+            # .xls (formato binario viejo): no hay lector incremental, se lee entero
+            grupos = [pd.read_excel(ruta)]
+
+        for df in grupos:
+            df = df.dropna(how='all')
+            if not df.empty:
+                yield df.to_string(index=False) + "\n"
+    except Exception as e:
+        raise ValueError(f"Error leyendo Excel: {str(e)}")
+
+def _grupos_xlsx(ruta: str):
+    """Lee la primera hoja en modo streaming (read_only) y la entrega en DataFrames chicos."""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        filas = wb.worksheets[0].iter_rows(values_only=True)
+        encabezado = next(filas, None)
+        if encabezado is None:
+            return
+        columnas = [str(c) if c is not None else f"Col{i}" for i, c in enumerate(encabezado)]
+        grupo = []
+        for fila in filas:
+            grupo.append(fila)
+            if len(grupo) >= FILAS_POR_GRUPO:
+                yield pd.DataFrame(grupo, columns=columnas)
+                grupo = []
+        if grupo:
+            yield pd.DataFrame(grupo, columns=columnas)
+    finally:
+        wb.close()
+
+def _segmentos_docx(ruta: str):
+    try:
+        doc = docx.Document(ruta)
+        parrafos = doc.paragraphs
+        for i in range(0, len(parrafos), PARRAFOS_POR_GRUPO):
+            yield "\n".join(p.text for p in parrafos[i:i + PARRAFOS_POR_GRUPO]) + "\n"
+    except Exception as e:
+        raise ValueError(f"Error leyendo Word: {str(e)}")
+
+def _segmentos_txt(ruta: str):
+    with open(ruta, "r", encoding="utf-8", errors="ignore") as f:
+        while True:
+            bloque = f.read(64 * 1024)
+            if not bloque:
+                break
+            yield bloque
+
+def iterar_segmentos(ruta: str, ext: str, metadata_extra: dict):
+    """
+    Generador de texto por segmentos según el tipo de archivo
+    (página en PDF, grupo de filas en Excel/CSV, bloque en Word/TXT).
+    """
+    if ext.endswith(".pdf"):
+        return _segmentos_pdf(ruta, metadata_extra)
+    if ext.endswith((".xlsx", ".xls", ".csv")):
+        return _segmentos_tabla(ruta, ext)
+    if ext.endswith(".docx"):
+        return _segmentos_docx(ruta)
+    if ext.endswith(".txt"):
+        return _segmentos_txt(ruta)
+    raise ValueError("Formato no soportado.")
+
+def trocear_en_flujo(segmentos, text_splitter):
+    """
+    Trocea el texto a medida que llega. Se guarda el último fragmento como
+    arrastre para que el corte entre segmentos respete el solapamiento.
+    """
+    pendiente = ""
+    for segmento in segmentos:
+        pendiente += segmento
+        if len(pendiente) < UMBRAL_TROCEO:
+            continue
+        trozos = text_splitter.split_text(pendiente)
+        for trozo in trozos[:-1]:
+            yield trozo
+        pendiente = trozos[-1] if trozos else ""
+
+    if pendiente.strip():
+        yield from text_splitter.split_text(pendiente)
+
+def _pagina_de_fragmento(chunk: str, pagina_actual):
+    """Devuelve (página donde empieza el fragmento, última página vista)."""
+    marcas = _MARCA_PAGINA.findall(chunk)
+    if not marcas:
+        return pagina_actual, pagina_actual
+    if chunk.lstrip().startswith("--- Pág") or pagina_actual is None:
+        return int(marcas[0]), int(marcas[-1])
+    return pagina_actual, int(marcas[-1])
+
+def _indexar_lote(lote, filename: str, content_type: str, metadata_extra: dict):
+    # Vectorizamos texto limpio, pero guardamos el texto original con formato para lectura humana
+    vectores = embeddings_model.embed_documents([limpio for _, limpio, _ in lote])
+
+    registros = []
+    for (chunk, _, pagina), vector in zip(lote, vectores):
+        metadata = {"source": filename, "type": content_type, **metadata_extra}
+        if pagina is not None:
+            metadata["page"] = pagina
+        registros.append({"content": chunk, "metadata": metadata, "embedding": vector})
+
+    response = supabase.table("libreria_documentos").insert(registros).execute()
+
+    # Sincronización incremental del índice local (usa los ids que devolvió la BD)
+    insertados = response.data or []
+    for registro, fila in zip(registros, insertados):
+        registro["id"] = fila.get("id")
+    indice_documentos.agregar(registros)
+
+def _borrar_fragmentos(filename: str):
+    try:
+        supabase.table("libreria_documentos").delete().match({"metadata": {"source": filename}}).execute()
+        indice_documentos.eliminar_por("source", filename)
+    except Exception: pass
+
 def procesar_archivo_subido(file: UploadFile):
     """
     Recibe PDF, Excel, Word o TXT, extrae el texto, lo divide y lo guarda vectorializado.
+    El procesamiento es en flujo: extracción, troceo y embeddings avanzan por lotes,
+    así la memoria queda acotada sin importar el tamaño del archivo.
     """
     if not supabase:
         return False, "Error de configuración: Base de datos no disponible."
 
     filename = file.filename
     logger.info(f"Procesando archivo: {filename}")
-    
-    content = file.file.read()
-    file_stream = io.BytesIO(content) 
-    
+
+    ext = filename.lower()
+    if not ext.endswith((".pdf", ".xlsx", ".xls", ".csv", ".docx", ".txt")):
+        return False, "Formato no soportado."
+
+    ruta_tmp = _volcar_a_disco(file, Path(filename).suffix)
+    fragmentos_viejos_borrados = False
+
     try:
-        ext = filename.lower()
-        texto_extraido = ""
         metadata_extra = {} 
         
-        # A. Guardar copia física en Storage (Backup opcional)
+        # A. Guardar copia física en Storage (Backup opcional, se sube desde disco)
         try:
             supabase.storage.from_("biblioteca_documentos").upload(
                 path=filename,
-                file=content,
+                file=ruta_tmp,
                 file_options={"content-type": file.content_type, "x-upsert": "true"}
             )
         except Exception as e:
             logger.warning(f"Nota Storage: {e}")
 
-        # B. Extracción de Texto por Tipo
-        if ext.endswith(".pdf"):
-            try:
-                reader = PdfReader(file_stream)
-                metadata_extra["pages"] = len(reader.pages)
-                for i, page in enumerate(reader.pages):
-                    page_text = page.extract_text() or ""
-                    # Marca de página crítica para citas
-                    texto_extraido += f"\n--- Pág {i+1} ---\n{page_text}"
-            except Exception as e:
-                return False, f"Error leyendo PDF: {str(e)}"
-                
-        elif ext.endswith((".xlsx", ".xls", ".csv")):
-            try:
-                if ext.endswith(".csv"):
-                    df = pd.read_csv(file_stream)
-                else:
-                    df = pd.read_excel(file_stream)
-                
-                df.dropna(how='all', inplace=True)
-                texto_extraido = df.to_string(index=False)
-            except Exception as e:
-                return False, f"Error leyendo Excel: {str(e)}"
-        
-        elif ext.endswith(".docx"):
-            try:
-                doc = docx.Document(file_stream)
-                texto_extraido = "\n".join([para.text for para in doc.paragraphs])
-            except Exception as e:
-                return False, f"Error leyendo Word: {str(e)}"
-
-        elif ext.endswith(".txt"):
-            texto_extraido = content.decode("utf-8", errors="ignore")
-
-        else:
-            return False, "Formato no soportado."
-
-        # C. Limpieza y Validación
-        texto_limpio = limpiar_texto(texto_extraido)
-        if len(texto_limpio) < 50: # Umbral mínimo
-            return False, "El archivo parece estar vacío o es una imagen escaneada sin texto."
-
-        # D. Chunking (División inteligente)
+        # B. Chunking (División inteligente)
         text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1500,    # Tamaño ideal para contexto semántico
             chunk_overlap=300,  # Solapamiento para no perder contexto entre cortes
             separators=["\n--- Pág", "\n\n", "\n", ". ", " ", ""]
         )
-        chunks = text_splitter.split_text(texto_extraido) # Usamos el texto con marcas de pág
 
-        # E. Limpieza BD (Evitar duplicados)
-        try:
-            # Borrar chunks viejos del mismo archivo
-            supabase.table("libreria_documentos").delete().match({"metadata": {"source": filename}}).execute()
-        except Exception: pass
+        # C. Extracción + Troceo + Indexado Vectorial por lotes
+        segmentos = iterar_segmentos(ruta_tmp, ext, metadata_extra)
+        lote = []
+        total_fragmentos = 0
+        total_caracteres = 0
+        pagina_actual = None
 
-        # F. Indexado Vectorial
-        logger.info(f"Indexando {len(chunks)} fragmentos para '{filename}'...")
-        registros = []
-        
-        # Procesamos en lotes si son muchos chunks
-        for chunk in chunks:
-            # Vectorizamos texto limpio, pero guardamos el texto original con formato para lectura humana
+        for chunk in trocear_en_flujo(segmentos, text_splitter):
             chunk_clean = limpiar_texto(chunk)
-            vector = embeddings_model.embed_query(chunk_clean)
-            
-            registros.append({
-                "content": chunk, 
-                "metadata": {"source": filename, "type": file.content_type, **metadata_extra},
-                "embedding": vector
-            })
-            
-        # Inserción (Supabase maneja batch inserts bien, pero si es gigante conviene dividir)
-        if registros:
-            supabase.table("libreria_documentos").insert(registros).execute()
-        
-        return True, f"✅ Archivo '{filename}' procesado e indexado ({len(chunks)} fragmentos)."
+            if not chunk_clean:
+                continue
+            total_caracteres += len(chunk_clean)
+
+            pagina = None
+            if ext.endswith(".pdf"):
+                pagina, pagina_actual = _pagina_de_fragmento(chunk, pagina_actual)
+            lote.append((chunk, chunk_clean, pagina))
+
+            if len(lote) >= LOTE_EMBEDDINGS:
+                # Limpieza BD (Evitar duplicados): recién al tener el primer lote válido
+                if not fragmentos_viejos_borrados:
+                    _borrar_fragmentos(filename)
+                    fragmentos_viejos_borrados = True
+                _indexar_lote(lote, filename, file.content_type, metadata_extra)
+                total_fragmentos += len(lote)
+                lote = []
+
+        # D. Validación (Umbral mínimo)
+        if total_fragmentos == 0 and total_caracteres < 50:
+            return False, "El archivo parece estar vacío o es una imagen escaneada sin texto."
+
+        if lote:
+            if not fragmentos_viejos_borrados:
+                _borrar_fragmentos(filename)
+                fragmentos_viejos_borrados = True
+            _indexar_lote(lote, filename, file.content_type, metadata_extra)
+            total_fragmentos += len(lote)
+
+        logger.info(f"Indexados {total_fragmentos} fragmentos para '{filename}'.")
+        return True, f"✅ Archivo '{filename}' procesado e indexado ({total_fragmentos} fragmentos)."
 
+    except ValueError as e:
+        # Errores de lectura del formato: no dejamos el archivo a medio indexar
+        if fragmentos_viejos_borrados:
+            _borrar_fragmentos(filename)
+        return False, str(e)
     except Exception as e:
         logger.error(f"Error crítico upload: {e}", exc_info=True)
-        return False, f"Error interno procesando archivo: {str(e)}"
\ No newline at end of file
+        if fragmentos_viejos_borrados:
+            _borrar_fragmentos(filename)
+        return False, f"Error interno procesando archivo: {str(e)}"
+    finally:
+        try: os.remove(ruta_tmp)
+        except OSError: pass
@@ -1,15 +1,24 @@
-from langchain_community.tools.tavily_search import TavilySearchResults
-from core.config import settings
-
-def get_search_tool():
+def get_search_tool(buscador=None):
     """
     Configura y devuelve la herramienta de búsqueda en Internet (Tavily).
-    OPTIMIZADA: Modo 'advanced' para respuestas profundas y más resultados.
+    OPTIMIZADA: Modo 'advanced', pero el agente solo recibe los pasajes relevantes
+    (con caché por consulta y URLs deduplicadas, ver tools/busqueda_web.py).
+    `buscador` permite inyectar un BuscadorWeb con otro backend (ej: pruebas locales).
     """
-    return TavilySearchResults(
-        tavily_api_key=settings.TAVILY_API_KEY,
-        max_results=6,           # Aumentamos de 3 a 6 para tener más contexto
-        search_depth="advanced", # CRÍTICO: Busca contenido real, no solo títulos
-        include_answer=True,     # Pide a Tavily una respuesta directa procesada
-        include_raw_content=True # Permite al LLM leer el contenido crudo si lo necesita
-    )
\ No newline at end of file
+    from langchain_core.tools import StructuredTool
+    from tools.busqueda_web import buscador_web
+
+    buscador = buscador or buscador_web
+
+    def tavily_search_results_json(query: str) -> str:
+        return buscador.buscar(query)
+
+    # Mismo nombre que la tool original: el prompt y los timeouts lo referencian
+    return StructuredTool.from_function(
+        tavily_search_results_json,
+        name="tavily_search_results_json",
+        description=(
+            "Buscador de internet. Útil para noticias, eventos actuales y datos públicos. "
+            "La entrada es una consulta de búsqueda."
+        ),
+    )
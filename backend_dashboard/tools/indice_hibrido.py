@@ -0,0 +1,319 @@
+import re
+import json
+import math
+import time
+import logging
+import threading
+import unicodedata
+from collections import defaultdict, Counter
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# --- ÍNDICE HÍBRIDO EN MEMORIA (Vectorial + BM25) ---
+# Reemplaza el viaje a la RPC `buscar_documentos` en cada consulta:
+# - Matriz NumPy de embeddings normalizados (opcionalmente int8 para ahorrar RAM).
+# - Índice invertido BM25 sobre el texto (sirve para números de expediente, siglas, etc.).
+# - Fusión de ambos rankings con Reciprocal Rank Fusion (RRF).
+
+STOPWORDS = {
+    "de", "la", "el", "en", "y", "a", "los", "las", "del", "se", "que", "por", "un", "una",
+    "con", "para", "es", "al", "lo", "como", "mas", "o", "su", "sus", "le", "ya", "si",
+    "sobre", "este", "esta", "ese", "esa", "son", "fue", "ha", "me", "mi", "no", "qué", "que",
+}
+
+_PATRON_TOKEN = re.compile(r"[a-z0-9]+(?:[-/.][a-z0-9]+)*")
+
+def normalizar(texto: str) -> str:
+    """Minúsculas y sin tildes."""
+    texto = unicodedata.normalize("NFKD", str(texto).lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+def tokenizar(texto: str) -> list:
+    """
+    Tokens para BM25. Los compuestos (ej: 'ex-2024-123-gdeba') se indexan enteros
+    y también por partes, así matchea tanto el expediente completo como un tramo.
+    """
+    tokens = []
+    for tok in _PATRON_TOKEN.findall(normalizar(texto)):
+        if len(tok) >= 2 and tok not in STOPWORDS:
+            tokens.append(tok)
+        if any(sep in tok for sep in "-/."):
+            tokens.extend(p for p in re.split(r"[-/.]", tok) if len(p) >= 2 and p not in STOPWORDS)
+    return tokens
+
+def parsear_embedding(valor):
+    """pgvector llega como string '[0.1, ...]' vía PostgREST."""
+    if isinstance(valor, str):
+        valor = json.loads(valor)
+    return np.asarray(valor, dtype=np.float32)
+
+class IndiceHibrido:
+    def __init__(self, nombre: str, cargador, cuantizar: bool = True, ttl: int = 0,
+                 k1: float = 1.5, b: float = 0.75, k_rrf: int = 60):
+        """
+        cargador: función sin argumentos que devuelve un iterable de filas
+        {id, content, metadata, embedding}. Se usa en la carga completa y en los refrescos por TTL.
+        ttl: segundos entre recargas completas; 0 = nunca (agregar/eliminar_por lo mantienen al día).
+        """
+        self.nombre = nombre
+        self.cargador = cargador
+        self.cuantizar = cuantizar
+        self.ttl = ttl
+        self.k1, self.b, self.k_rrf = k1, b, k_rrf
+
+        self._lock = threading.RLock()
+        self._cargando = False
+        self._cargado_en = 0.0
+        self._deltas = None  # Altas/bajas llegadas durante una carga completa (se reaplican al reemplazar)
+        self._reiniciar()
+
+    # --- ESTADO INTERNO ---
+
+    def _reiniciar(self):
+        self._ids, self._textos, self._metadatas = [], [], []
+        self._activos = np.zeros(0, dtype=bool)
+        self._matriz = None        # float32 normalizada o int8
+        self._escalas = None       # factor por fila (solo int8)
+        self._n = 0
+        self._postings = defaultdict(dict)   # token -> {fila: tf}
+        self._largos = []
+        self._largo_total = 0
+        self._borrados = 0
+
+    def _asegurar_capacidad(self, dim: int, extra: int):
+        necesario = self._n + extra
+        if self._matriz is not None and self._matriz.shape[0] >= necesario:
+            return
+        capacidad = max(1024, necesario, 2 * (self._matriz.shape[0] if self._matriz is not None else 0))
+        dtype = np.int8 if self.cuantizar else np.float32
+        nueva = np.zeros((capacidad, dim), dtype=dtype)
+        escalas = np.zeros(capacidad, dtype=np.float32)
+        activos = np.zeros(capacidad, dtype=bool)
+        if self._matriz is not None:
+            nueva[:self._n] = self._matriz[:self._n]
+            escalas[:self._n] = self._escalas[:self._n]
+            activos[:self._n] = self._activos[:self._n]
+        self._matriz, self._escalas, self._activos = nueva, escalas, activos
+
+    def _agregar_filas(self, filas):
+        filas = [f for f in filas if f.get("embedding") is not None]
+        if not filas:
+            return
+        vectores = np.vstack([parsear_embedding(f["embedding"]) for f in filas])
+        normas = np.linalg.norm(vectores, axis=1, keepdims=True)
+        vectores = vectores / np.maximum(normas, 1e-12)
+
+        self._asegurar_capacidad(vectores.shape[1], len(filas))
+        inicio = self._n
+        fin = inicio + len(filas)
+        if self.cuantizar:
+            maximos = np.maximum(np.abs(vectores).max(axis=1), 1e-12)
+            self._matriz[inicio:fin] = np.round(vectores / maximos[:, None] * 127).astype(np.int8)
+            self._escalas[inicio:fin] = maximos / 127
+        else:
+            self._matriz[inicio:fin] = vectores
+            self._escalas[inicio:fin] = 1.0
+        self._activos[inicio:fin] = True
+
+        for offset, f in enumerate(filas):
+            fila = inicio + offset
+            metadata = f.get("metadata") or {}
+            contenido = f.get("content", "")
+            # El nombre del archivo también cuenta como texto (reemplaza el bonus fijo por nombre)
+            tokens = tokenizar(f"{metadata.get('source', '')} {contenido}")
+            for tok, tf in Counter(tokens).items():
+                self._postings[tok][fila] = tf
+            self._largos.append(len(tokens))
+            self._largo_total += len(tokens)
+            self._ids.append(f.get("id"))
+            self._textos.append(contenido)
+            self._metadatas.append(metadata)
+        self._n = fin
+
+    def _eliminar_filas(self, campo: str, valor):
+        for fila, metadata in enumerate(self._metadatas):
+            if self._activos[fila] and metadata.get(campo) == valor:
+                self._activos[fila] = False
+                for tok in set(tokenizar(f"{metadata.get('source', '')} {self._textos[fila]}")):
+                    self._postings[tok].pop(fila, None)
+                self._borrados += 1
+                self._textos[fila] = ""
+
+    @staticmethod
+    def _clave_fila(fila: dict):
+        """Identidad de un fragmento: su id de BD o, si no vino, (archivo, contenido)."""
+        if fila.get("id") is not None:
+            return ("id", fila["id"])
+        return ("texto", (fila.get("metadata") or {}).get("source"), fila.get("content", ""))
+
+    def _reaplicar(self, deltas: list):
+        """Sobre el índice nuevo: los cambios que la carga completa pudo no haber visto."""
+        vistas = None
+        for delta in deltas:
+            if delta[0] == "agregar":
+                if vistas is None:
+                    vistas = {self._clave_fila({"id": i, "metadata": m, "content": t})
+                              for i, m, t, activo in zip(self._ids, self._metadatas, self._textos, self._activos)
+                              if activo}
+                # El cargador pudo haber leído ya estas filas: no las duplicamos
+                filas = [f for f in delta[1] if self._clave_fila(f) not in vistas]
+                self._agregar_filas(filas)
+                vistas.update(self._clave_fila(f) for f in filas)
+            else:
+                self._eliminar_filas(delta[1], delta[2])
+                vistas = None
+
+    # --- CICLO DE VIDA ---
+
+    def listo(self) -> bool:
+        return self._cargado_en > 0
+
+    def cargar(self):
+        """Carga completa desde la fuente. Se construye aparte y se reemplaza de una vez."""
+        t0 = time.time()
+        with self._lock:
+            self._deltas = []
+        nuevo = IndiceHibrido(self.nombre, self.cargador, self.cuantizar, self.ttl, self.k1, self.b, self.k_rrf)
+        try:
+            lote = []
+            for fila in self.cargador():
+                lote.append(fila)
+                if len(lote) >= 1000:
+                    nuevo._agregar_filas(lote)
+                    lote = []
+            nuevo._agregar_filas(lote)
+        except Exception:
+            with self._lock:
+                self._deltas = None
+            raise
+
+        with self._lock:
+            nuevo._reaplicar(self._deltas)
+            self._deltas = None
+            for attr in ("_ids", "_textos", "_metadatas", "_activos", "_matriz", "_escalas", "_n",
+                         "_postings", "_largos", "_largo_total", "_borrados"):
+                setattr(self, attr, getattr(nuevo, attr))
+            self._cargado_en = time.time()
+        logger.info(f"✅ Índice '{self.nombre}' cargado: {self._n} fragmentos en {time.time() - t0:.1f}s.")
+
+    def cargar_en_segundo_plano(self):
+        """Dispara (una sola vez) la carga o el refresco en un hilo aparte."""
+        with self._lock:
+            if self._cargando:
+                return
+            self._cargando = True
+
+        def _tarea():
+            try:
+                self.cargar()
+            except Exception as e:
+                logger.error(f"Error cargando índice '{self.nombre}': {e}")
+            finally:
+                self._cargando = False
+
+        threading.Thread(target=_tarea, daemon=True, name=f"indice-{self.nombre}").start()
+
+    def _refrescar_si_vencido(self):
+        if self.ttl > 0 and self.listo() and time.time() - self._cargado_en > self.ttl:
+            # Solo con varios workers: otros pudieron indexar archivos. Refresco completo sin bloquear la consulta
+            self.cargar_en_segundo_plano()
+
+    # --- SINCRONIZACIÓN INCREMENTAL ---
+
+    def agregar(self, filas):
+        """Agrega fragmentos recién insertados. Si el índice aún no cargó, no hace falta."""
+        with self._lock:
+            if self._deltas is not None:
+                self._deltas.append(("agregar", list(filas)))
+            if self.listo():
+                self._agregar_filas(filas)
+
+    def eliminar_por(self, campo: str, valor):
+        """Da de baja los fragmentos cuyo metadata[campo] == valor (ej: source del archivo)."""
+        with self._lock:
+            if self._deltas is not None:
+                self._deltas.append(("eliminar", campo, valor))
+            if self.listo():
+                self._eliminar_filas(campo, valor)
+
+    def reemplazar_por(self, campo: str, valor, filas):
+        """Baja + alta en un solo paso: ninguna búsqueda ve el documento a medias."""
+        with self._lock:
+            self.eliminar_por(campo, valor)
+            self.agregar(filas)
+
+    # --- BÚSQUEDA ---
+
+    def _ranking_vectorial(self, vector, n: int):
+        q = parsear_embedding(vector)
+        q = q / max(float(np.linalg.norm(q)), 1e-12)
+        scores = np.full(self._n, -np.inf, dtype=np.float32)
+        # Por bloques: evita materializar la matriz entera en float32 cuando está en int8
+        for i in range(0, self._n, 8192):
+            j = min(i + 8192, self._n)
+            bloque = self._matriz[i:j].astype(np.float32, copy=False) @ q
+            scores[i:j] = bloque * self._escalas[i:j]
+        scores[~self._activos[:self._n]] = -np.inf
+        n = min(n, int(self._activos[:self._n].sum()))
+        if n <= 0:
+            return [], scores
+        top = np.argpartition(-scores, n - 1)[:n]
+        return list(top[np.argsort(-scores[top])]), scores
+
+    def _ranking_bm25(self, consulta: str, n: int):
+        tokens = tokenizar(consulta)
+        if not tokens:
+            return []
+        total = max(self._n - self._borrados, 1)
+        promedio = self._largo_total / max(self._n, 1)
+        acumulado = defaultdict(float)
+        for tok in set(tokens):
+            postings = self._postings.get(tok)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for fila, tf in postings.items():
+                norma = tf + self.k1 * (1 - self.b + self.b * self._largos[fila] / promedio)
+                acumulado[fila] += idf * tf * (self.k1 + 1) / norma
+        return sorted(acumulado, key=acumulado.get, reverse=True)[:n]
+
+    def buscar(self, consulta: str, vector, k: int = 15, candidatos: int = 50) -> list:
+        """
+        Devuelve los k fragmentos mejor rankeados por RRF con el formato de la RPC:
+        {id, content, metadata, similarity, score}.
+        """
+        self._refrescar_si_vencido()
+        with self._lock:
+            if self._n == 0:
+                return []
+            vec_top, similitudes = self._ranking_vectorial(vector, candidatos)
+            bm25_top = self._ranking_bm25(consulta, candidatos)
+
+            fusion = defaultdict(float)
+            for ranking in (vec_top, bm25_top):
+                for pos, fila in enumerate(ranking):
+                    fusion[int(fila)] += 1.0 / (self.k_rrf + pos + 1)
+
+            mejores = sorted(fusion, key=fusion.get, reverse=True)[:k]
+            return [{
+                "id": self._ids[f],
+                "content": self._textos[f],
+                "metadata": self._metadatas[f],
+                "similarity": float(similitudes[f]),
+                "score": fusion[f],
+            } for f in mejores]
+
+def cargador_supabase(cliente, tabla: str, columnas: str = "id, content, metadata, embedding", pagina: int = 1000):
+    """Cargador paginado para IndiceHibrido (PostgREST limita las respuestas a ~1000 filas)."""
+    def _cargar():
+        desde = 0
+        while True:
+            datos = cliente.table(tabla).select(columnas).order("id").range(desde, desde + pagina - 1).execute().data
+            if not datos:
+                break
+            yield from datos
+            if len(datos) < pagina:
+                break
+            desde += pagina
+    return _cargar
@@ -0,0 +1,39 @@
+import json
+import logging
+from langchain.tools import tool
+
+logger = logging.getLogger(__name__)
+
+@tool
+def informe_estandar(nombre: str, anio: int = 0, ambito: str = "", semana: str = "", limite: int = 0) -> str:
+    """
+    [INFORMES PRECALCULADOS] Respuesta instantánea y exacta (sin LLM) sobre la agenda.
+    Informes (`nombre`):
+    - gasto_mensual_por_moneda: gasto por mes y moneda. Opcional: anio.
+    - viajes_por_funcionario: viajes y gasto de cada funcionario. Opcional: anio, ambito
+      (filtra por ámbito: Nacional, Internacional, Oficial, Gestión), limite.
+    - internacional_vs_nacional: cantidad y gasto por ámbito. Opcional: anio.
+    - eventos_de_la_semana: eventos de lunes a domingo. Opcional: semana (AAAA-MM-DD, cualquier día de esa semana).
+    Para cualquier otra pregunta sobre los datos usá `analista_de_datos_cliente`.
+    """
+    from services.informes import almacen_informes, INFORMES
+
+    candidatos = {"anio": anio, "ambito": ambito, "semana": semana, "limite": limite}
+    if nombre not in INFORMES:
+        return f"Informe desconocido: {nombre}. Disponibles: {', '.join(INFORMES)}."
+    # Solo pasamos los parámetros que ese informe acepta y que vinieron con valor
+    esperados = INFORMES[nombre]["parametros"]
+    parametros = {k: v for k, v in candidatos.items() if k in esperados and v}
+    try:
+        resultado = almacen_informes.obtener(nombre, **parametros)
+    except ValueError as e:
+        return f"Error: {e}"
+    except Exception as e:
+        logger.error(f"Error informe {nombre}: {e}")
+        return "Hubo un error técnico generando el informe."
+
+    if not resultado["filas"]:
+        return f"Informe {nombre} ({resultado['parametros']}): no hay registros que coincidan."
+    return json.dumps({"informe": nombre, "parametros": resultado["parametros"],
+                       "version_datos": resultado["version"], "filas": resultado["filas"]},
+                      ensure_ascii=False, default=str)
@@ -0,0 +1,253 @@
+import os
+import signal
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from pypdf import PdfReader
+
+# Módulo liviano a propósito: los procesos hijos (spawn) lo importan sin
+# arrastrar Supabase, LangChain ni los modelos de embeddings.
+
+logger = logging.getLogger(__name__)
+
+PDF_PROCESOS = int(os.getenv("PDF_PROCESOS", str(min(4, os.cpu_count() or 1))))
+PDF_TIMEOUT_PAGINA = float(os.getenv("PDF_TIMEOUT_PAGINA", "20"))  # segundos
+PDF_MIN_PAGINAS_PARALELO = int(os.getenv("PDF_MIN_PAGINAS_PARALELO", "40"))
+PAGINAS_POR_RANGO = int(os.getenv("PDF_PAGINAS_POR_RANGO", "25"))
+# Presupuesto de RAM por proceso hijo: intérprete + pypdf, más los objetos ya parseados
+# (que crecen con el tamaño del archivo aunque el PDF se lea desde disco).
+PDF_MEMORIA_BASE_MB = int(os.getenv("PDF_MEMORIA_BASE_MB", "80"))
+
+class _TiempoAgotadoPagina(Exception):
+    pass
+
+def _alarma(signum, frame):
+    raise _TiempoAgotadoPagina()
+
+def abrir_pdf(origen) -> PdfReader:
+    """
+    Abre el PDF (ruta o archivo abierto en modo binario) y, si está cifrado,
+    intenta la contraseña vacía (cifrado solo de permisos).
+    Con un archivo abierto pypdf lee los objetos bajo demanda en lugar de cargar todo en RAM.
+    """
+    reader = PdfReader(origen)
+    if reader.is_encrypted:
+        try:
+            descifrado = reader.decrypt("")
+        except Exception as e:
+            raise ValueError(f"Error leyendo PDF: no se pudo descifrar ({e})")
+        if not descifrado:
+            raise ValueError("Error leyendo PDF: el documento está protegido con contraseña.")
+    return reader
+
+def contar_paginas(ruta: str) -> int:
+    """Solo la cantidad de páginas: el reader se descarta y el archivo se cierra al volver."""
+    with open(ruta, "rb") as archivo:
+        return len(abrir_pdf(archivo).pages)
+
+def extraer_pagina_segura(reader: PdfReader, indice: int, timeout: float = PDF_TIMEOUT_PAGINA) -> str:
+    """
+    Extrae el texto de una página. Una página rota o que supera el timeout
+    devuelve "" en lugar de tumbar el documento entero.
+    El timeout usa SIGALRM, así que solo aplica en el hilo principal: por eso la extracción
+    corre siempre en procesos hijos (ver extraer_paginas), nunca en el hilo del request.
+    """
+    usar_alarma = (
+        timeout > 0 and hasattr(signal, "SIGALRM")
+        and threading.current_thread() is threading.main_thread()
+    )
+    anterior = None
+    try:
+        if usar_alarma:
+            anterior = signal.signal(signal.SIGALRM, _alarma)
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        return reader.pages[indice].extract_text() or ""
+    except _TiempoAgotadoPagina:
+        logger.warning(f"⏱️ Pág {indice + 1}: extracción superó {timeout}s, se omite.")
+        return ""
+    except Exception as e:
+        logger.warning(f"⚠️ Pág {indice + 1} ilegible: {e}")
+        return ""
+    finally:
+        if usar_alarma:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, anterior)
+
+# Reader de ESTE proceso hijo: se reutiliza entre los rangos del mismo archivo.
+# La clave incluye inodo y mtime porque los temporales pueden repetir nombre.
+_LECTOR = {"clave": None, "archivo": None, "reader": None}
+
+def _cerrar_lector():
+    archivo = _LECTOR["archivo"]
+    _LECTOR.update(clave=None, archivo=None, reader=None)
+    if archivo is not None:
+        try: archivo.close()
+        except Exception: pass
+
+def _lector_del_proceso(ruta: str) -> PdfReader:
+    estado = os.stat(ruta)
+    clave = (ruta, estado.st_ino, estado.st_mtime_ns)
+    if _LECTOR["clave"] != clave:
+        _cerrar_lector()
+        archivo = open(ruta, "rb")
+        try:
+            reader = abrir_pdf(archivo)
+        except Exception:
+            archivo.close()
+            raise
+        _LECTOR.update(clave=clave, archivo=archivo, reader=reader)
+    return _LECTOR["reader"]
+
+def _extraer_rango(ruta: str, inicio: int, fin: int, timeout: float, ultimo: bool = False) -> list:
+    """Tarea del pool: extrae [inicio, fin) con el reader del proceso.
+    En el último rango se cierra el archivo para no retener el temporal ya borrado."""
+    try:
+        reader = _lector_del_proceso(ruta)
+        return [extraer_pagina_segura(reader, i, timeout) for i in range(inicio, fin)]
+    finally:
+        if ultimo:
+            _cerrar_lector()
+
+def _nuevo_pool(procesos: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context("spawn"))
+
+# --- POOL COMPARTIDO PARA DOCUMENTOS CHICOS ---
+# Un solo proceso hijo que vive entre uploads: los PDF chicos no pagan el arranque de
+# un intérprete cada vez, y el timeout por página (SIGALRM) sigue aplicando.
+_pool_chico = None
+_lock_pool_chico = threading.Lock()
+
+def _obtener_pool_chico() -> ProcessPoolExecutor:
+    global _pool_chico
+    with _lock_pool_chico:
+        if _pool_chico is None:
+            _pool_chico = _nuevo_pool(1)
+        return _pool_chico
+
+def _descartar_pool_chico(pool: ProcessPoolExecutor):
+    """Pool roto o con un rango colgado: el próximo pedido arranca uno nuevo."""
+    global _pool_chico
+    with _lock_pool_chico:
+        if _pool_chico is pool:
+            _pool_chico = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+# --- CANTIDAD DE PROCESOS ---
+
+def _leer_entero(ruta: str):
+    try:
+        with open(ruta) as f:
+            valor = f.read().strip()
+        return int(valor) if valor.isdigit() else None
+    except (OSError, ValueError):
+        return None
+
+def _memoria_disponible():
+    """Bytes libres para este contenedor (límite del cgroup v2/v1 o MemAvailable). None si no se sabe."""
+    candidatos = []
+    for limite, uso in (("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory.current"),
+                        ("/sys/fs/cgroup/memory/memory.limit_in_bytes", "/sys/fs/cgroup/memory/memory.usage_in_bytes")):
+        maximo, actual = _leer_entero(limite), _leer_entero(uso)
+        # cgroup v1 informa "sin límite" como un número gigante
+        if maximo is not None and actual is not None and maximo < 1 << 60:
+            candidatos.append(max(0, maximo - actual))
+            break
+    try:
+        with open("/proc/meminfo") as f:
+            for linea in f:
+                if linea.startswith("MemAvailable:"):
+                    candidatos.append(int(linea.split()[1]) * 1024)
+                    break
+    except (OSError, ValueError):
+        pass
+    return min(candidatos) if candidatos else None
+
+def _procesos_para(ruta: str, pedidos: int) -> int:
+    """Tope de procesos según el tamaño del archivo y la memoria disponible."""
+    disponible = _memoria_disponible()
+    if disponible is None:
+        return max(1, pedidos)
+    por_proceso = PDF_MEMORIA_BASE_MB * 1024 * 1024 + os.path.getsize(ruta)
+    # Dejamos la mitad libre para el proceso principal y los requests en curso
+    return max(1, min(pedidos, int(disponible * 0.5 // por_proceso)))
+
+def _limite_rango(inicio: int, fin: int) -> float:
+    # Margen sobre el timeout por página: cubre el arranque del proceso y la apertura del PDF
+    return PDF_TIMEOUT_PAGINA * (fin - inicio) + 30
+
+def _rango_en_proceso_aparte(ruta: str, inicio: int, fin: int) -> list:
+    """Reintento de un rango en un proceso nuevo (pool roto): el timeout por página sigue aplicando."""
+    pool = _nuevo_pool(1)
+    try:
+        return pool.submit(_extraer_rango, ruta, inicio, fin, PDF_TIMEOUT_PAGINA).result(timeout=_limite_rango(inicio, fin))
+    except ValueError:
+        raise
+    except Exception as e:
+        logger.warning(f"⚠️ Pág {inicio + 1}-{fin} sin extraer ({type(e).__name__}: {e}), se omiten.")
+        return [""] * (fin - inicio)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def extraer_paginas(ruta: str, total_paginas: int, procesos: int = PDF_PROCESOS):
+    """
+    Generador que devuelve el texto de cada página EN ORDEN, repartiendo rangos
+    de páginas entre procesos. Solo hay 2 rangos por proceso en vuelo para que
+    la memoria quede acotada en documentos enormes.
+    Los documentos grandes (>= PDF_MIN_PAGINAS_PARALELO) tienen su propio pool, con tantos
+    procesos como permitan el tamaño del archivo y la memoria libre. Los chicos, o si la
+    memoria solo alcanza para uno, usan el proceso hijo compartido: siempre hay un proceso
+    hijo porque es lo que garantiza el timeout por página.
+    """
+    procesos = _procesos_para(ruta, procesos) if total_paginas >= PDF_MIN_PAGINAS_PARALELO else 1
+    compartido = procesos == 1
+    rangos = iter([
+        (i, min(i + PAGINAS_POR_RANGO, total_paginas))
+        for i in range(0, total_paginas, PAGINAS_POR_RANGO)
+    ])
+    propio = None if compartido else _nuevo_pool(procesos)
+    pendientes = deque()
+
+    def encolar():
+        rango = next(rangos, None)
+        if rango:
+            pool = _obtener_pool_chico() if compartido else propio
+            try:
+                futuro = pool.submit(_extraer_rango, ruta, rango[0], rango[1], PDF_TIMEOUT_PAGINA,
+                                     rango[1] == total_paginas)
+            except Exception:
+                futuro = None  # Pool roto: el rango se extrae en serie al llegarle el turno
+            pendientes.append((rango, pool, futuro))
+
+    try:
+        for _ in range(procesos * 2):
+            encolar()
+
+        while pendientes:
+            (inicio, fin), pool, futuro = pendientes.popleft()
+            limite = _limite_rango(inicio, fin)
+            try:
+                if futuro is None:
+                    raise RuntimeError("pool no disponible")
+                textos = futuro.result(timeout=limite)
+            except FutureTimeout:
+                logger.warning(f"⏱️ Rango de páginas {inicio + 1}-{fin} sin respuesta, se omite.")
+                textos = [""] * (fin - inicio)
+                if compartido:
+                    # El proceso compartido quedó ocupado con el rango colgado
+                    _descartar_pool_chico(pool)
+            except ValueError:
+                raise
+            except Exception as e:
+                # Pool roto u otro fallo del proceso hijo: reintentamos el rango en un proceso nuevo
+                logger.warning(f"⚠️ Fallo en proceso hijo ({e}). Reintentando pág {inicio + 1}-{fin} aparte.")
+                if compartido:
+                    _descartar_pool_chico(pool)
+                textos = _rango_en_proceso_aparte(ruta, inicio, fin)
+
+            encolar()
+            yield from textos
+    finally:
+        if propio is not None:
+            propio.shutdown(wait=False, cancel_futures=True)
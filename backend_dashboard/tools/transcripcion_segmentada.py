@@ -0,0 +1,139 @@
+import os
+import re
+import shutil
+import logging
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+logger = logging.getLogger(__name__)
+
+# --- TRANSCRIPCIÓN SEGMENTADA Y EN PARALELO ---
+# Las grabaciones largas se cortan en tramos que se solapan unos segundos, se
+# transcriben en paralelo (con tope) y se cosen en orden quitando lo repetido.
+# El transcriptor es cualquier función (ruta, mime_type) -> str: en producción
+# tools.audio.transcribir_archivo; en pruebas, un reemplazo local.
+
+AUDIO_SEGMENTO_SEG = float(os.getenv("AUDIO_SEGMENTO_SEG", "600"))     # 10 minutos
+AUDIO_SOLAPE_SEG = float(os.getenv("AUDIO_SOLAPE_SEG", "15"))
+AUDIO_SEGMENTOS_PARALELO = int(os.getenv("AUDIO_SEGMENTOS_PARALELO", "4"))
+
+def planificar_segmentos(duracion: float, largo: float = AUDIO_SEGMENTO_SEG, solape: float = AUDIO_SOLAPE_SEG) -> list:
+    """Lista de (inicio, duración) que cubre el audio, cada tramo solapado `solape` segundos con el anterior."""
+    if duracion <= largo * 1.2:
+        return [(0.0, duracion)]
+    segmentos = []
+    inicio = 0.0
+    while inicio < duracion:
+        segmentos.append((inicio, min(largo, duracion - inicio)))
+        if inicio + largo >= duracion:
+            break
+        inicio += largo - solape
+    return segmentos
+
+# --- SEGMENTADOR (ffmpeg) ---
+
+def ffmpeg_disponible() -> bool:
+    return shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+
+def duracion_audio(ruta: str) -> float:
+    salida = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", ruta],
+        capture_output=True, text=True, check=True, timeout=60
+    ).stdout.strip()
+    return float(salida)
+
+def cortar_segmento(ruta: str, inicio: float, duracion: float) -> str:
+    """Copia el tramo a un temporal con el mismo formato (sin recodificar)."""
+    suffix = os.path.splitext(ruta)[1] or ".webm"
+    fd, destino = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    subprocess.run(
+        ["ffmpeg", "-y", "-v", "error", "-ss", f"{inicio:.2f}", "-t", f"{duracion:.2f}",
+         "-i", ruta, "-vn", "-c", "copy", destino],
+        check=True, timeout=300
+    )
+    return destino
+
+# --- COSIDO ---
+
+def _palabras_norm(texto: str) -> list:
+    return [re.sub(r"[^\w]", "", p.lower()) for p in texto.split()]
+
+def unir_transcripciones(acumulado: str, siguiente: str, max_palabras: int = 80, minimo: int = 3) -> str:
+    """
+    Une dos transcripciones consecutivas quitando el texto repetido por el solape:
+    busca el mayor k tal que las últimas k palabras de `acumulado` coinciden con las
+    primeras k de `siguiente` (comparando sin mayúsculas ni puntuación).
+    """
+    if not acumulado:
+        return siguiente
+    if not siguiente:
+        return acumulado
+    cola = _palabras_norm(" ".join(acumulado.split()[-max_palabras:]))
+    cabeza_original = siguiente.split()
+    cabeza = _palabras_norm(" ".join(cabeza_original[:max_palabras]))
+    for k in range(min(len(cola), len(cabeza)), minimo - 1, -1):
+        if cola[-k:] == cabeza[:k]:
+            return acumulado.rstrip() + " " + " ".join(cabeza_original[k:])
+    # El solape puede no transcribirse idéntico: buscamos el comienzo de `siguiente` dentro de la cola
+    ancla = minimo + 2
+    if len(cabeza) >= ancla:
+        for i in range(len(cola) - ancla, -1, -1):
+            if cola[i:i + ancla] == cabeza[:ancla]:
+                solapadas = len(cola) - i
+                return acumulado.rstrip() + " " + " ".join(cabeza_original[solapadas:])
+    return acumulado.rstrip() + "\n" + siguiente.lstrip()
+
+# --- ORQUESTACIÓN ---
+
+def transcribir_en_segmentos(ruta: str, mime_type: str, transcriptor, al_avanzar=None,
+                             max_paralelo: int = AUDIO_SEGMENTOS_PARALELO,
+                             duracion: float = None, cortador=cortar_segmento) -> str:
+    """
+    Transcribe `ruta` por tramos en paralelo. `al_avanzar(parcial, completados, total)`
+    recibe el texto cosido de los tramos contiguos ya terminados (streaming de parciales).
+    Sin ffmpeg (o con audio corto) transcribe el archivo entero de una vez.
+    """
+    if duracion is None:
+        if not ffmpeg_disponible():
+            logger.info("ffmpeg no disponible: transcripción en un solo tramo.")
+            return transcriptor(ruta, mime_type)
+        try:
+            duracion = duracion_audio(ruta)
+        except Exception as e:
+            logger.warning(f"No se pudo medir la duración del audio ({e}): un solo tramo.")
+            return transcriptor(ruta, mime_type)
+
+    plan = planificar_segmentos(duracion)
+    if len(plan) == 1:
+        return transcriptor(ruta, mime_type)
+
+    logger.info(f"🎙️ Audio de {duracion:.0f}s en {len(plan)} tramos (paralelo={max_paralelo}).")
+    resultados = [None] * len(plan)
+    cosido = ""
+    siguiente_a_coser = 0
+
+    def _tarea(indice, inicio, dur):
+        tramo = cortador(ruta, inicio, dur)
+        try:
+            return transcriptor(tramo, mime_type)
+        finally:
+            if tramo != ruta:
+                try: os.remove(tramo)
+                except OSError: pass
+
+    with ThreadPoolExecutor(max_workers=max_paralelo, thread_name_prefix="tramo") as pool:
+        futuros = {pool.submit(_tarea, i, ini, dur): i for i, (ini, dur) in enumerate(plan)}
+        completados = 0
+        for futuro in as_completed(futuros):
+            resultados[futuros[futuro]] = futuro.result() or ""
+            completados += 1
+            # Cosemos todos los tramos contiguos disponibles desde el último cosido
+            while siguiente_a_coser < len(plan) and resultados[siguiente_a_coser] is not None:
+                cosido = unir_transcripciones(cosido, resultados[siguiente_a_coser])
+                siguiente_a_coser += 1
+            if al_avanzar:
+                al_avanzar(cosido, completados, len(plan))
+
+    return cosido
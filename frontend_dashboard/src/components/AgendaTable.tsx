@@ -1,6 +1,5 @@
 // frontend_dashboard/src/components/AgendaTable.tsx
 import { useEffect, useState } from 'react';
-import { supabase } from '../supabaseClient';
 
 // Definimos la forma de los datos para TypeScript
 interface Evento {
@@ -15,30 +14,41 @@ interface Evento {
   origen_dato: string;
 }
 
+const rawUrl = import.meta.env.VITE_BACKEND_URL || "http://127.0.0.1:8000";
+const API_URL = rawUrl.replace(/\/api\/?$/, "").replace(/\/$/, "");
+const PAGINA = 100;
+
 export const AgendaTable = () => {
   const [eventos, setEventos] = useState<Evento[]>([]);
   const [loading, setLoading] = useState(true);
+  const [cursor, setCursor] = useState<string | null>(null);
+  const [total, setTotal] = useState<number | null>(null);
+  const [cargandoMas, setCargandoMas] = useState(false);
 
   useEffect(() => {
     fetchAgenda();
   }, []);
 
-  const fetchAgenda = async () => {
+  // El backend sirve la agenda desde su caché en memoria, paginada por cursor
+  const fetchAgenda = async (desde: string | null = null) => {
     try {
-      setLoading(true);
-      // 🔥 AQUÍ ESTÁ LA CLAVE: Conectamos con la tabla nueva
-      const { data, error } = await supabase
-        .from('agenda_unificada')
-        .select('*')
-        .order('fecha', { ascending: true })
-        .limit(100); // Límite inicial de seguridad
+      desde ? setCargandoMas(true) : setLoading(true);
+      const params = new URLSearchParams({ orden: 'fecha', limite: String(PAGINA) });
+      if (desde) params.set('cursor', desde);
+
+      const response = await fetch(`${API_URL}/api/agenda?${params}`);
+      if (!response.ok) throw new Error(`HTTP ${response.status}`);
+      const data: Evento[] = await response.json();
 
-      if (error) throw error;
-      setEventos(data || []);
+      setEventos(prev => desde ? [...prev, ...data] : data);
+      setCursor(response.headers.get('X-Cursor-Siguiente'));
+      const totalHeader = response.headers.get('X-Total-Registros');
+      setTotal(totalHeader ? Number(totalHeader) : null);
     } catch (error) {
       console.error("Error cargando agenda:", error);
     } finally {
       setLoading(false);
+      setCargandoMas(false);
     }
   };
 
@@ -49,7 +59,7 @@ export const AgendaTable = () => {
       <div className="bg-gray-50 px-6 py-4 border-b border-gray-200 flex justify-between items-center">
         <h2 className="text-lg font-bold text-gray-800">📊 Agenda Unificada (Sincronizada)</h2>
         <span className="text-xs font-mono bg-blue-100 text-blue-800 px-2 py-1 rounded">
-          {eventos.length} Registros
+          {total !== null && total > eventos.length ? `${eventos.length} de ${total}` : eventos.length} Registros
         </span>
       </div>
       
@@ -102,6 +112,18 @@ export const AgendaTable = () => {
           </tbody>
         </table>
       </div>
+
+      {cursor && (
+        <div className="px-6 py-3 border-t border-gray-200 text-center">
+          <button
+            onClick={() => fetchAgenda(cursor)}
+            disabled={cargandoMas}
+            className="text-sm font-semibold text-blue-700 hover:text-blue-900 disabled:text-gray-400"
+          >
+            {cargandoMas ? 'Cargando...' : 'Cargar más'}
+          </button>
+        </div>
+      )}
     </div>
   );
 };
\ No newline at end of file
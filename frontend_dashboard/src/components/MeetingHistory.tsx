@@ -41,8 +41,13 @@ export const MeetingHistory = ({ refreshTrigger }: { refreshTrigger: number }) =
   }
 
   // --- NUEVA FUNCIÓN DE DESCARGA ---
-  const descargarActa = (acta: any) => {
+  const descargarActa = async (actaListado: any) => {
     try {
+        // 0. El listado no trae la transcripción: pedimos el detalle completo
+        const response = await fetch(`${API_URL}/actas/${actaListado.id}`);
+        if (!response.ok) throw new Error(`Error ${response.status}`);
+        const acta = await response.json();
+
         // 1. Preparamos el contenido del archivo
         const contenido = [
             "========================================",
@@ -114,7 +119,7 @@ export const MeetingHistory = ({ refreshTrigger }: { refreshTrigger: number }) =
               </div>
               
               <p className="text-slate-400 text-sm mb-4 line-clamp-2">
-                  {acta.resumen_ia || acta.transcripcion?.substring(0, 100) + "..."}
+                  {acta.resumen_ia || (acta.transcripcion ? acta.transcripcion.substring(0, 100) + "..." : "Resumen en preparación...")}
               </p>
               
               <div className="flex items-center justify-between border-t border-white/5 pt-3 mt-3">
@@ -20,89 +20,92 @@ export const sendMessageToGemini = async (
     timestamp: msg.timestamp.toISOString(), 
   }));
 
-  try {
-    const response = await fetch(`${API_URL}/api/chat`, {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-      },
-      // Enviamos session_id al backend
-      body: JSON.stringify({ 
-          message: message, 
-          history: serializedHistory,
-          session_id: sessionId || null 
-      }), 
-    });
-
-    if (!response.ok) {
-      const errorData = await response.json().catch(() => ({}));
-      console.error("Detalle del error del servidor:", errorData);
-      throw new Error(`Error del servidor: ${response.status} - ${JSON.stringify(errorData)}`);
-    }
-
+  // Una clave por pregunta: si reintentamos, el backend no vuelve a correr el agente
+  const idempotencyKey = crypto.randomUUID();
+  let lastEventId = 0;
+
+  const enviar = () => fetch(`${API_URL}/api/chat`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      // Al reconectar, el backend retoma el stream desde el último evento recibido
+      ...(lastEventId ? { 'Last-Event-ID': String(lastEventId) } : {}),
+    },
+    // Enviamos session_id al backend
+    body: JSON.stringify({ 
+        message: message, 
+        history: serializedHistory,
+        session_id: sessionId || null,
+        idempotency_key: idempotencyKey
+    }), 
+  });
+
+  // Lee un stream SSE (text/event-stream). Devuelve true si llegó el evento "fin".
+  const leerStream = async (response: Response): Promise<boolean> => {
     if (!response.body) throw new Error("La respuesta no tiene cuerpo para leer (stream).");
 
-    // --- LÓGICA DE STREAMING ROBUSTA ---
     const reader = response.body.getReader();
     const decoder = new TextDecoder("utf-8");
-    let done = false;
     let buffer = ""; 
 
-    while (!done) {
-      const { value, done: doneReading } = await reader.read();
-      done = doneReading;
-      
-      if (value) {
-        // 1. Acumulamos lo que llega al buffer
-        buffer += decoder.decode(value, { stream: true });
-        
-        // 2. Buscamos separadores de evento completos (doble enter es el estándar SSE)
-        const parts = buffer.split("\n\n");
-        
-        // 3. Guardamos el último fragmento (posiblemente incompleto) para la siguiente vuelta
-        buffer = parts.pop() || ""; 
-        
-        // 4. Procesamos solo las partes que llegaron completas
-        for (const part of parts) {
-            // Verificamos el prefijo estándar de SSE "data: "
-            if (part.startsWith("data: ")) {
-                const rawData = part.slice(6); // Quitamos "data: " de forma segura
-                
-                // 🛡️ MEJORA DE ESTABILIDAD:
-                
-                // A. Prioridad: ID de Sesión (formato especial)
-                if (rawData.startsWith("SESSION_ID:")) {
-                    onStreamUpdate(rawData);
-                    continue;
-                }
-
-                try {
-                    // B. Intentamos parsear JSON solo si parece un objeto completo
-                    // Esto evita errores de "Unexpected end of JSON" si el chunk se cortó
-                    if (rawData.trim().startsWith("{") && rawData.trim().endsWith("}")) {
-                        const parsed = JSON.parse(rawData);
-                        if (parsed.text) {
-                            onStreamUpdate(parsed.text);
-                        } else {
-                            // Si es un JSON desconocido, lo mandamos stringify por seguridad
-                            onStreamUpdate(JSON.stringify(parsed));
-                        }
-                    } else {
-                        // C. Si no es JSON completo o es texto plano, lo mandamos tal cual
-                        // para asegurar que el usuario vea el mensaje aunque llegue fragmentado
-                        onStreamUpdate(rawData);
-                    }
-                } catch (e) {
-                    // Fallback final: enviar texto crudo
-                    onStreamUpdate(rawData);
-                }
-            }
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) return false;
+
+      // 1. Acumulamos y separamos eventos completos (línea en blanco = fin de evento)
+      buffer += decoder.decode(value, { stream: true });
+      const eventos = buffer.split("\n\n");
+      buffer = eventos.pop() || ""; 
+
+      for (const evento of eventos) {
+        let tipo = "message";
+        let id: number | null = null;
+        const datos: string[] = [];
+
+        for (const linea of evento.split("\n")) {
+          if (!linea || linea.startsWith(":")) continue; // Comentarios = heartbeats
+          const sep = linea.indexOf(":");
+          const campo = sep === -1 ? linea : linea.slice(0, sep);
+          let valor = sep === -1 ? "" : linea.slice(sep + 1);
+          if (valor.startsWith(" ")) valor = valor.slice(1);
+
+          if (campo === "data") datos.push(valor);
+          else if (campo === "event") tipo = valor;
+          else if (campo === "id") id = Number(valor);
+        }
+        if (id !== null && !Number.isNaN(id)) lastEventId = id;
+
+        // 2. Despachamos según el tipo de evento
+        const texto = datos.join("\n");
+        if (tipo === "fin") return true;
+        if (tipo === "sesion" || tipo === "mensaje" || tipo === "error") {
+          onStreamUpdate(texto);
         }
       }
     }
-    
-    return true; 
+  };
 
+  const MAX_RECONEXIONES = 3;
+  try {
+    for (let intento = 0; ; intento++) {
+      try {
+        const response = await enviar();
+
+        if (!response.ok) {
+          const errorData = await response.json().catch(() => ({}));
+          console.error("Detalle del error del servidor:", errorData);
+          throw new Error(`Error del servidor: ${response.status} - ${JSON.stringify(errorData)}`);
+        }
+
+        if (await leerStream(response)) return true;
+        throw new TypeError("El stream se cortó antes de terminar.");
+      } catch (error) {
+        // Solo reintentamos cortes de red; los errores HTTP se propagan
+        if (!(error instanceof TypeError) || intento >= MAX_RECONEXIONES) throw error;
+        console.warn(`Reconectando chat (desde evento ${lastEventId}):`, error);
+        await new Promise(resolve => setTimeout(resolve, 1000 * (intento + 1)));
+      }
+    }
   } catch (error) {
     console.error("Error conectando con el Backend:", error);
     throw error;
@@ -110,6 +113,24 @@ export const sendMessageToGemini = async (
 };
 
 // --- FUNCIÓN 2: ENVIAR AUDIO (VOZ) ---
+const esperarTranscripcion = async (trabajoId: string, maxMinutos = 20) => {
+  const limite = Date.now() + maxMinutos * 60 * 1000;
+  let espera = 1000;
+
+  while (Date.now() < limite) {
+    await new Promise(resolve => setTimeout(resolve, espera));
+    espera = Math.min(espera * 1.5, 5000);
+
+    const response = await fetch(`${API_URL}/api/audio/trabajos/${trabajoId}`);
+    if (!response.ok) throw new Error(`Error consultando transcripción: ${response.status}`);
+
+    const trabajo = await response.json();
+    if (trabajo.estado === "completado") return trabajo.transcripcion || "Transcripción no disponible.";
+    if (trabajo.estado === "error") throw new Error(trabajo.error || "Error transcribiendo el audio");
+  }
+  throw new Error("La transcripción está tardando demasiado. Revisá el historial de actas más tarde.");
+};
+
 export const sendAudioToGemini = async (audioBlob: Blob) => {
   const formData = new FormData();
   formData.append('file', audioBlob, 'recording.webm');
@@ -127,8 +148,11 @@ export const sendAudioToGemini = async (audioBlob: Blob) => {
       throw new Error(errorData.detail || `Error de audio: ${response.status}`);
     }
 
+    // El backend responde 202 con un trabajo: consultamos su estado hasta que termine
+    // (si el mismo audio ya se había transcripto, viene completado de una vez)
     const data = await response.json();
-    return data.transcripcion || "Transcripción no disponible."; 
+    if (data.estado === "completado") return data.transcripcion || "Transcripción no disponible.";
+    return await esperarTranscripcion(data.trabajo_id);
     
   } catch (error) {
     console.error("Error enviando audio:", error);